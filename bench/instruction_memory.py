@@ -0,0 +1,85 @@
+#!/usr/bin/python
+"""Compares the memory used per instruction by objdump_handler.Instruction with the original __dict__ based layout
+
+Usage: instruction_memory.py OBJDUMP_FILE_PATH [MAX_INSTRUCTIONS]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import objdump_handler
+
+
+class DictInstruction(object):
+    """The original Instruction layout: a __dict__ with hex strings and a fresh operands list per instruction"""
+
+    def __init__(self, line):
+        offset, raw, operator, operands = objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN.findall(line)[0]
+        self.offset = offset
+        self.raw = raw
+        self.operands = operands.split(',')
+        self.operator = operator
+        self.operator_type = objdump_handler.Instruction.OPERATOR_TO_TYPE.get(operator, "NOT_FOUND")
+
+
+def deep_size(objects):
+    """Returns the bytes used by objects and everything they reference, counting shared objects once"""
+    seen = set()
+    total = 0
+    pending = list(objects)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (list, tuple)):
+            pending.extend(obj)
+        elif isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif hasattr(obj, '__dict__'):
+            pending.append(obj.__dict__)
+        elif hasattr(obj, '__slots__'):
+            pending.extend(getattr(obj, slot) for slot in obj.__slots__)
+    return total
+
+
+def read_instruction_lines(file_path, max_instructions):
+    lines = []
+    f = open(file_path, 'r')
+    try:
+        for line in f:
+            if (
+                not objdump_handler.Function.FIRST_LINE_PATTERN.match(line) and
+                objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN.match(line)
+            ):
+                lines.append(line)
+                if len(lines) >= max_instructions:
+                    break
+    finally:
+        f.close()
+    return lines
+
+
+def main():
+    if len(sys.argv) < 2:
+        print __doc__
+        exit()
+    max_instructions = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    lines = read_instruction_lines(sys.argv[1], max_instructions)
+    if not lines:
+        print "No instruction lines found in %s" % sys.argv[1]
+        exit()
+
+    before = deep_size([DictInstruction(line) for line in lines])
+    after = deep_size([objdump_handler.Instruction(line) for line in lines])
+
+    print "instructions:               %d" % len(lines)
+    print "bytes/instruction (before): %.1f" % (float(before) / len(lines))
+    print "bytes/instruction (after):  %.1f" % (float(after) / len(lines))
+    print "reduction:                  %.1f%%" % (100.0 * (before - after) / before)
+
+if __name__ == '__main__':
+    main()
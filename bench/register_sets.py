@@ -0,0 +1,93 @@
+#!/usr/bin/python
+"""Compares the register bookkeeping rop.Builder does at every search node using sets of register names (the original
+representation) and using register masks
+
+The gadgets of the README's example pipeline are searched for in OBJDUMP_FILE_PATH, then every path through the first
+GADGETS_PER_STAGE gadgets of each stage is walked twice, doing the compatibility check, fresh register update and
+failed state key of Builder._build with each representation.
+
+Usage: register_sets.py OBJDUMP_FILE_PATH [GADGETS_PER_STAGE]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import gadget_types
+import objdump_handler
+import rop
+
+
+def walk_sets(stages, depth, fresh_registers, states):
+    if depth == len(stages):
+        return 1
+    states.add((depth, frozenset(fresh_registers)))
+    count = 0
+    for fresh, dependent, stale in stages[depth]:
+        if dependent <= fresh_registers:
+            next_fresh_registers = fresh_registers.copy()
+            next_fresh_registers -= dependent | stale
+            next_fresh_registers |= fresh
+            count += walk_sets(stages, depth + 1, next_fresh_registers, states)
+    return count
+
+
+def walk_masks(stages, depth, fresh_registers, states):
+    if depth == len(stages):
+        return 1
+    states.add((depth, fresh_registers))
+    count = 0
+    for fresh, dependent, consumed in stages[depth]:
+        if not dependent & ~fresh_registers:
+            count += walk_masks(stages, depth + 1, (fresh_registers & ~consumed) | fresh, states)
+    return count
+
+
+def main():
+    if len(sys.argv) < 2:
+        print __doc__
+        exit()
+    gadgets_per_stage = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    objdump_handler.parse_objdump_output_file(sys.argv[1])
+    pipeline = [
+        gadget_types.SRegisterLoads(),
+        gadget_types.LoadArgForSleep(),
+        gadget_types.CallToSleep(),
+        gadget_types.StackLocator(),
+        gadget_types.ControllableJump()
+    ]
+    rop.GadgetType.populate(pipeline)
+    gadgets = [stage.rop_gadgets[:gadgets_per_stage] for stage in pipeline]
+    for stage, stage_gadgets in zip(pipeline, gadgets):
+        print "%-20s %d gadgets (%d used)" % (stage.__class__.__name__, len(stage.rop_gadgets), len(stage_gadgets))
+    if not all(gadgets):
+        print "Every stage needs at least one gadget"
+        exit()
+
+    set_stages = [
+        [(gadget.fresh_registers, gadget.dependent_registers, gadget.stale_registers) for gadget in stage_gadgets]
+        for stage_gadgets in gadgets
+    ]
+    mask_stages = [
+        [(gadget.fresh_mask, gadget.dependent_mask, gadget.consumed_mask) for gadget in stage_gadgets]
+        for stage_gadgets in gadgets
+    ]
+
+    start = time.time()
+    set_paths = walk_sets(set_stages, 0, set(), set())
+    set_time = time.time() - start
+
+    start = time.time()
+    mask_paths = walk_masks(mask_stages, 0, 0, set())
+    mask_time = time.time() - start
+
+    assert set_paths == mask_paths
+    print "complete paths: %d" % set_paths
+    print "sets:           %.3fs" % set_time
+    print "masks:          %.3fs" % mask_time
+    print "speedup:        %.1fx" % (set_time / mask_time if mask_time else float('inf'))
+
+if __name__ == '__main__':
+    main()
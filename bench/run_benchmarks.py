@@ -0,0 +1,205 @@
+#!/usr/bin/python
+"""Times parsing, searching, each gadget type and rop.Builder on a synthetic binary (see: synthetic.py) and saves the
+results as JSON, optionally comparing them to the results of an earlier run
+
+Every phase is run --repeat times from a cold start (caches like objdump_handler's SearchRegistry are dropped before
+each run) and its fastest run is what's compared. A phase is flagged as a regression when it's more than --threshold
+slower than in the baseline, and the exit status is 1 if any phase was.
+
+Usage:
+    run_benchmarks.py [--functions N] [--seed N] [--repeat N] [--output RESULTS.json]
+    run_benchmarks.py --baseline BASELINE.json [--threshold FRACTION] ...
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import gadget_types
+import objdump_handler
+import rop
+import synthetic
+
+# (pattern, disallowed_registers, desired_jump_register) for objdump_handler.search()
+SEARCH_QUERIES = [
+    ("lw s*", None, "t9"),
+    ("lw s*,sp", None, None),
+    ("move **", None, None),
+    ("move t9", ["a0", "a1"], "t9"),
+    ("li a0", None, None),
+    ("addiu **,sp", None, None),
+    ("sw s1,sp", None, None),
+]
+
+GADGET_TYPES = [
+    gadget_types.SRegisterLoads,
+    gadget_types.LoadArgForSleep,
+    gadget_types.CallToSleep,
+    gadget_types.StackLocator,
+    gadget_types.ControllableJump,
+]
+
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(usage=__doc__.split("Usage:")[1].rstrip())
+    parser.add_argument('--functions', type=int, default=5000,
+                        help="number of functions in the synthetic binary (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=synthetic.DEFAULT_SHAPE['seed'],
+                        help="seed of the synthetic binary (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of each phase (default: %(default)s)")
+    parser.add_argument('--output', '-o', metavar='RESULTS.json', help="file to save the results to")
+    parser.add_argument('--baseline', '-b', metavar='BASELINE.json', help="results of an earlier run to compare to")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="fraction slower than the baseline a phase must be to count as a regression "
+                             "(default: %(default)s)")
+    return parser
+
+
+def query_name(pattern, disallowed_registers, desired_jump_register):
+    name = "search: %s" % pattern
+    if disallowed_registers:
+        name += " !%s" % ",".join(disallowed_registers)
+    if desired_jump_register:
+        name += " ->%s" % desired_jump_register
+    return name
+
+
+def reset_search_caches():
+    """Drops the search results and gadgets found so far, keeping the parsed binary and its InstructionIndex"""
+    objdump_handler.SEARCH_REGISTRY = None
+
+
+def time_phase(run, repeat, setup=reset_search_caches):
+    """Returns the timing results of calling run repeat times, calling setup before each untimed
+
+    run -- function returning the number of items (blocks, gadgets, ...) it produced
+    """
+    runs = []
+    count = None
+    for i in xrange(repeat):
+        setup()
+        start = time.time()
+        count = run()
+        runs.append(time.time() - start)
+    ordered = sorted(runs)
+    return {'runs': runs, 'min': ordered[0], 'median': ordered[len(ordered) // 2], 'count': count}
+
+
+def iter_phases(objdump_lines, repeat):
+    """Generator yielding (phase name, timing results) for each phase as it finishes, leaving objdump_lines loaded
+    in objdump_handler
+    """
+    def parse():
+        objdump_handler.extract_functions_from_objdump_lines(objdump_lines)
+        return len(objdump_handler.ALL_JUMP_BLOCKS)
+
+    def reset_jump_blocks():
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    yield "parse", time_phase(parse, repeat, reset_jump_blocks)
+
+    def index():
+        return len(objdump_handler.get_instruction_index().postings)
+
+    def reset_index():
+        objdump_handler.INSTRUCTION_INDEX = None
+
+    yield "instruction_index", time_phase(index, repeat, reset_index)
+
+    for query in SEARCH_QUERIES:
+        yield query_name(*query), time_phase(lambda: len(objdump_handler.search(*query)), repeat)
+
+    for gadget_type_class in GADGET_TYPES:
+        yield "gadget_type: %s" % gadget_type_class.__name__, time_phase(
+            lambda: len(gadget_type_class().search()), repeat)
+
+    def build():
+        builder = rop.Builder([gadget_type_class() for gadget_type_class in GADGET_TYPES])
+        builder.run()
+        if not builder.rop_sequence:
+            raise Exception("No rop sequence found, the synthetic binary should always have one")
+        return builder.stats.nodes_expanded
+
+    yield "builder: run", time_phase(build, repeat)
+
+    def build_compatible(dedupe=False):
+        pipeline = [gadget_type_class(dedupe=dedupe) for gadget_type_class in GADGET_TYPES[:-1]]
+        pipeline.append(gadget_types.ControllableJump(ensure_compatible=True, dedupe=dedupe))
+        builder = rop.Builder(pipeline)
+        sequences, stats = builder.run_many(20, node_budget=5000)
+        return stats.nodes_expanded
+
+    yield "builder: run_many(20) ensure_compatible", time_phase(build_compatible, repeat)
+    # the same with one Gadget per distinct instruction sequence (see: rop.GadgetType.dedupe)
+    yield "builder: run_many(20) dedupe", time_phase(lambda: build_compatible(True), repeat)
+
+
+def compare(results, baseline, threshold):
+    """Returns a list of (phase name, baseline seconds, seconds, ratio, is_regression) for the phases in both
+    results and baseline
+    """
+    comparison = []
+    for name, timing in results['phases']:
+        baseline_timing = dict(baseline['phases']).get(name)
+        if baseline_timing is None:
+            continue
+        ratio = timing['min'] / baseline_timing['min'] if baseline_timing['min'] else float('inf')
+        comparison.append((name, baseline_timing['min'], timing['min'], ratio, ratio > 1 + threshold))
+    return comparison
+
+
+def main():
+    args = build_argument_parser().parse_args()
+
+    baseline = None
+    if args.baseline:
+        f = open(args.baseline, 'r')
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+
+    shape = dict(synthetic.DEFAULT_SHAPE, seed=args.seed)
+    objdump_lines = list(synthetic.generate_objdump_lines(args.functions, **shape))
+    results = {
+        'config': {'functions': args.functions, 'shape': shape, 'repeat': args.repeat},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'lines': len(objdump_lines),
+        'phases': [],
+    }
+    print "%d functions, %d lines, best of %d runs" % (args.functions, len(objdump_lines), args.repeat)
+    for name, timing in iter_phases(objdump_lines, args.repeat):
+        results['phases'].append([name, timing])
+        print "%-45s %9.4fs %9.4fs %8s" % (name, timing['min'], timing['median'], timing['count'])
+
+    if args.output:
+        f = open(args.output, 'w')
+        try:
+            json.dump(results, f, indent=2, separators=(',', ': '), sort_keys=True)
+            f.write("\n")
+        finally:
+            f.close()
+        print "results saved to %s" % args.output
+
+    if baseline is None:
+        return
+    if baseline['config'] != results['config']:
+        print "warning: the baseline was run with a different configuration: %s" % json.dumps(baseline['config'])
+    print ""
+    print "%-45s %10s %10s %7s" % ("compared to %s" % args.baseline, "baseline", "now", "ratio")
+    regressions = 0
+    for name, baseline_seconds, seconds, ratio, is_regression in compare(results, baseline, args.threshold):
+        regressions += is_regression
+        print "%-45s %9.4fs %9.4fs %6.2fx%s" % (name, baseline_seconds, seconds, ratio,
+                                                 "  REGRESSION" if is_regression else "")
+    if regressions:
+        print "%d phases are more than %d%% slower than the baseline" % (regressions, args.threshold * 100)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/python
+"""Generates deterministic objdump -d output for a synthetic MIPS binary, for benchmarking
+
+Functions have the usual o32 shape: a prologue saving ra and some s-registers, a body of straight-line code broken up
+by calls through t9 (some of them back to back), direct jal calls and branches, and an epilogue restoring the saved
+registers before jr ra, or jr t9 for tail calls. The same arguments and seed always produce the same lines, and the
+gadget types in gadget_types all find gadgets that rop.Builder can chain together.
+
+Usage: synthetic.py FUNCTION_COUNT [SEED] > synthetic.objdump
+"""
+import random
+import sys
+import zlib
+
+TEXT_START = 0x400000
+
+# the arguments of generate_objdump_lines() other than function_count, with their defaults
+DEFAULT_SHAPE = {
+    'seed': 0,
+    # number of straight-line instructions between control flow instructions
+    'min_block': 1,
+    'max_block': 6,
+    # number of calls, branches, etc. in a function's body
+    'min_segments': 2,
+    'max_segments': 10,
+    # chance that a segment of a function's body ends in each kind of control flow, the rest end in a branch
+    'call_density': 0.45,
+    'call_pair_density': 0.1,
+    'jal_density': 0.15,
+    # chance a function ends in a tail call through t9 instead of returning through ra
+    'tail_call_density': 0.1,
+    # most s-registers a function saves in its prologue
+    'saved_registers': 8,
+}
+
+S_REGISTERS = ['s0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
+TEMPORARY_REGISTERS = ['v0', 'v1', 'a0', 'a1', 'a2', 'a3', 't0', 't1', 't2', 't3', 't4', 't5', 't6', 't7']
+ARGUMENT_REGISTERS = ['a0', 'a1', 'a2', 'a3']
+BRANCH_OPERATORS = ['beqz', 'bnez', 'bltz', 'bgez', 'blez', 'bgtz']
+
+
+class _FunctionWriter(object):
+    """Collects the instructions of one function as (operator, operands) and numbers them"""
+
+    def __init__(self, name, start, rng):
+        self.name = name
+        self.start = start
+        self.rng = rng
+        self.instructions = []
+
+    def add(self, operator, operands=''):
+        self.instructions.append((operator, operands))
+
+    def next_address(self, skip=0):
+        return self.start + 4 * (len(self.instructions) + skip)
+
+    def lines(self):
+        yield "%08x <%s>:\n" % (self.start, self.name)
+        address = self.start
+        for operator, operands in self.instructions:
+            text = "%s\t%s" % (operator, operands) if operands else operator
+            # not real encodings, but the same instruction always gets the same word
+            yield "  %x:\t%08x \t%s\n" % (address, zlib.crc32(text) & 0xffffffff, text)
+            address += 4
+        yield "\n"
+
+
+def generate_objdump_lines(function_count, **shape):
+    """Generator yielding the lines of objdump output for a .text section of function_count synthetic functions
+
+    shape -- keyword arguments overriding DEFAULT_SHAPE
+    """
+    unknown = set(shape) - set(DEFAULT_SHAPE)
+    if unknown:
+        raise TypeError("Unknown shape arguments: %s" % ", ".join(sorted(unknown)))
+    options = dict(DEFAULT_SHAPE)
+    options.update(shape)
+    rng = random.Random(options['seed'])
+
+    yield "\n"
+    yield "synthetic:     file format elf32-tradbigmips\n"
+    yield "\n"
+    yield "\n"
+    yield "Disassembly of section .text:\n"
+    yield "\n"
+
+    # jal targets are the starts of earlier functions so they're real addresses
+    function_starts = []
+    address = TEXT_START
+    for i in xrange(function_count):
+        function = _FunctionWriter("function_%d" % i, address, rng)
+        _write_function(function, options, function_starts)
+        for line in function.lines():
+            yield line
+        function_starts.append((function.start, function.name))
+        address = function.next_address()
+
+
+def write_objdump_file(file_path, function_count, **shape):
+    """Writes the output of generate_objdump_lines() to file_path"""
+    f = open(file_path, 'w')
+    try:
+        f.writelines(generate_objdump_lines(function_count, **shape))
+    finally:
+        f.close()
+
+
+def _write_function(function, options, function_starts):
+    rng = function.rng
+    saved = S_REGISTERS[:rng.randint(0, options['saved_registers'])]
+    frame_size = 8 * ((len(saved) + 6) // 2 + 1)
+    function.add('addiu', 'sp,sp,-%d' % frame_size)
+    function.add('sw', 'ra,%d(sp)' % (frame_size - 4))
+    for i, register in enumerate(saved):
+        function.add('sw', '%s,%d(sp)' % (register, frame_size - 8 - 4 * i))
+    # registers the body can use for values that survive calls
+    sources = saved or ['s0']
+
+    for segment in xrange(rng.randint(options['min_segments'], options['max_segments'])):
+        _write_straight_line(function, rng.randint(options['min_block'], options['max_block']), sources, frame_size)
+        kind = rng.random()
+        if kind < options['call_density']:
+            _write_call(function, sources, frame_size)
+        elif kind < options['call_density'] + options['call_pair_density']:
+            _write_call(function, sources, frame_size)
+            # the next call starts right after the first's delay slot (see: gadget_types.CallToSleep)
+            _write_call(function, sources, frame_size)
+        elif kind < options['call_density'] + options['call_pair_density'] + options['jal_density'] and function_starts:
+            target_start, target_name = rng.choice(function_starts)
+            function.add('jal', '%x <%s>' % (target_start, target_name))
+            _write_delay_slot(function, sources, frame_size)
+            function.add('lw', 'gp,16(sp)')
+        else:
+            distance = rng.randint(2, 8)
+            target = function.next_address(distance)
+            function.add(rng.choice(BRANCH_OPERATORS), '%s,%x <%s+0x%x>' % (
+                rng.choice(TEMPORARY_REGISTERS[:2]), target, function.name, target - function.start))
+            _write_delay_slot(function, sources, frame_size)
+
+    tail_call = rng.random() < options['tail_call_density']
+    if tail_call:
+        function.add('move', 't9,%s' % rng.choice(sources))
+    function.add('lw', 'ra,%d(sp)' % (frame_size - 4))
+    for i, register in reversed(list(enumerate(saved))):
+        function.add('lw', '%s,%d(sp)' % (register, frame_size - 8 - 4 * i))
+    function.add('jr', 't9' if tail_call else 'ra')
+    function.add('addiu', 'sp,sp,%d' % frame_size)
+
+
+def _write_straight_line(function, count, sources, frame_size):
+    rng = function.rng
+    for i in xrange(count):
+        kind = rng.randint(0, 9)
+        destination = rng.choice(TEMPORARY_REGISTERS)
+        if kind <= 2:
+            function.add('lw', '%s,%d(%s)' % (destination, 4 * rng.randint(0, 16), rng.choice(sources + ['gp'])))
+        elif kind == 3:
+            function.add('sw', '%s,%d(%s)' % (rng.choice(TEMPORARY_REGISTERS), 4 * rng.randint(0, 16),
+                                              rng.choice(sources)))
+        elif kind == 4:
+            function.add(rng.choice(['addu', 'subu', 'and', 'or', 'xor', 'sltu']), '%s,%s,%s' % (
+                destination, rng.choice(TEMPORARY_REGISTERS), rng.choice(sources + TEMPORARY_REGISTERS)))
+        elif kind == 5:
+            function.add(rng.choice(['sll', 'srl', 'sra']), '%s,%s,%d' % (
+                destination, rng.choice(TEMPORARY_REGISTERS), rng.randint(1, 31)))
+        elif kind == 6:
+            function.add('li', '%s,%d' % (destination, rng.randint(0, 4096)))
+        elif kind == 7:
+            function.add('move', '%s,%s' % (destination, rng.choice(sources)))
+        elif kind == 8:
+            function.add('addiu', '%s,%s,%d' % (destination, rng.choice(TEMPORARY_REGISTERS), rng.randint(-64, 64)))
+        else:
+            function.add('lw', '%s,%d(sp)' % (rng.choice(sources), 4 * rng.randint(4, frame_size // 4 - 1)))
+
+
+def _write_call(function, sources, frame_size):
+    """A call through t9, loaded from a saved register or from the GOT"""
+    rng = function.rng
+    if rng.random() < 0.6:
+        function.add('move', 't9,%s' % rng.choice(sources))
+    else:
+        function.add('lw', 't9,-%d(gp)' % (4 * rng.randint(1, 4096)))
+    for register in rng.sample(ARGUMENT_REGISTERS, rng.randint(0, 2)):
+        _write_argument(function, register, sources, frame_size)
+    function.add('jalr', 't9')
+    _write_delay_slot(function, sources, frame_size)
+
+
+def _write_argument(function, register, sources, frame_size):
+    rng = function.rng
+    kind = rng.randint(0, 3)
+    if kind == 0:
+        function.add('li', '%s,%d' % (register, rng.randint(-1, 64)))
+    elif kind == 1:
+        function.add('move', '%s,%s' % (register, rng.choice(sources)))
+    elif kind == 2:
+        function.add('addiu', '%s,sp,%d' % (register, 4 * rng.randint(4, frame_size // 4)))
+    else:
+        function.add('lw', '%s,%d(sp)' % (register, 4 * rng.randint(4, frame_size // 4 - 1)))
+
+
+def _write_delay_slot(function, sources, frame_size):
+    rng = function.rng
+    if rng.random() < 0.5:
+        function.add('nop')
+    else:
+        _write_argument(function, rng.choice(ARGUMENT_REGISTERS), sources, frame_size)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print __doc__
+        exit()
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_SHAPE['seed']
+    sys.stdout.writelines(generate_objdump_lines(int(sys.argv[1]), seed=seed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+"""Measures how many objdump lines per second are split into instruction fields by objdump_handler's tokenizer and by
+the regexes it replaced, and how many lines per second the whole parse handles with each
+
+The regex baseline is what parsing used to do for each line: match Function.FIRST_LINE_PATTERN, match
+Instruction.INSTRUCTION_LINE_PATTERN and then run findall with it again to get the fields.
+
+Usage: tokenizer.py [OBJDUMP_FILE_PATH | FUNCTION_COUNT] [REPEAT]
+    (default: a synthetic binary of 5000 functions, see: synthetic.py)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import objdump_handler
+import synthetic
+
+
+def regex_fields(lines):
+    first_line_pattern = objdump_handler.Function.FIRST_LINE_PATTERN
+    instruction_line_pattern = objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN
+    fields = []
+    for line in lines:
+        if not first_line_pattern.match(line) and instruction_line_pattern.match(line):
+            offset, raw, operator, operands = instruction_line_pattern.findall(line)[0]
+            fields.append((int(offset, 16), int(raw, 16), operator, operands))
+    return fields
+
+
+def tokenizer_fields(lines):
+    fields = []
+    for line in lines:
+        if not (line[:1] in objdump_handler.HEX_DIGITS and objdump_handler.Function.FIRST_LINE_PATTERN.match(line)):
+            instruction_fields = objdump_handler.tokenize_instruction_line(line)
+            if instruction_fields is not None:
+                fields.append(instruction_fields)
+    return fields
+
+
+def regex_parse(lines):
+    """The whole parse of a single .text section as it was done with the regexes"""
+    first_line_pattern = objdump_handler.Function.FIRST_LINE_PATTERN
+    instruction_line_pattern = objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN
+    objdump_handler.ALL_JUMP_BLOCKS = []
+    functions = []
+    function = None
+    for line in lines:
+        if first_line_pattern.match(line):
+            function = objdump_handler.Function(line)
+        elif instruction_line_pattern.match(line):
+            offset, raw, operator, operands = instruction_line_pattern.findall(line)[0]
+            function.instructions.append(
+                objdump_handler.Instruction.from_fields(int(offset, 16), int(raw, 16), operator, operands))
+        elif line == "\n" and function:
+            function.extract_jump_blocks()
+            functions.append(function)
+            function = None
+    return functions
+
+
+def parse(lines):
+    objdump_handler.ALL_JUMP_BLOCKS = []
+    return list(objdump_handler.iter_functions_from_objdump_lines(lines))
+
+
+def best_time(function, lines, repeat):
+    best = None
+    result = None
+    for i in xrange(repeat):
+        start = time.time()
+        result = function(lines)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else '5000'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    if source.isdigit():
+        lines = list(synthetic.generate_objdump_lines(int(source)))
+    else:
+        f = open(source, 'r')
+        try:
+            lines = f.readlines()
+        finally:
+            f.close()
+
+    regex_time, expected = best_time(regex_fields, lines, repeat)
+    tokenizer_time, fields = best_time(tokenizer_fields, lines, repeat)
+    assert fields == expected, "the tokenizer's fields differ from the regex's"
+    regex_parse_time, functions = best_time(regex_parse, lines, repeat)
+    parse_time, functions = best_time(parse, lines, repeat)
+
+    print "lines:           %d (%d instructions)" % (len(lines), len(fields))
+    print "regex:           %10.0f lines/s" % (len(lines) / regex_time)
+    print "tokenizer:       %10.0f lines/s (%.1fx)" % (len(lines) / tokenizer_time, regex_time / tokenizer_time)
+    print "parse (regex):   %10.0f lines/s" % (len(lines) / regex_parse_time)
+    print "parse:           %10.0f lines/s (%.1fx)" % (len(lines) / parse_time, regex_parse_time / parse_time)
+
+if __name__ == '__main__':
+    main()
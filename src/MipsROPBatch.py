@@ -0,0 +1,75 @@
+#!/usr/bin/python
+
+import argparse
+import sys
+import batch
+import utils
+
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(
+        usage="MipsROPBatch.py PATH [PATH ...] (--pattern 'SEARCH_PATTERN' ... | --pipeline GADGET_TYPES) [options]")
+    parser.add_argument('paths', metavar='PATH', nargs='+',
+                        help="objdump -d output or MIPS ELF files, directories of them, or glob patterns")
+    parser.add_argument('--pattern', '-p', action='append', default=[], metavar='SEARCH_PATTERN',
+                        help="search pattern to run on every binary, can be given more than once")
+    parser.add_argument('--jump-register', metavar='JUMP_REGISTER',
+                        help="register the gadgets found with --pattern must jump to")
+    parser.add_argument('--disallowed-registers', metavar='DISALLOWED_REGISTERS',
+                        help="registers the gadgets found with --pattern must not change, ex: a0,s*,t4-t8")
+    parser.add_argument('--pipeline', metavar='GADGET_TYPES',
+                        help="comma separated gadget_types classes to build a rop sequence from, "
+                             "ex: SRegisterLoads,LoadArgForSleep,CallToSleep,StackLocator,ControllableJump")
+    parser.add_argument('--ensure-compatible', action='store_true',
+                        help="pass ensure_compatible to ControllableJump stages of --pipeline")
+    parser.add_argument('--sequences', type=int, default=1, metavar='N',
+                        help="number of rop sequences to build per binary (default: 1)")
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS',
+                        help="seconds to spend building rop sequences per binary")
+    parser.add_argument('--output-dir', '-o', default='mipsropsearch-report',
+                        help="directory the reports are written to (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="number of binaries scanned at once, 0 for one per CPU (default: 0)")
+    parser.add_argument('--index', action='store_true',
+                        help="load binaries from their gadget indexes, creating them if they don't exist")
+    parser.add_argument('--index-dir', help="directory holding gadget index files")
+    parser.add_argument('--quiet', '-q', action='store_true', help="don't report progress on stderr")
+    return parser
+
+
+def main():
+    parser = build_argument_parser()
+    args = parser.parse_args()
+
+    if not args.pattern and not args.pipeline:
+        parser.error("at least one --pattern or a --pipeline is required")
+    pipeline = args.pipeline.split(',') if args.pipeline else []
+    try:
+        batch.build_pipeline(pipeline)
+    except ValueError as e:
+        parser.error(e)
+
+    file_paths = batch.find_binaries(args.paths)
+    if not file_paths:
+        parser.error("no files found")
+
+    disallowed_registers = (
+        utils.build_register_list_from_pattern(args.disallowed_registers) if args.disallowed_registers else None
+    )
+    job = batch.BatchJob(
+        patterns=[(pattern, disallowed_registers, args.jump_register) for pattern in args.pattern],
+        pipeline=pipeline,
+        ensure_compatible=args.ensure_compatible,
+        max_sequences=args.sequences,
+        time_budget=args.time_budget,
+        use_index=args.index,
+        index_dir=args.index_dir
+    )
+    aggregate = batch.run_batch(file_paths, job, args.output_dir, args.workers or None,
+                                None if args.quiet else sys.stderr)
+    if not args.quiet:
+        sys.stderr.write("%d binaries scanned, %d failed, reports written to %s\n" % (
+            len(file_paths), aggregate['failed'], args.output_dir))
+
+if __name__ == '__main__':
+    main()
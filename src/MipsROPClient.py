@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+import errno
+import json
+import socket
+import sys
+import MipsROPSearch
+import server
+
+
+def build_argument_parser():
+    """The same arguments as MipsROPSearch.py plus the server's socket, see MipsROPServer.py"""
+    parser = MipsROPSearch.build_argument_parser()
+    parser.usage = "MipsROPClient.py FILE_PATH 'SEARCH_PATTERN' [JUMP_REGISTER] [DISALLOWED_REGISTERS] [options]"
+    parser.add_argument('--socket', default=server.DEFAULT_SOCKET_PATH,
+                        help="path of the UNIX socket the server listens on (default: %(default)s)")
+    return parser
+
+
+def print_gadget(gadget, output_format):
+    if output_format == 'jsonl':
+        print json.dumps(gadget, sort_keys=True)
+        return
+    # the same layout as MipsROPSearch.py's text output, where instructions without operands end with a space
+    for offset, instruction in zip(gadget['offsets'], gadget['instructions']):
+        print "\t\t%s: %s" % (offset, instruction if ' ' in instruction else instruction + ' ')
+    print ""
+
+
+def main():
+    parser = build_argument_parser()
+    args = parser.parse_args()
+    if args.file_path == '-':
+        parser.error("the server can't read stdin, FILE_PATH must be a file")
+    if args.since or args.stats:
+        parser.error("--since and --stats aren't supported by the server")
+
+    try:
+        client = server.Client(args.socket)
+    except socket.error as e:
+        parser.error("Couldn't connect to the server at %s: %s" % (args.socket, e))
+    try:
+        for gadget in client.search(args.file_path, args.search_pattern, args.jump_register,
+                                    args.disallowed_registers, args.limit, args.expr):
+            print_gadget(gadget, args.format)
+            sys.stdout.flush()
+    except server.RequestError as e:
+        parser.error(e)
+    except IOError as e:
+        if e.errno != errno.EPIPE:
+            raise
+    finally:
+        client.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,40 +1,164 @@
 #!/usr/bin/python
 
+import argparse
+import errno
+import itertools
+import json
 import sys
+import compressed
+import elf_handler
+import gadget_index
+import instrumentation
+import loader
 import objdump_handler
+import query
 import utils
 
+OUTPUT_FORMATS = ['text', 'jsonl']
 
-def print_help_message(additional_lines=None):
-    print "\nUsage: MipsROPSearch.py FILE_PATH 'SEARCH_PATTERN' [JUMP_REGISTER] [DISALLOWED_REGISTERS]\n"
-    if additional_lines:
-        for line in additional_lines:
-            print "\t%s" % line
-        print ""
 
+def build_argument_parser():
+    parser = argparse.ArgumentParser(
+        usage="MipsROPSearch.py FILE_PATH 'SEARCH_PATTERN' [JUMP_REGISTER] [DISALLOWED_REGISTERS] [options]")
+    parser.add_argument('file_path', metavar='FILE_PATH',
+                        help="objdump -d output (optionally gzip, bzip2 or xz compressed), a MIPS ELF binary, "
+                             "or '-' to read objdump output from stdin")
+    parser.add_argument('search_pattern', metavar='SEARCH_PATTERN',
+                        help="search pattern, or a query expression with --expr")
+    parser.add_argument('jump_register', metavar='JUMP_REGISTER', nargs='?')
+    parser.add_argument('disallowed_registers', metavar='DISALLOWED_REGISTERS', nargs='?')
+    parser.add_argument('--index', action='store_true',
+                        help="load FILE_PATH from its gadget index, creating the index if it doesn't exist")
+    parser.add_argument('--index-dir', default=gadget_index.DEFAULT_INDEX_DIR,
+                        help="directory holding gadget index files (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of processes used to parse objdump output, 0 for one per CPU (default: 1)")
+    parser.add_argument('--since', metavar='PREVIOUS_FILE_PATH',
+                        help="load FILE_PATH incrementally from the gadget index of an earlier version of the binary, "
+                             "reporting the gadgets that appeared and disappeared on stderr")
+    parser.add_argument('--limit', '--top', type=int, metavar='N',
+                        help="stop after the first N gadgets")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='text',
+                        help="'text' (default) or 'jsonl' for one JSON object per gadget")
+    parser.add_argument('--expr', action='store_true',
+                        help="SEARCH_PATTERN is an expression combining quoted search patterns, writes(REGISTERS) and "
+                             "jumps(REGISTERS) with and, or, not and parentheses, ex: "
+                             "\"'lw s0,sp' and 'move t9,s0' and not writes(a0)\"")
+    parser.add_argument('--stats', action='store_true',
+                        help="report the time spent in each phase and counts of lines, blocks, matches, etc. on stderr")
+    return parser
 
-def main():
-    if len(sys.argv) < 3 or (len(sys.argv) > 1 and sys.argv[1] == "--help"):
-        print_help_message()
-        exit()
 
-    file_name = sys.argv[1]
-    objdump_lines = []
+def iter_search_results(args, disallowed_registers):
+    """Generator yielding each gadget matching args' search as soon as it's found
+
+    Without --expr, --index, --since or multiple workers the input is searched one function at a time while it's
+    being parsed, otherwise it's loaded first and searched with objdump_handler.iter_search() or, for --expr,
+    query.evaluate()
+    """
+    if args.expr:
+        # parsed before loading anything so mistakes are reported right away
+        expression = query.parse(args.search_pattern)
+        load_input(args)
+        result_set = query.evaluate(expression, disallowed_registers, args.jump_register)
+        for block_id, result in result_set.iter_results():
+            yield result
+        return
+
+    pattern = objdump_handler.compile_search_pattern(args.search_pattern)
+    if args.since or (args.file_path != '-' and (args.index or args.workers != 1)):
+        load_input(args)
+        for block_id, result in objdump_handler.iter_search(pattern, disallowed_registers, args.jump_register):
+            yield result
+    else:
+        if args.file_path == '-':
+            # '-' reads the objdump output from stdin so it can be piped in directly, compressed or not
+            functions = iter_functions_from_stdin()
+        else:
+            functions = loader.iter_functions_from_file(args.file_path, accumulate=False)
+        for function in functions:
+            with instrumentation.timer('search'):
+                results = [jump_block.search(pattern, disallowed_registers, args.jump_register)
+                           for jump_block in function.jump_blocks]
+            instrumentation.count('blocks_scanned', len(results))
+            for result in results:
+                if result:
+                    instrumentation.count('search_matches')
+                    yield result
+
+
+def load_input(args):
+    """Loads args' FILE_PATH (or stdin) into objdump_handler, reporting what changed on stderr for --since"""
+    if args.since:
+        print_incremental_update(loader.load_file_incrementally(args.file_path, args.since, args.index_dir))
+    elif args.file_path == '-':
+        lines = compressed.open_stream_lines(sys.stdin)
+        try:
+            objdump_handler.extract_functions_from_objdump_lines(lines, args.workers or None)
+        finally:
+            lines.close()
+    else:
+        loader.load_file(args.file_path, args.index, args.index_dir, args.workers or None)
+
+
+def iter_functions_from_stdin():
+    lines = compressed.open_stream_lines(sys.stdin)
     try:
-        f = open(file_name, 'r')
-        objdump_lines = f.readlines()
-        f.close()
-    except IOError as e:
-        print_help_message([e])
-        exit()
+        # nothing is searched afterwards, so the jump blocks are dropped along with each function
+        for function in objdump_handler.iter_functions_from_objdump_lines(lines, accumulate=False):
+            yield function
+    finally:
+        lines.close()
+
 
-    jump_register = sys.argv[3] if len(sys.argv) > 3 else None
+def print_incremental_update(update):
+    """Writes the changes found by loader.load_file_incrementally() to stderr"""
+    for prefix, gadgets in [('+', update.added_gadgets), ('-', update.removed_gadgets)]:
+        for function_name, jump_block in gadgets:
+            sys.stderr.write("%s %s: %s\n" % (prefix, function_name, "; ".join(repr(inst) for inst in jump_block)))
+    sys.stderr.write("%s\n" % update.summary())
 
-    disallowed_registers = utils.build_register_list_from_pattern(sys.argv[4]) if len(sys.argv) > 4 else []
 
-    objdump_handler.extract_functions_from_objdump_lines(objdump_lines)
-    rop_gadgets = objdump_handler.search(sys.argv[2], disallowed_registers, jump_register)
-    utils.print_list(rop_gadgets)
+def print_result(result, output_format):
+    if output_format == 'jsonl':
+        print json.dumps(utils.instruction_sequence_to_dict(result), sort_keys=True)
+    else:
+        # same layout as printing the whole list of results with utils.print_list
+        utils.print_list([result])
+
+
+def main():
+    parser = build_argument_parser()
+    args = parser.parse_args()
+    if args.limit is not None and args.limit < 0:
+        parser.error("--limit must not be negative")
+    if args.since and args.file_path == '-':
+        parser.error("--since needs FILE_PATH to be a file")
+
+    disallowed_registers = (
+        utils.build_register_list_from_pattern(args.disallowed_registers) if args.disallowed_registers else []
+    )
+
+    if args.stats:
+        instrumentation.enable()
+
+    results = iter_search_results(args, disallowed_registers)
+    if args.limit is not None:
+        # stops parsing and searching as soon as enough gadgets were found
+        results = itertools.islice(results, args.limit)
+    try:
+        with instrumentation.timer('total'):
+            for result in results:
+                print_result(result, args.format)
+                sys.stdout.flush()
+    except (IOError, OSError, elf_handler.ElfError, compressed.DecompressionError, query.QueryError) as e:
+        if getattr(e, 'errno', None) == errno.EPIPE:
+            # the reader went away (ex: piped into head), there's nothing left to do
+            return
+        parser.error(e)
+    finally:
+        if args.stats:
+            sys.stderr.write(instrumentation.STATS.report())
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/python
+
+import argparse
+import sys
+import gadget_index
+import server
+
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(usage="MipsROPServer.py [FILE_PATH ...] [options]")
+    parser.add_argument('file_paths', metavar='FILE_PATH', nargs='*',
+                        help="objdump -d output or MIPS ELF binaries to load before accepting requests, others are "
+                             "loaded the first time a client asks for them")
+    parser.add_argument('--socket', default=server.DEFAULT_SOCKET_PATH,
+                        help="path of the UNIX socket to listen on (default: %(default)s)")
+    parser.add_argument('--index', action='store_true',
+                        help="load binaries from their gadget indexes, creating them if they don't exist")
+    parser.add_argument('--index-dir', default=gadget_index.DEFAULT_INDEX_DIR,
+                        help="directory holding gadget index files (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of processes used to parse objdump output, 0 for one per CPU (default: 1)")
+    return parser
+
+
+def main():
+    parser = build_argument_parser()
+    args = parser.parse_args()
+
+    query_server = server.QueryServer(args.socket, args.index, args.index_dir, args.workers or None)
+    try:
+        for file_path in args.file_paths:
+            with query_server.lock:
+                try:
+                    corpus = query_server.corpus(file_path)
+                except server.RequestError as e:
+                    parser.error(e)
+            sys.stderr.write("Loaded %s (%d functions)\n" % (corpus.file_path, len(corpus.functions)))
+        sys.stderr.write("Listening on %s\n" % args.socket)
+        query_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        query_server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""Scans many binaries (objdump output or MIPS ELF files) with the same search patterns and/or rop.Builder pipeline,
+one binary per worker process, and writes a JSON report for each binary plus an aggregate report
+"""
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+import compressed
+import elf_handler
+import gadget_types
+import loader
+import objdump_handler
+import rop
+import utils
+
+REPORT_FILE_NAME = 'report.json'
+
+
+def find_binaries(paths):
+    """Returns the sorted list of files named by paths, expanding directories (recursively) and glob patterns
+
+    paths -- list of file paths, directory paths and glob patterns
+    """
+    file_paths = set()
+    for path in paths:
+        for match in (glob.glob(path) if glob.has_magic(path) else [path]):
+            if os.path.isdir(match):
+                for directory, directory_names, file_names in os.walk(match):
+                    file_paths.update(os.path.join(directory, file_name) for file_name in file_names)
+            else:
+                file_paths.add(match)
+    return sorted(file_paths)
+
+
+def build_pipeline(gadget_type_names, ensure_compatible=False):
+    """Returns a list of GadgetType objects from the names of classes in gadget_types
+
+    ensure_compatible -- passed to ControllableJump stages (see: gadget_types.ControllableJump)
+
+    :raises ValueError: if a name isn't a GadgetType in gadget_types
+    """
+    pipeline = []
+    for name in gadget_type_names:
+        gadget_type_class = getattr(gadget_types, name, None)
+        if not (isinstance(gadget_type_class, type) and issubclass(gadget_type_class, rop.GadgetType)):
+            raise ValueError("Unknown gadget type: %s" % name)
+        if gadget_type_class is gadget_types.ControllableJump:
+            pipeline.append(gadget_type_class(ensure_compatible=ensure_compatible))
+        else:
+            pipeline.append(gadget_type_class())
+    return pipeline
+
+
+class BatchJob(object):
+    """What to do with each binary. Picklable so it can be sent to worker processes."""
+
+    def __init__(self, patterns=None, pipeline=None, ensure_compatible=False, max_sequences=1, time_budget=None,
+                 use_index=False, index_dir=None):
+        """
+        patterns -- list of (pattern, disallowed_registers, desired_jump_register) tuples or pattern strings
+                    (see: objdump_handler.search_many())
+        pipeline -- list of names of GadgetType classes in gadget_types to build rop sequences with
+        ensure_compatible -- passed to ControllableJump stages of the pipeline
+        max_sequences -- maximum number of rop sequences to build per binary (see: rop.Builder.run_many())
+        time_budget -- optional number of seconds to spend building rop sequences per binary
+        use_index -- whether to load and store gadget indexes (see: loader.load_file())
+        index_dir -- directory holding index files
+        """
+        self.patterns = patterns or []
+        self.pipeline = pipeline or []
+        self.ensure_compatible = ensure_compatible
+        self.max_sequences = max_sequences
+        self.time_budget = time_budget
+        self.use_index = use_index
+        self.index_dir = index_dir
+
+
+def scan_binary(file_path, job):
+    """Loads file_path and runs job's searches and pipeline on it, returning the binary's report as a dict.
+    Failures to load or search the binary are recorded in the report's 'error' instead of being raised. Any other
+    exception is recorded there too, with its traceback in 'traceback', so one binary can't stop the batch.
+    """
+    start_time = time.time()
+    report = {'file': file_path, 'error': None}
+    try:
+        # every binary starts from an empty corpus, even when several are scanned by the same process
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        functions = loader.load_file(file_path, job.use_index, job.index_dir)
+        report['functions'] = len(functions)
+        report['jump_blocks'] = len(objdump_handler.ALL_JUMP_BLOCKS)
+
+        queries = [(query, None, None) if isinstance(query, basestring) else tuple(query) for query in job.patterns]
+        report['searches'] = [
+            {
+                'pattern': pattern,
+                'disallowed_registers': list(disallowed_registers or []),
+                'jump_register': desired_jump_register,
+                'gadgets': [utils.instruction_sequence_to_dict(result) for result in results]
+            }
+            for (pattern, disallowed_registers, desired_jump_register), results in zip(
+                queries, objdump_handler.search_many(queries))
+        ]
+
+        if job.pipeline:
+            builder = rop.Builder(build_pipeline(job.pipeline, job.ensure_compatible))
+            try:
+                sequences, stats = builder.run_many(job.max_sequences, job.time_budget)
+                report['sequences'] = [[utils.instruction_sequence_to_dict(gadget) for gadget in sequence]
+                                       for sequence in sequences]
+                report['build_stop_reason'] = stats.stop_reason
+            except rop.NoGadgetsError as e:
+                report['sequences'] = []
+                report['build_stop_reason'] = str(e)
+    except (IOError, OSError, ValueError, elf_handler.ElfError, compressed.DecompressionError) as e:
+        # unreadable binaries, objdump output or search patterns
+        report['error'] = "%s: %s" % (e.__class__.__name__, e)
+    except Exception as e:
+        report['error'] = "%s: %s" % (e.__class__.__name__, e)
+        report['traceback'] = traceback.format_exc()
+    report['elapsed'] = time.time() - start_time
+    return report
+
+
+def _scan_binary_task(task):
+    return scan_binary(*task)
+
+
+def summarize(report):
+    """Returns the aggregate report entry for a binary's report"""
+    summary = {
+        'file': report['file'],
+        'error': report['error'],
+        'elapsed': report['elapsed'],
+        'gadget_counts': [len(search['gadgets']) for search in report.get('searches', [])],
+    }
+    if 'sequences' in report:
+        summary['sequences'] = len(report['sequences'])
+    return summary
+
+
+def iter_reports(file_paths, job, workers=None):
+    """Generator yielding the report of each binary in file_paths as soon as it's finished, in completion order, so a
+    slow binary doesn't hold up the others
+
+    workers -- number of worker processes, each scanning one binary at a time. None for one per CPU, 1 to scan in
+               this process
+    """
+    tasks = [(file_path, job) for file_path in file_paths]
+    if workers == 1:
+        for report in itertools.imap(_scan_binary_task, tasks):
+            yield report
+        return
+
+    # a fresh process for every binary so memory from large binaries is given back as soon as they're done
+    pool = multiprocessing.Pool(workers, maxtasksperchild=1)
+    try:
+        for report in pool.imap_unordered(_scan_binary_task, tasks, chunksize=1):
+            yield report
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def report_file_name(file_path, used_names):
+    """Returns a unique name for the report of file_path within one output directory"""
+    base_name = os.path.basename(file_path) or 'binary'
+    name = "%s.json" % base_name
+    count = 1
+    while name in used_names:
+        count += 1
+        name = "%s.%d.json" % (base_name, count)
+    used_names.add(name)
+    return name
+
+
+def run_batch(file_paths, job, output_dir, workers=None, progress=sys.stderr):
+    """Scans every binary in file_paths with job, writing each binary's report to output_dir as it finishes and the
+    aggregate report (see: REPORT_FILE_NAME) at the end. Returns the aggregate report.
+
+    progress -- file to write a line to as each binary finishes, None for no progress
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    start_time = time.time()
+    summaries = []
+    used_names = set([REPORT_FILE_NAME])
+    for report in iter_reports(file_paths, job, workers):
+        summary = summarize(report)
+        summary['report'] = report_file_name(report['file'], used_names)
+        _write_json(os.path.join(output_dir, summary['report']), report)
+        summaries.append(summary)
+
+        if progress is not None:
+            if report['error']:
+                outcome = "error: %s" % report['error']
+            else:
+                outcome = "%d gadgets" % sum(summary['gadget_counts'])
+                if 'sequences' in summary:
+                    outcome += ", %d sequences" % summary['sequences']
+            progress.write("[%d/%d] %s: %s (%.1fs)\n" % (
+                len(summaries), len(file_paths), report['file'], outcome, report['elapsed']))
+            progress.flush()
+
+    aggregate = {
+        'patterns': job.patterns,
+        'pipeline': job.pipeline,
+        'binaries': sorted(summaries, key=lambda summary: summary['file']),
+        'failed': sum(1 for summary in summaries if summary['error']),
+        'elapsed': time.time() - start_time,
+    }
+    _write_json(os.path.join(output_dir, REPORT_FILE_NAME), aggregate)
+    return aggregate
+
+
+def _write_json(path, data):
+    f = open(path, 'w')
+    try:
+        json.dump(data, f, indent=2, separators=(',', ': '), sort_keys=True)
+        f.write("\n")
+    finally:
+        f.close()
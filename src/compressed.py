@@ -0,0 +1,257 @@
+"""Reads objdump output compressed with gzip, bzip2 or xz as it's parsed, without decompressing it to disk first
+
+The compression is detected from the first bytes of the input rather than the file name, so anything that opens
+objdump output through open_lines() or open_stream_lines() also accepts compressed input. Decompression runs in a
+background thread (or, for xz without the lzma module, an xz process) a few chunks ahead of the parser, so the two
+overlap.
+
+xz needs the lzma module (Python 3, or backports.lzma on Python 2), otherwise the xz command is used.
+"""
+import bz2
+import Queue
+import subprocess
+import threading
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# compression name -> the magic number its streams start with
+MAGIC_NUMBERS = {
+    'gzip': '\x1f\x8b',
+    'bzip2': 'BZh',
+    'xz': '\xfd7zXZ\x00',
+}
+MAGIC_LENGTH = max(len(magic) for magic in MAGIC_NUMBERS.itervalues())
+
+# bytes of compressed input read at a time, and decompressed chunks the background thread can get ahead of the parser
+CHUNK_SIZE = 1 << 16
+READ_AHEAD_CHUNKS = 16
+
+XZ_COMMAND = ['xz', '--decompress', '--stdout']
+
+
+class DecompressionError(Exception):
+    """Raised when compressed input is corrupt or can't be decompressed"""
+    pass
+
+
+def detect_compression(header):
+    """Returns 'gzip', 'bzip2' or 'xz' if header (the first bytes of a file) is the start of a stream compressed with
+    it, otherwise None
+    """
+    for compression, magic in MAGIC_NUMBERS.iteritems():
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def open_lines(file_path):
+    """Opens the file at file_path for iterating over its lines, decompressing them as they're read if it's
+    compressed. Returns the file itself if it isn't, otherwise a DecompressedLines. Either has to be closed.
+    """
+    f = open(file_path, 'rb')
+    try:
+        compression = detect_compression(f.read(MAGIC_LENGTH))
+        f.seek(0)
+    except:
+        f.close()
+        raise
+    if compression is None:
+        return f
+    return DecompressedLines(f, compression)
+
+
+def open_stream_lines(stream):
+    """Same as open_lines() for a stream that may not be seekable, ex: sys.stdin. Returns an iterable over its lines
+    that has to be closed, closing it doesn't close stream.
+    """
+    header = stream.read(MAGIC_LENGTH)
+    compression = detect_compression(header)
+    if compression is None:
+        return _StreamLines(header, stream)
+    return DecompressedLines(stream, compression, header, close_input=False)
+
+
+class _StreamLines(object):
+    """Lines of an uncompressed stream whose first bytes have already been read"""
+
+    def __init__(self, header, stream):
+        self.header = header
+        self.stream = stream
+
+    def __iter__(self):
+        # the header can hold several short lines and the start of another
+        header_lines = self.header.split('\n')
+        for line in header_lines[:-1]:
+            yield line + '\n'
+        if header_lines[-1]:
+            yield header_lines[-1] + self.stream.readline()
+        for line in self.stream:
+            yield line
+
+    def close(self):
+        pass
+
+
+class DecompressedLines(object):
+    """Iterable over the lines of a compressed stream, decompressed in the background as they're iterated over
+
+    Concatenated streams (ex: from pigz or pbzip2) are decompressed one after another like the gzip, bzip2 and xz
+    commands do.
+    """
+
+    def __init__(self, compressed_file, compression, header='', close_input=True):
+        """
+        compressed_file -- file object positioned at the start of the compressed data, or right after header
+        compression -- 'gzip', 'bzip2' or 'xz' (see: detect_compression())
+        header -- bytes of the compressed data already read from compressed_file
+        close_input -- whether close() closes compressed_file
+        """
+        self.compressed_file = compressed_file
+        self.compression = compression
+        self.close_input = close_input
+        self._header = header
+        self._thread = None
+        self._process = None
+        self._stopped = threading.Event()
+        self._chunks = Queue.Queue(READ_AHEAD_CHUNKS)
+
+    def __iter__(self):
+        if self.compression == 'xz' and lzma is None:
+            return self._iter_xz_command_lines()
+        return self._iter_lines()
+
+    def _iter_lines(self):
+        self._thread = threading.Thread(target=self._decompress_chunks)
+        self._thread.daemon = True
+        self._thread.start()
+        pending = ''
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            lines = (pending + chunk).split('\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        if pending:
+            yield pending
+
+    def _new_decompressor(self):
+        if self.compression == 'gzip':
+            # 16 + MAX_WBITS expects a gzip header and trailer around the deflate data
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.compression == 'bzip2':
+            return bz2.BZ2Decompressor()
+        return lzma.LZMADecompressor()
+
+    def _decompress_chunks(self):
+        """Runs in the background thread, putting decompressed chunks in self._chunks followed by None, or the
+        exception that stopped it
+        """
+        try:
+            decompressor = self._new_decompressor()
+            compressed = self._header
+            while not self._stopped.is_set():
+                if not compressed:
+                    compressed = self.compressed_file.read(CHUNK_SIZE)
+                    if not compressed:
+                        break
+                try:
+                    self._put(decompressor.decompress(compressed))
+                except EOFError:
+                    # bz2 and lzma: the previous stream ended right at the end of the last chunk read
+                    decompressor = self._new_decompressor()
+                    continue
+                compressed = decompressor.unused_data
+                if compressed:
+                    # the end of a stream, another one may follow
+                    decompressor = self._new_decompressor()
+            else:
+                return
+            if not _stream_ended(decompressor):
+                raise DecompressionError("Truncated %s input" % self.compression)
+            self._put(None)
+        except Exception as e:
+            if not isinstance(e, DecompressionError):
+                e = DecompressionError("Invalid %s input: %s" % (self.compression, e))
+            self._put(e)
+
+    def _put(self, item):
+        """Adds item to the chunks read ahead, waiting for the parser to catch up unless it stopped reading"""
+        if not item and item is not None:
+            return
+        while not self._stopped.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except Queue.Full:
+                pass
+
+    def _iter_xz_command_lines(self):
+        try:
+            self._process = subprocess.Popen(XZ_COMMAND, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                             stderr=subprocess.PIPE)
+        except OSError as e:
+            raise DecompressionError("Reading xz input needs the lzma module or the xz command: %s" % e)
+        self._thread = threading.Thread(target=self._feed_xz_command)
+        self._thread.daemon = True
+        self._thread.start()
+        for line in self._process.stdout:
+            yield line
+        self._thread.join()
+        if self._process.wait() != 0:
+            raise DecompressionError("Invalid xz input: %s" % self._process.stderr.read().strip())
+
+    def _feed_xz_command(self):
+        """Runs in the background thread, writing the compressed input to the xz process"""
+        try:
+            compressed = self._header or self.compressed_file.read(CHUNK_SIZE)
+            while compressed and not self._stopped.is_set():
+                self._process.stdin.write(compressed)
+                compressed = self.compressed_file.read(CHUNK_SIZE)
+        except IOError:
+            # the process exited early, its exit status says why
+            pass
+        finally:
+            self._process.stdin.close()
+
+    def close(self):
+        """Stops decompressing and closes the compressed file (unless close_input was False)"""
+        self._stopped.set()
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        if self._thread is not None:
+            self._thread.join()
+        if self.close_input:
+            self.compressed_file.close()
+
+
+def _stream_ended(decompressor):
+    """Returns True if decompressor has reached the end of its compressed stream"""
+    if hasattr(decompressor, 'eof'):
+        # lzma's decompressors
+        return decompressor.eof
+    if isinstance(decompressor, bz2.BZ2Decompressor):
+        # bz2 refuses any more data once the stream has ended
+        try:
+            decompressor.decompress('')
+        except EOFError:
+            return True
+        return False
+    # zlib puts data following the end of the stream in unused_data
+    probe = decompressor.copy()
+    try:
+        probe.decompress('\0')
+    except zlib.error:
+        return False
+    return bool(probe.unused_data)
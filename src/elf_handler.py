@@ -0,0 +1,229 @@
+import bisect
+import mmap
+import re
+import struct
+import instrumentation
+import mips_decoder
+import objdump_handler
+
+ELF_MAGIC = '\x7fELF'
+ELF_CLASS_32 = 1
+ELF_DATA_LITTLE_ENDIAN = 1
+ELF_DATA_BIG_ENDIAN = 2
+MACHINE_MIPS = (8, 10)  # EM_MIPS, EM_MIPS_RS3_LE
+
+SECTION_TYPE_SYMTAB = 2
+SECTION_TYPE_DYNSYM = 11
+
+SYMBOL_TYPE_NOTYPE = 0
+SYMBOL_TYPE_OBJECT = 1
+SYMBOL_TYPE_FUNC = 2
+SYMBOL_BIND_LOCAL = 0
+
+#                        ident|type|mach|ver|entry|phoff|shoff|flags|ehsize|phentsize|phnum|shentsize|shnum|shstrndx
+ELF_HEADER_FORMAT = '16sHHIIIIIHHHHHH'
+#                        name|type|flags|addr|offset|size|link|info|addralign|entsize
+SECTION_HEADER_FORMAT = 'IIIIIIIIII'
+#                        name|value|size|info|other|shndx
+SYMBOL_FORMAT = 'IIIBBH'
+
+# the operator and operands the instruction line regex would capture from a decoded instruction
+OPERATOR_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+class ElfError(Exception):
+    """Raised when a file isn't an ELF file this module can disassemble"""
+    pass
+
+
+def is_elf_file(file_path):
+    """Returns True if the file at file_path starts with the ELF magic number"""
+    f = open(file_path, 'rb')
+    try:
+        return f.read(len(ELF_MAGIC)) == ELF_MAGIC
+    finally:
+        f.close()
+
+
+def parse_elf_file(file_path):
+    """Decodes the .text section of a MIPS ELF file into Functions the same way parse_objdump_output_file does for
+    objdump output, storing them in objdump_handler.OBJDUMP_FUNCTIONS and their jump blocks in
+    objdump_handler.ALL_JUMP_BLOCKS. Returns the list of Functions.
+
+    file_path -- path to a 32-bit big or little endian MIPS ELF file
+    """
+    with instrumentation.timer('parse'):
+        functions = list(iter_functions_from_elf_file(file_path))
+    if instrumentation.ENABLED:
+        instrumentation.count('functions_parsed', len(functions))
+        instrumentation.count('instructions_parsed', sum(len(function.instructions) for function in functions))
+        instrumentation.count('jump_blocks_extracted', sum(len(function.jump_blocks) for function in functions))
+    objdump_handler.OBJDUMP_FUNCTIONS = functions
+    return functions
+
+
+def iter_functions_from_elf_file(file_path, accumulate=True):
+    """Generator that memory maps the ELF file at file_path and yields each Function (with its jump blocks already
+    extracted) in address order.
+
+    file_path -- path to a 32-bit big or little endian MIPS ELF file
+    accumulate -- whether to add the jump blocks to objdump_handler.ALL_JUMP_BLOCKS, see:
+                  objdump_handler.iter_functions_from_objdump_lines()
+    """
+    f = open(file_path, 'rb')
+    try:
+        elf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+    try:
+        reader = ElfReader(elf)
+        for function in reader.iter_functions(accumulate):
+            yield function
+    finally:
+        elf.close()
+
+
+class ElfReader(object):
+    """Reads the section headers, .text section, and symbol table from a memory mapped MIPS ELF file"""
+
+    def __init__(self, elf):
+        """
+        elf -- buffer (normally an mmap) containing the whole ELF file
+        """
+        self.elf = elf
+        if elf[:len(ELF_MAGIC)] != ELF_MAGIC:
+            raise ElfError("Not an ELF file")
+        if ord(elf[4]) != ELF_CLASS_32:
+            raise ElfError("Only 32-bit ELF files are supported")
+
+        data_encoding = ord(elf[5])
+        if data_encoding == ELF_DATA_LITTLE_ENDIAN:
+            self.endian = '<'
+        elif data_encoding == ELF_DATA_BIG_ENDIAN:
+            self.endian = '>'
+        else:
+            raise ElfError("Unknown ELF data encoding: %d" % data_encoding)
+
+        header = self._unpack(ELF_HEADER_FORMAT, 0)
+        machine, section_header_offset = header[2], header[6]
+        section_header_size, section_count, section_names_index = header[11], header[12], header[13]
+        if machine not in MACHINE_MIPS:
+            raise ElfError("Not a MIPS ELF file (e_machine: %d)" % machine)
+
+        self.sections = [
+            self._unpack(SECTION_HEADER_FORMAT, section_header_offset + i * section_header_size)
+            for i in xrange(section_count)
+        ]
+        section_names_offset = self.sections[section_names_index][4]
+        self.section_names = [self._read_string(section_names_offset + section[0]) for section in self.sections]
+
+        try:
+            self.text_index = self.section_names.index('.text')
+        except ValueError:
+            raise ElfError("No .text section found")
+        self.text_address = self.sections[self.text_index][3]
+        self.text_offset = self.sections[self.text_index][4]
+        self.text_size = self.sections[self.text_index][5]
+
+        self.symbols = self._read_text_symbols()
+        self._symbol_addresses = [address for address, name in self.symbols]
+
+    def _unpack(self, fmt, offset):
+        return struct.unpack_from(self.endian + fmt, self.elf, offset)
+
+    def _read_string(self, offset):
+        """Returns the null terminated string starting at offset"""
+        end = self.elf.find('\0', offset)
+        return self.elf[offset:end]
+
+    def _read_text_symbols(self):
+        """Returns a sorted list of (address, name) for symbols in .text, using .dynsym if there is no .symtab"""
+        symbol_table_types = [section[1] for section in self.sections]
+        if SECTION_TYPE_SYMTAB in symbol_table_types:
+            symbol_table = self.sections[symbol_table_types.index(SECTION_TYPE_SYMTAB)]
+        elif SECTION_TYPE_DYNSYM in symbol_table_types:
+            symbol_table = self.sections[symbol_table_types.index(SECTION_TYPE_DYNSYM)]
+        else:
+            return []
+
+        string_table_offset = self.sections[symbol_table[6]][4]
+        symbol_size = symbol_table[9] or struct.calcsize(SYMBOL_FORMAT)
+        text_end = self.text_address + self.text_size
+
+        # address -> (preference, name); when symbols share an address keep a global function over anything else
+        by_address = {}
+        for i in xrange(symbol_table[5] / symbol_size):
+            name_offset, value, size, info, other, section_index = self._unpack(
+                SYMBOL_FORMAT, symbol_table[4] + i * symbol_size)
+            symbol_type, symbol_bind = info & 0xf, info >> 4
+            if (
+                section_index != self.text_index or
+                symbol_type not in (SYMBOL_TYPE_NOTYPE, SYMBOL_TYPE_OBJECT, SYMBOL_TYPE_FUNC) or
+                not self.text_address <= value < text_end
+            ):
+                continue
+            name = self._read_string(string_table_offset + name_offset)
+            if not name:
+                continue
+            preference = (symbol_type == SYMBOL_TYPE_FUNC, symbol_bind != SYMBOL_BIND_LOCAL)
+            if value not in by_address or preference > by_address[value][0]:
+                by_address[value] = (preference, name)
+
+        return sorted((address, name) for address, (preference, name) in by_address.iteritems())
+
+    def symbolize(self, address):
+        """Returns the '<symbol+0xoffset>' objdump would print for a branch or jump target or None"""
+        i = bisect.bisect_right(self._symbol_addresses, address) - 1
+        if i < 0:
+            return None
+        symbol_address, name = self.symbols[i]
+        if address == symbol_address:
+            return "<%s>" % name
+        return "<%s+0x%x>" % (name, address - symbol_address)
+
+    def _function_ranges(self):
+        """Returns a list of (start address, end address, name) covering .text, split at each symbol"""
+        boundaries = list(self.symbols)
+        if not boundaries or boundaries[0][0] != self.text_address:
+            # code before the first symbol (or a stripped binary) is labeled with the section name like objdump does
+            boundaries.insert(0, (self.text_address, '.text'))
+        text_end = self.text_address + self.text_size
+        ends = [address for address, name in boundaries[1:]] + [text_end]
+        return [(start, end, name) for (start, name), end in zip(boundaries, ends)]
+
+    def iter_functions(self, accumulate=True):
+        """Generator that decodes and yields each Function in .text (with its jump blocks already extracted)"""
+        for start, name, words in self.iter_function_words():
+            yield self.decode_function(start, name, words, accumulate)
+
+    def iter_function_words(self):
+        """Generator that yields (start address, name, tuple of instruction words) for each function in .text
+        without decoding them
+        """
+        for start, end, name in self._function_ranges():
+            # instructions are always word aligned, any trailing bytes can't be decoded
+            word_count = (end - start) / 4
+            words = struct.unpack_from(
+                "%s%dI" % (self.endian, word_count), self.elf, self.text_offset + start - self.text_address)
+            yield start, name, words
+
+    def decode_function(self, start, name, words, accumulate=True):
+        """Returns the Function (with its jump blocks extracted) for the instruction words of a function at start"""
+        function = objdump_handler.Function.from_fields("%08x" % start, name)
+        address = start
+        for word in words:
+            function.instructions.append(self.decode_instruction(word, address))
+            address += 4
+        function.extract_jump_blocks(accumulate)
+        return function
+
+    def decode_instruction(self, word, address):
+        """Returns an Instruction for the word at address with the fields objdump text would have produced"""
+        mnemonic, operands = mips_decoder.decode(word, address, self.symbolize)
+        # the instruction line regex only captures alphanumeric operators so, for example, 'c.eq.d' becomes 'c'
+        # and its operands are dropped. do the same so results match those from parsed objdump text
+        operator = OPERATOR_PATTERN.match(mnemonic).group(0)
+        if len(operator) != len(mnemonic):
+            operands = ''
+        return objdump_handler.Instruction.from_fields(address, word, operator, operands)
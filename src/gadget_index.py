@@ -0,0 +1,500 @@
+"""Persistent, memory mapped index of the functions, instructions and jump blocks parsed from a binary
+
+The index is a columnar binary file: every column is a flat array of little endian uint32 values, so loading it is
+only a matter of memory mapping the file and reading the header. Columns are read in place from the memory map, and
+strings, Instructions, Functions and jump blocks are decoded or created from them on first access instead of all at
+once. The postings of the objdump_handler.InstructionIndex are stored too and read when a search first looks up their
+key, so searches after a load only create the blocks they look at.
+
+Layout:
+    header  -- INDEX_MAGIC, INDEX_VERSION, and an (offset, count) pair for every column in COLUMNS
+    columns -- uint32 arrays, 4 byte aligned, in the order of COLUMNS
+"""
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import objdump_handler
+
+INDEX_MAGIC = 'MRSINDEX'
+INDEX_VERSION = 2
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser('~'), '.mipsropsearch')
+
+# columns are stored in this order. those ending in '_start' hold one more entry than the table they belong to
+# so that the entries for row i are column[start[i]:start[i+1]]
+COLUMNS = [
+    'string_start',           # offsets into string_data for each interned string
+    'string_data',            # utf-8 bytes of all strings, padded to a multiple of 4
+    'instruction_address',
+    'instruction_raw',
+    'instruction_operator',   # string id
+    'instruction_operand_start',
+    'operand',                # string id of each operand, referenced by instruction_operand_start
+    'function_start',
+    'function_name',          # string id
+    'function_instruction_start',
+    'function_block_start',
+    'block_instruction',      # index of the block's first instruction in the instruction columns
+    'block_length',
+    'block_change_start',
+    'change_register',        # string id of a register in a block's register_changes
+    'change_index',           # the index within the block where that register was last changed
+    'posting_operator',       # string id of the operator of each (operator, first operand) InstructionIndex key
+    'posting_operand',        # string id of the first operand of each key
+    'posting_start',
+    'posting_block',          # block id of each posting, referenced by posting_start
+    'posting_instruction',    # index of the posting's instruction within its block
+]
+
+HEADER_FORMAT = '<8sI' + 'II' * len(COLUMNS)
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+COLUMN_ITEM = struct.Struct('<I')
+
+
+class IndexFormatError(Exception):
+    """Raised when an index file is missing, truncated or written by an incompatible version"""
+    pass
+
+
+def content_hash(file_path):
+    """Returns the hex sha1 of the contents of the file at file_path, used to key its index"""
+    sha1 = hashlib.sha1()
+    f = open(file_path, 'rb')
+    try:
+        for chunk in iter(lambda: f.read(1 << 20), ''):
+            sha1.update(chunk)
+    finally:
+        f.close()
+    return sha1.hexdigest()
+
+
+def index_path_for(file_path, index_dir=None):
+    """Returns the path of the index file for the contents of file_path
+
+    index_dir -- directory holding index files, defaults to DEFAULT_INDEX_DIR
+    """
+    return os.path.join(index_dir or DEFAULT_INDEX_DIR, "%s.idx" % content_hash(file_path))
+
+
+def write_index(index_path, functions):
+    """Writes functions, their instructions and their jump blocks (including register_changes) to index_path
+
+    functions -- list of Function objects with jump blocks already extracted
+    """
+    strings = _StringTable()
+    columns = dict((name, array.array('I')) for name in COLUMNS)
+
+    columns['instruction_operand_start'].append(0)
+    columns['function_instruction_start'].append(0)
+    columns['function_block_start'].append(0)
+    columns['block_change_start'].append(0)
+    columns['posting_start'].append(0)
+
+    instruction_count = 0
+    jump_blocks = []
+    for function in functions:
+        columns['function_start'].append(int(function.start, 16))
+        columns['function_name'].append(strings.id(function.name))
+
+        # jump blocks are slices of function.instructions, so they're stored as a position and a length
+        instruction_positions = {}
+        for instruction in function.instructions:
+            instruction_positions[id(instruction)] = instruction_count
+            instruction_count += 1
+            columns['instruction_address'].append(instruction.address)
+            columns['instruction_raw'].append(instruction.raw_word)
+            columns['instruction_operator'].append(strings.id(instruction.operator))
+            columns['operand'].extend(strings.id(operand) for operand in instruction.operands)
+            columns['instruction_operand_start'].append(len(columns['operand']))
+
+        jump_blocks.extend(function.jump_blocks)
+        for jump_block in function.jump_blocks:
+            columns['block_instruction'].append(instruction_positions[id(jump_block[0])])
+            columns['block_length'].append(len(jump_block))
+            for register, index in sorted(jump_block.register_changes.iteritems()):
+                columns['change_register'].append(strings.id(register))
+                columns['change_index'].append(index)
+            columns['block_change_start'].append(len(columns['change_register']))
+
+        columns['function_instruction_start'].append(instruction_count)
+        columns['function_block_start'].append(len(columns['block_instruction']))
+
+    # block ids are positions in the concatenated jump blocks, the same as in ALL_JUMP_BLOCKS once installed
+    instruction_index = objdump_handler.InstructionIndex(jump_blocks)
+    instruction_index.update()
+    for (operator, first_operand), (block_ids, instruction_indexes) in sorted(instruction_index.postings.iteritems()):
+        columns['posting_operator'].append(strings.id(operator))
+        columns['posting_operand'].append(strings.id(first_operand))
+        columns['posting_block'].extend(block_ids)
+        columns['posting_instruction'].extend(instruction_indexes)
+        columns['posting_start'].append(len(columns['posting_block']))
+
+    columns['string_start'], columns['string_data'] = strings.columns()
+
+    index_dir = os.path.dirname(index_path)
+    if index_dir and not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+
+    # write to a temporary file and rename it so a partially written index is never loaded
+    temp_path = "%s.%d.tmp" % (index_path, os.getpid())
+    f = open(temp_path, 'wb')
+    try:
+        header = [INDEX_MAGIC, INDEX_VERSION]
+        offset = HEADER_SIZE
+        for name in COLUMNS:
+            header.extend([offset, len(columns[name])])
+            offset += 4 * len(columns[name])
+        f.write(struct.pack(HEADER_FORMAT, *header))
+        for name in COLUMNS:
+            f.write(_to_little_endian(columns[name]).tostring())
+    finally:
+        f.close()
+    os.rename(temp_path, index_path)
+
+
+def _to_little_endian(column):
+    if sys.byteorder == 'big':
+        column = array.array('I', column)
+        column.byteswap()
+    return column
+
+
+class _StringTable(object):
+    """Assigns ids to strings as they're added so each distinct operator, operand and name is stored once"""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def id(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def columns(self):
+        """Returns the string_start and string_data columns for the strings added so far"""
+        starts = array.array('I', [0])
+        data = []
+        length = 0
+        for string in self.strings:
+            encoded = string.encode('utf-8')
+            data.append(encoded)
+            length += len(encoded)
+            starts.append(length)
+        data = ''.join(data)
+        data += '\0' * (-len(data) % 4)
+        return starts, array.array('I', data)
+
+
+class GadgetIndex(object):
+    """A memory mapped index file that materializes Functions and jump blocks on first access"""
+
+    def __init__(self, index_path):
+        """
+        index_path -- path to a file written by write_index()
+
+        :raises IndexFormatError: if the file is not a readable index of the current version
+        """
+        try:
+            f = open(index_path, 'rb')
+        except IOError as e:
+            raise IndexFormatError(str(e))
+        try:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error) as e:
+            raise IndexFormatError(str(e))
+        finally:
+            f.close()
+
+        if len(self._map) < HEADER_SIZE:
+            raise IndexFormatError("Index file is truncated")
+        header = struct.unpack_from(HEADER_FORMAT, self._map, 0)
+        if header[0] != INDEX_MAGIC or header[1] != INDEX_VERSION:
+            raise IndexFormatError("Not a version %d gadget index" % INDEX_VERSION)
+
+        self._column_locations = {}
+        for i, name in enumerate(COLUMNS):
+            offset, count = header[2 + 2 * i], header[3 + 2 * i]
+            if offset + 4 * count > len(self._map):
+                raise IndexFormatError("Index file is truncated")
+            self._column_locations[name] = (offset, count)
+        self._columns = {}
+
+        self.function_count = self._column_locations['function_start'][1]
+        self.block_count = self._column_locations['block_instruction'][1]
+        self._strings = [None] * (self._column_locations['string_start'][1] - 1)
+        self._instructions = {}
+        self._functions = [None] * self.function_count
+        self._blocks = [None] * self.block_count
+
+        self.functions = _LazySequence(self.function_count, self.function)
+        self.jump_blocks = _LazySequence(self.block_count, self.jump_block)
+
+    def close(self):
+        self._map.close()
+
+    def install(self):
+        """Makes this index the data searched by objdump_handler and returns its functions"""
+        objdump_handler.OBJDUMP_FUNCTIONS = self.functions
+        objdump_handler.ALL_JUMP_BLOCKS = self.jump_blocks
+        objdump_handler.INSTRUCTION_INDEX = self.instruction_index()
+        return self.functions
+
+    def instruction_index(self):
+        """Returns the objdump_handler.InstructionIndex of self.jump_blocks from the stored postings, without creating
+        any block. Only the keys are read here, each key's postings are read the first time it's looked up
+        """
+        index = objdump_handler.InstructionIndex(self.jump_blocks)
+        operators = self._column('posting_operator')
+        operands = self._column('posting_operand')
+        key_ids = dict(
+            ((self.string(operators[key_id]), self.string(operands[key_id])), key_id)
+            for key_id in xrange(len(operators))
+        )
+        index.postings = _StoredPostings(key_ids, self._postings)
+        index.indexed_count = self.block_count
+        return index
+
+    def _postings(self, key_id):
+        """Returns the (block ids, instruction indexes) arrays of the stored postings of key_id"""
+        starts = self._column('posting_start')
+        start, end = starts[key_id], starts[key_id + 1]
+        return self._column('posting_block')[start:end], self._column('posting_instruction')[start:end]
+
+    def _column(self, name):
+        """Returns the named column, read in place from the memory map"""
+        column = self._columns.get(name)
+        if column is None:
+            offset, count = self._column_locations[name]
+            column = self._columns[name] = _Column(self._map, offset, count)
+        return column
+
+    def string(self, string_id):
+        """Returns the interned string for string_id, decoding it the first time"""
+        string = self._strings[string_id]
+        if string is None:
+            starts = self._column('string_start')
+            offset = self._column_locations['string_data'][0]
+            string = self._strings[string_id] = str(
+                self._map[offset + starts[string_id]:offset + starts[string_id + 1]].decode('utf-8'))
+        return string
+
+    def instruction(self, position):
+        """Returns the Instruction at position in the instruction columns"""
+        instruction = self._instructions.get(position)
+        if instruction is None:
+            operand_start = self._column('instruction_operand_start')
+            instruction = self._instructions[position] = self._create_instruction(
+                self._column('instruction_address')[position], self._column('instruction_raw')[position],
+                self._column('instruction_operator')[position],
+                self._column('operand')[operand_start[position]:operand_start[position + 1]])
+        return instruction
+
+    def _create_instruction(self, address, raw_word, operator, operands):
+        # strings that were already decoded are looked up directly since blocks share most of them
+        strings = self._strings
+        return objdump_handler.Instruction.from_fields(
+            address, raw_word, strings[operator] or self.string(operator),
+            ",".join([strings[operand] or self.string(operand) for operand in operands])
+        )
+
+    def jump_block(self, block_id):
+        """Returns the jump block (InstructionSequence) with the stored register_changes for block_id"""
+        block = self._blocks[block_id]
+        if block is None:
+            change_start = self._column('block_change_start')
+            start, end = change_start[block_id], change_start[block_id + 1]
+            register_changes = dict(
+                (self.string(register), index) for register, index in
+                zip(self._column('change_register').slice(start, end), self._column('change_index').slice(start, end))
+            )
+
+            # the block's instructions are contiguous, so its part of each column is read at once
+            first = self._column('block_instruction')[block_id]
+            last = first + self._column('block_length')[block_id]
+            addresses = self._column('instruction_address').slice(first, last)
+            raw_words = self._column('instruction_raw').slice(first, last)
+            operators = self._column('instruction_operator').slice(first, last)
+            operand_start = self._column('instruction_operand_start').slice(first, last + 1)
+            operands = self._column('operand').slice(operand_start[0], operand_start[-1])
+            instructions = []
+            for i in xrange(last - first):
+                instruction = self._instructions.get(first + i)
+                if instruction is None:
+                    instruction = self._instructions[first + i] = self._create_instruction(
+                        addresses[i], raw_words[i], operators[i],
+                        operands[operand_start[i] - operand_start[0]:operand_start[i + 1] - operand_start[0]])
+                instructions.append(instruction)
+            block = self._blocks[block_id] = objdump_handler.InstructionSequence(instructions, register_changes)
+        return block
+
+    def function_header(self, function_id):
+        """Returns (start address as an integer, name) for function_id without creating its Function"""
+        return (
+            self._column('function_start')[function_id],
+            self.string(self._column('function_name')[function_id])
+        )
+
+    def function_words(self, function_id):
+        """Returns an array of the raw instruction words of function_id without creating its Instructions"""
+        instruction_start = self._column('function_instruction_start')
+        return self._column('instruction_raw')[instruction_start[function_id]:instruction_start[function_id + 1]]
+
+    def function(self, function_id):
+        """Returns the Function for function_id with its instructions and jump blocks"""
+        function = self._functions[function_id]
+        if function is None:
+            function = objdump_handler.Function.from_fields(
+                "%08x" % self._column('function_start')[function_id],
+                self.string(self._column('function_name')[function_id])
+            )
+            instruction_start = self._column('function_instruction_start')
+            block_start = self._column('function_block_start')
+            function.instructions = [
+                self.instruction(position)
+                for position in xrange(instruction_start[function_id], instruction_start[function_id + 1])
+            ]
+            function.jump_blocks = [
+                self.jump_block(block_id)
+                for block_id in xrange(block_start[function_id], block_start[function_id + 1])
+            ]
+            self._functions[function_id] = function
+        return function
+
+
+class _Column(object):
+    """Read only uint32 column of an index, read in place from its memory map. Slices are copied into arrays"""
+
+    def __init__(self, buffer, offset, count):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._count)
+            if step != 1:
+                raise ValueError("column slices can't have a step")
+            return self.slice(start, max(start, stop))
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("index out of range")
+        return COLUMN_ITEM.unpack_from(self._buffer, self._offset + 4 * i)[0]
+
+    def slice(self, start, stop):
+        """Returns an array of the items from start up to stop, which must be within the column"""
+        return _to_little_endian(array.array('I', self._buffer[self._offset + 4 * start:self._offset + 4 * stop]))
+
+    def __iter__(self):
+        for i in xrange(self._count):
+            yield COLUMN_ITEM.unpack_from(self._buffer, self._offset + 4 * i)[0]
+
+
+class _StoredPostings(dict):
+    """InstructionIndex.postings whose stored entries are read from the index the first time their key is looked up
+
+    Keys added after loading (ex: by InstructionIndex.update()) are kept like in a dict.
+    """
+
+    def __init__(self, key_ids, load):
+        """
+        key_ids -- dict of every stored (operator, first operand) key to its id in the index
+        load -- function returning the (block ids, instruction indexes) arrays of a key id
+        """
+        dict.__init__(self)
+        self._key_ids = key_ids
+        self._load = load
+
+    def __missing__(self, key):
+        key_id = self._key_ids.get(key)
+        if key_id is None:
+            raise KeyError(key)
+        postings = self[key] = self._load(key_id)
+        return postings
+
+    def __contains__(self, key):
+        return key in self._key_ids or dict.__contains__(self, key)
+
+    def has_key(self, key):
+        return key in self
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __len__(self):
+        return len(self._key_ids) + sum(1 for key in dict.__iter__(self) if key not in self._key_ids)
+
+    def __iter__(self):
+        for key in self._key_ids:
+            yield key
+        for key in dict.__iter__(self):
+            if key not in self._key_ids:
+                yield key
+
+    iterkeys = __iter__
+
+    def keys(self):
+        return list(self)
+
+    def iteritems(self):
+        for key in self:
+            yield key, self[key]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def itervalues(self):
+        for key in self:
+            yield self[key]
+
+    def values(self):
+        return list(self.itervalues())
+
+
+class _LazySequence(object):
+    """Sequence whose first length items are created by a factory the first time they are accessed
+
+    Items can be appended and extended like a list's, ex: the jump blocks of functions parsed after the index was
+    installed as objdump_handler.ALL_JUMP_BLOCKS.
+    """
+
+    def __init__(self, length, factory):
+        self._length = length
+        self._factory = factory
+        self._appended = []
+
+    def __len__(self):
+        return self._length + len(self._appended)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("index out of range")
+        if i >= self._length:
+            return self._appended[i - self._length]
+        return self._factory(i)
+
+    def __iter__(self):
+        for i in xrange(self._length):
+            yield self._factory(i)
+        for item in self._appended:
+            yield item
+
+    def append(self, item):
+        self._appended.append(item)
+
+    def extend(self, items):
+        self._appended.extend(items)
@@ -1,5 +1,5 @@
 from rop import GadgetType, Gadget
-from objdump_handler import InstructionSequence
+from objdump_handler import InstructionSequence, SearchPattern, get_search_registry, search_query_key
 
 
 class SRegisterLoads(GadgetType):
@@ -55,19 +55,38 @@ class CallToSleep(GadgetType):
     The first will jump into sleep and the second will jump to the next gadget
     """
 
-    def search(self):
+    def search_query(self):
+        """The gadgets are built from ControllableJump's results so they can be found in the same pass as the others"""
+        return ControllableJump.search_pattern, None, None
+
+    def search(self, results=None):
         """
         This one is special since GadgetType.search searches each jump block individually and we need to find a gadget with two.
         This is accomplished by using the results from ControllableJump() and finding controllable jump gadgets whose
           last and first instructions' offsets are 4 bytes apart (meaning the second comes immediately after the first.)
 
         TODO: This isn't completely accurate since the second gadget could be from the next function
+
+        Like GadgetType.search, the combined gadgets are kept in the loaded binary's objdump_handler.SearchRegistry.
+        The ControllableJump gadgets they're made from are shared with any ControllableJump stage in the same pipeline.
+
+        results -- optional results of objdump_handler.search() for ControllableJump's search pattern
         """
-        first_and_last_offsets = [(gadget[0].offset, gadget[-1].offset, gadget) for gadget in ControllableJump().rop_gadgets]
+        registry = get_search_registry()
+        key = (CallToSleep, self.reverse_search_results, search_query_key(*self.search_query()))
+        self.rop_gadgets = list(registry.derive(key, lambda: self._combine_controllable_jumps(results)))
+        return self.rop_gadgets
+
+    def _combine_controllable_jumps(self, results):
+        """Returns the sorted list of gadgets made of two adjacent ControllableJump gadgets (see: search())"""
+        controllable_jump = ControllableJump()
+        controllable_jump.search(results)
+        rop_gadgets = []
+        first_and_last_offsets = [(gadget[0].address, gadget[-1].address, gadget) for gadget in controllable_jump.rop_gadgets]
         for i in range(len(first_and_last_offsets)-1):
             crnt_first_offset, crnt_last_offset, crnt_gadget = first_and_last_offsets[i]
             next_first_offset, next_last_offset, next_gadget = first_and_last_offsets[i+1]
-            if int(next_first_offset, 16) - int(crnt_last_offset, 16) == 4:
+            if next_first_offset - crnt_last_offset == 4:
                 # next_gadget starts immediately after crnt_gadget ends
                 if crnt_gadget.find_matching_instruction("move t9").operands[1] != \
                         next_gadget.find_matching_instruction("move t9").operands[1]:
@@ -77,9 +96,9 @@ class CallToSleep(GadgetType):
                     combined_gadget = []
                     combined_gadget.extend(crnt_gadget)
                     combined_gadget.extend(next_gadget)
-                    self.rop_gadgets.append(Gadget(combined_gadget, CallToSleep))
+                    rop_gadgets.append(Gadget(combined_gadget, CallToSleep))
 
-        self.rop_gadgets = sorted(self.rop_gadgets, key=self.prioritize, reverse=self.reverse_search_results)
+        return sorted(rop_gadgets, key=self.prioritize, reverse=self.reverse_search_results)
 
 
 class StackLocator(GadgetType):
@@ -94,29 +113,41 @@ class ControllableJump(GadgetType):
     search_pattern = "move **"
     reverse_search_results = True
 
-    def __init__(self, custom_search_pattern=None, ensure_compatible=False):
+    def __init__(self, custom_search_pattern=None, ensure_compatible=False, **kwargs):
         """
         Sets this instance's search_pattern to custom_search_pattern if provided and sets ensure_compatible
 
         custom_search_pattern -- optional pattern to use instead of ControllableJump.search_pattern for this instance
         ensure_compatible -- if True, requires the previous gadget's destination operand is the source operand in
                              the matching move instruction that controls the jump register
+        kwargs -- passed on to GadgetType.__init__ (ex: lazy=True)
         """
         self.ensure_compatible = ensure_compatible
         if custom_search_pattern is not None:
             self.search_pattern = custom_search_pattern
-        GadgetType.__init__(self)
+        GadgetType.__init__(self, **kwargs)
+
+    def compatibility_key(self, previous_gadget):
+        """With ensure_compatible, compatibility depends on the destination register of previous_gadget's matching
+        instruction, otherwise only on fresh registers
+        """
+        if self.ensure_compatible:
+            return previous_gadget.find_matching_instruction().operands[0]
+        return None
 
-    def is_compatible(self, gadget, previous_gadget, fresh_registers):
+    def is_pair_compatible(self, gadget, previous_gadget):
         """
-        Returns True if this gadget is compatible with the previous gadget and current fresh_registers.
+        Returns True if this gadget can follow previous_gadget.
 
-        First, the superclass version is run and, if that returns True and self.ensure_compatible is True, the logic
-        mentioned in __init__'s docstring for ensure_compatible is tested
+        If self.ensure_compatible is True, the logic mentioned in __init__'s docstring for ensure_compatible is tested
         """
-        ret_val = GadgetType.is_compatible(self, gadget, previous_gadget, fresh_registers)
-        if ret_val and self.ensure_compatible:
-            previous_gadget_matching_instruction = previous_gadget.find_matching_instruction()
-            required_pattern = "move %s,%s" % (gadget.jump_register, previous_gadget_matching_instruction.operands[0])
-            ret_val = gadget.find_matching_instruction(required_pattern) is not None
-        return ret_val
+        if not self.ensure_compatible:
+            return True
+        previous_gadget_matching_instruction = previous_gadget.find_matching_instruction()
+        # compiled directly rather than from "move JUMP_REGISTER,SOURCE" since this runs for every pair of gadgets
+        required_pattern = SearchPattern(
+            'move',
+            frozenset([gadget.jump_register]),
+            (gadget.jump_register, previous_gadget_matching_instruction.operands[0])
+        )
+        return gadget.find_matching_instruction(required_pattern) is not None
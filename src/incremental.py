@@ -0,0 +1,210 @@
+"""Loads a new version of a binary by comparing it to the gadget index of a previous version function by function
+
+Functions are matched by name and compared by a hash of their raw instruction words. Unchanged functions are taken
+from the previous index (moved to their new address if they were simply relocated), so only functions that changed
+or were added are parsed and have their jump blocks extracted.
+"""
+import array
+import collections
+import functools
+import hashlib
+import mmap
+import re
+import compressed
+import elf_handler
+import gadget_index
+import objdump_handler
+
+# branch targets are printed as an absolute address followed by the symbol, ex: '4005f0 <main+0x20>'
+TARGET_OPERAND_PATTERN = re.compile(r'^([0-9a-f]+)( <.*>)$')
+
+
+def function_hash(words):
+    """Returns the hex sha1 of a function's raw instruction words, which doesn't depend on where the function is"""
+    return hashlib.sha1(gadget_index._to_little_endian(array.array('I', words)).tostring()).hexdigest()
+
+
+class IncrementalUpdate(object):
+    """What changed between the previous version of a binary and the new one
+
+    unchanged, moved, changed, added, removed -- lists of function names. moved functions are identical but start at
+                                                 a different address
+    added_gadgets, removed_gadgets -- lists of (function name, jump block) for the jump blocks that appeared in the
+                                      new version or disappeared from the previous one
+    functions -- the new version's Functions, in address order
+    """
+
+    def __init__(self):
+        self.unchanged = []
+        self.moved = []
+        self.changed = []
+        self.added = []
+        self.removed = []
+        self.added_gadgets = []
+        self.removed_gadgets = []
+        self.functions = []
+
+    def summary(self):
+        return (
+            "%d functions unchanged, %d moved, %d changed, %d added, %d removed; "
+            "%d gadgets appeared, %d disappeared" % (
+                len(self.unchanged), len(self.moved), len(self.changed), len(self.added), len(self.removed),
+                len(self.added_gadgets), len(self.removed_gadgets)
+            )
+        )
+
+
+def load_file_incrementally(file_path, previous_index_path, index_path=None):
+    """Loads file_path into objdump_handler like loader.load_file(), reusing the Functions of the previous version of
+    the binary stored in previous_index_path where they haven't changed, and returns an IncrementalUpdate
+
+    file_path -- path to objdump output or a MIPS ELF file
+    previous_index_path -- path of the gadget index of the previous version (see: gadget_index.write_index())
+    index_path -- optional path to write the new version's gadget index to
+
+    :raises gadget_index.IndexFormatError: if previous_index_path isn't a readable gadget index
+    """
+    previous_index = gadget_index.GadgetIndex(previous_index_path)
+    try:
+        update = _update_from_index(previous_index, file_path)
+    finally:
+        previous_index.close()
+
+    objdump_handler.OBJDUMP_FUNCTIONS = update.functions
+    if index_path is not None:
+        gadget_index.write_index(index_path, update.functions)
+    return update
+
+
+def _update_from_index(previous_index, file_path):
+    # name -> ids of the previous version's functions with that name, in address order
+    previous_ids = collections.defaultdict(collections.deque)
+    for function_id in xrange(previous_index.function_count):
+        previous_ids[previous_index.function_header(function_id)[1]].append(function_id)
+    matched_ids = set()
+
+    update = IncrementalUpdate()
+    previous_blocks = []
+    new_blocks = []
+    objdump_handler.ALL_JUMP_BLOCKS = []
+    for start, name, words, parse in _iter_function_words(file_path):
+        previous_id = previous_ids[name].popleft() if previous_ids.get(name) else None
+        if previous_id is None:
+            function = parse()
+            update.added.append(name)
+            new_blocks.extend((name, block) for block in function.jump_blocks)
+        else:
+            matched_ids.add(previous_id)
+            previous_start = previous_index.function_header(previous_id)[0]
+            if function_hash(previous_index.function_words(previous_id)) == function_hash(words):
+                function = _relocate_function(previous_index.function(previous_id), start)
+                objdump_handler.ALL_JUMP_BLOCKS.extend(function.jump_blocks)
+                (update.unchanged if start == previous_start else update.moved).append(name)
+            else:
+                function = parse()
+                update.changed.append(name)
+                previous_blocks.extend((name, block) for block in previous_index.function(previous_id).jump_blocks)
+                new_blocks.extend((name, block) for block in function.jump_blocks)
+        update.functions.append(function)
+
+    for function_id in xrange(previous_index.function_count):
+        if function_id not in matched_ids:
+            function = previous_index.function(function_id)
+            update.removed.append(function.name)
+            previous_blocks.extend((function.name, block) for block in function.jump_blocks)
+
+    # only blocks of changed, added and removed functions can differ between the versions
+    update.added_gadgets = _blocks_not_in(new_blocks, previous_blocks)
+    update.removed_gadgets = _blocks_not_in(previous_blocks, new_blocks)
+    return update
+
+
+def _iter_function_words(file_path):
+    """Generator yielding (start address, name, instruction words, function that parses and returns the Function)
+    for each function of an objdump output file or MIPS ELF file, only parsing the function when asked to
+    """
+    if elf_handler.is_elf_file(file_path):
+        f = open(file_path, 'rb')
+        try:
+            elf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        try:
+            reader = elf_handler.ElfReader(elf)
+            for start, name, words in reader.iter_function_words():
+                yield start, name, words, functools.partial(reader.decode_function, start, name, words)
+        finally:
+            elf.close()
+        return
+
+    f = compressed.open_lines(file_path)
+    try:
+        for first_line, instruction_fields in objdump_handler.iter_function_fields_from_objdump_lines(f):
+            start, name = objdump_handler.Function.FIRST_LINE_PATTERN.match(first_line).groups()
+            words = [raw_word for address, raw_word, operator, operands in instruction_fields]
+            yield int(start, 16), name, words, functools.partial(_parse_function, first_line, instruction_fields)
+    finally:
+        f.close()
+
+
+def _parse_function(first_line, instruction_fields):
+    function = objdump_handler.Function(first_line)
+    for fields in instruction_fields:
+        function.add_instruction_fields(*fields)
+    function.extract_jump_blocks()
+    return function
+
+
+def _relocate_function(function, start):
+    """Returns function moved to start, or function itself if it's already there. Relative branch targets are moved
+    with it, everything else about the instructions and jump blocks (including register_changes) stays the same.
+    """
+    delta = start - int(function.start, 16)
+    if delta == 0:
+        return function
+
+    relocated = objdump_handler.Function.from_fields("%08x" % start, function.name)
+    positions = {}
+    for instruction in function.instructions:
+        positions[id(instruction)] = len(relocated.instructions)
+        operands = instruction.operands
+        if instruction.operator_type == "BRANCH":
+            # branches are pc relative so the target moved by the same amount, unlike absolute jump targets
+            target = TARGET_OPERAND_PATTERN.match(operands[-1])
+            if target:
+                operands = operands[:-1] + ("%x%s" % (int(target.group(1), 16) + delta, target.group(2)),)
+        relocated.instructions.append(objdump_handler.Instruction.from_fields(
+            instruction.address + delta, instruction.raw_word, instruction.operator, ",".join(operands)
+        ))
+    for jump_block in function.jump_blocks:
+        first = positions[id(jump_block[0])]
+        relocated.jump_blocks.append(objdump_handler.InstructionSequence(
+            relocated.instructions[first:first + len(jump_block)], jump_block.register_changes
+        ))
+    return relocated
+
+
+def gadget_key(jump_block):
+    """Returns a hashable description of a jump block's instructions that doesn't depend on where it is, so the same
+    gadget can be recognized in both versions of a binary
+    """
+    return tuple(
+        (instruction.operator, tuple(TARGET_OPERAND_PATTERN.sub(r'\2', operand).strip() for operand in
+                                     instruction.operands))
+        for instruction in jump_block
+    )
+
+
+def _blocks_not_in(blocks, other_blocks):
+    """Returns the (function name, jump block) items of blocks whose gadgets aren't in other_blocks, counting
+    duplicates
+    """
+    remaining = collections.Counter(gadget_key(block) for name, block in other_blocks)
+    missing = []
+    for name, block in blocks:
+        key = gadget_key(block)
+        if remaining[key] > 0:
+            remaining[key] -= 1
+        else:
+            missing.append((name, block))
+    return missing
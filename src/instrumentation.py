@@ -0,0 +1,143 @@
+"""Optional wall time per phase and counters for parsing, searching, gadget analysis and rop.Builder
+
+Instrumentation is off by default. While it's off, timer() hands back a shared no-op context manager and
+add_time() and count() return immediately, and the hot loops only check ENABLED once per call rather than per line,
+instruction or gadget, so the cost is negligible. enable() turns it on and the figures accumulate in STATS until
+STATS.reset().
+
+Phase names are dotted, a phase's sub-phases (ex: 'parse.read' in 'parse') are part of its time. Phases can also
+run inside unrelated ones, ex: the 'search' and 'gadgets' phases of the searches rop.Builder starts are part of
+'build.populate'.
+Functions parsed in worker processes (objdump_handler.extract_functions_from_objdump_lines() with several workers)
+are only counted in the overall 'parse' time.
+"""
+import time
+
+ENABLED = False
+
+
+class Stats(object):
+    """Seconds spent per phase and counts per counter name"""
+
+    def __init__(self):
+        self.times = {}
+        self.counts = {}
+
+    def reset(self):
+        self.times = {}
+        self.counts = {}
+
+    def add_time(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+
+    def count(self, counter, amount=1):
+        self.counts[counter] = self.counts.get(counter, 0) + amount
+
+    def as_dict(self):
+        return {'times': dict(self.times), 'counts': dict(self.counts)}
+
+    def report(self):
+        """Returns the stats as lines of text, sub-phases indented under their phase. A phase that only has
+        sub-phases (ex: parsing while searching, when only the steps of parsing are timed) is shown as their total.
+        """
+        times = dict(self.times)
+        for phase in sorted(self.times, key=lambda phase: -phase.count('.')):
+            parent = phase.rpartition('.')[0]
+            if parent and parent not in self.times:
+                times[parent] = times.get(parent, 0.0) + times[phase]
+        lines = ["%-36s %12s" % ("phase", "seconds")]
+        for phase in sorted(times):
+            lines.append("%-36s %12.4f" % ("  " * phase.count('.') + phase, times[phase]))
+        lines.append("%-36s %12s" % ("counter", "count"))
+        for counter in sorted(self.counts):
+            lines.append("%-36s %12d" % (counter, self.counts[counter]))
+        return "\n".join(lines) + "\n"
+
+
+STATS = Stats()
+
+
+def enable(reset=True):
+    """Turns instrumentation on, starting from empty stats unless reset is False"""
+    global ENABLED
+    ENABLED = True
+    if reset:
+        STATS.reset()
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def add_time(phase, seconds):
+    if ENABLED:
+        STATS.add_time(phase, seconds)
+
+
+def count(counter, amount=1):
+    if ENABLED:
+        STATS.count(counter, amount)
+
+
+class _Timer(object):
+    __slots__ = ('phase', 'start')
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        STATS.add_time(self.phase, time.time() - self.start)
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(phase):
+    """Returns a context manager adding the time spent in it to phase, ex:
+
+        with instrumentation.timer('parse'):
+            ...
+    """
+    if ENABLED:
+        return _Timer(phase)
+    return _NULL_TIMER
+
+
+class TimedIterator(object):
+    """Wraps an iterator, timing how long each item takes to come out of it (ex: reading lines from a file)
+
+    elapsed -- seconds spent waiting on the wrapped iterator so far
+    count -- number of items it produced so far
+    """
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.elapsed = 0.0
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        start = time.time()
+        try:
+            item = next(self._iterator)
+        finally:
+            self.elapsed += time.time() - start
+        self.count += 1
+        return item
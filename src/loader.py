@@ -0,0 +1,87 @@
+import os
+import compressed
+import elf_handler
+import gadget_index
+import incremental
+import instrumentation
+import objdump_handler
+
+
+def parse_file(file_path, workers=1):
+    """Parses an objdump output file or decodes a MIPS ELF file, whichever file_path is, and returns its Functions
+
+    workers -- number of processes to parse objdump output with, None for one per CPU
+    """
+    if elf_handler.is_elf_file(file_path):
+        return elf_handler.parse_elf_file(file_path)
+    return objdump_handler.parse_objdump_output_file(file_path, workers)
+
+
+def iter_functions_from_file(file_path, accumulate=True):
+    """Generator yielding each Function of an objdump output file (optionally compressed, see: compressed) or MIPS ELF
+    file as soon as it has been parsed (see: objdump_handler.iter_functions_from_objdump_lines(),
+    elf_handler.iter_functions_from_elf_file())
+
+    accumulate -- whether to add the jump blocks to objdump_handler.ALL_JUMP_BLOCKS
+    """
+    if elf_handler.is_elf_file(file_path):
+        for function in elf_handler.iter_functions_from_elf_file(file_path, accumulate):
+            yield function
+        return
+
+    f = compressed.open_lines(file_path)
+    try:
+        for function in objdump_handler.iter_functions_from_objdump_lines(f, accumulate):
+            yield function
+    finally:
+        f.close()
+
+
+def load_file(file_path, use_index=False, index_dir=None, workers=1):
+    """Loads the functions and jump blocks of file_path into objdump_handler and returns its Functions
+
+    When use_index is True, a gadget index keyed by the contents of file_path is loaded if one exists. Otherwise the
+    file is parsed and the index is written so later loads of the same contents can skip parsing.
+
+    file_path -- path to objdump output or a MIPS ELF file
+    use_index -- whether to load and store a gadget index for file_path
+    index_dir -- directory holding index files, defaults to gadget_index.DEFAULT_INDEX_DIR
+    workers -- number of processes to parse objdump output with, None for one per CPU
+    """
+    if not use_index:
+        return parse_file(file_path, workers)
+
+    index_path = gadget_index.index_path_for(file_path, index_dir)
+    if os.path.exists(index_path):
+        try:
+            with instrumentation.timer('index_load'):
+                return gadget_index.GadgetIndex(index_path).install()
+        except gadget_index.IndexFormatError:
+            # stale or corrupt index, rebuild it below
+            pass
+
+    functions = parse_file(file_path, workers)
+    with instrumentation.timer('index_write'):
+        gadget_index.write_index(index_path, functions)
+    return functions
+
+
+def load_file_incrementally(file_path, previous_file_path, index_dir=None):
+    """Loads file_path into objdump_handler using the gadget index of previous_file_path, an earlier version of the
+    same binary, so only the functions that changed are parsed (see: incremental.load_file_incrementally()).
+    The index of previous_file_path is created first if it doesn't exist, and the index of file_path is written so it
+    can be loaded with load_file(file_path, use_index=True) or used for the next version.
+
+    Returns an incremental.IncrementalUpdate describing the changes.
+    """
+    previous_index_path = gadget_index.index_path_for(previous_file_path, index_dir)
+    index_path = gadget_index.index_path_for(file_path, index_dir)
+    try:
+        return incremental.load_file_incrementally(file_path, previous_index_path, index_path)
+    except gadget_index.IndexFormatError:
+        # missing, stale or corrupt index of the previous version, create it and try again
+        pass
+
+    objdump_handler.ALL_JUMP_BLOCKS = []
+    gadget_index.write_index(previous_index_path, parse_file(previous_file_path))
+    return incremental.load_file_incrementally(file_path, previous_index_path, index_path)
@@ -0,0 +1,302 @@
+"""Decodes 32-bit MIPS32 instruction words into the operator and operand text objdump -d would print for them"""
+
+from utils import REGISTER_NAMES
+
+# SPECIAL (opcode 0) instructions of the form "rd,rs,rt" keyed by function field
+SPECIAL_THREE_REGISTER = {
+    0x20: 'add', 0x21: 'addu', 0x22: 'sub', 0x23: 'subu', 0x24: 'and', 0x25: 'or', 0x26: 'xor', 0x27: 'nor',
+    0x2a: 'slt', 0x2b: 'sltu', 0x0a: 'movz', 0x0b: 'movn'
+}
+# SPECIAL shifts of the form "rd,rt,sa"
+SPECIAL_SHIFT = {0x00: 'sll', 0x02: 'srl', 0x03: 'sra'}
+# SPECIAL variable shifts of the form "rd,rt,rs"
+SPECIAL_VARIABLE_SHIFT = {0x04: 'sllv', 0x06: 'srlv', 0x07: 'srav'}
+# SPECIAL multiply/divide of the form "rs,rt"
+SPECIAL_MULTIPLY = {0x18: 'mult', 0x19: 'multu'}
+SPECIAL_DIVIDE = {0x1a: 'div', 0x1b: 'divu'}
+SPECIAL_TRAP = {0x30: 'tge', 0x31: 'tgeu', 0x32: 'tlt', 0x33: 'tltu', 0x34: 'teq', 0x36: 'tne'}
+
+# REGIMM (opcode 1) branches keyed by rt field
+REGIMM_BRANCHES = {
+    0x00: 'bltz', 0x01: 'bgez', 0x02: 'bltzl', 0x03: 'bgezl',
+    0x10: 'bltzal', 0x11: 'bgezal', 0x12: 'bltzall', 0x13: 'bgezall'
+}
+
+# immediate arithmetic printed with a signed decimal immediate: "rt,rs,imm"
+SIGNED_IMMEDIATE = {0x08: 'addi', 0x09: 'addiu', 0x0a: 'slti', 0x0b: 'sltiu'}
+# immediate logical operations printed with an unsigned hex immediate: "rt,rs,0ximm"
+UNSIGNED_IMMEDIATE = {0x0c: 'andi', 0x0d: 'ori', 0x0e: 'xori'}
+# branches comparing two registers: "rs,rt,target"
+TWO_REGISTER_BRANCHES = {0x04: 'beq', 0x05: 'bne', 0x14: 'beql', 0x15: 'bnel'}
+# branches comparing one register with zero: "rs,target"
+ONE_REGISTER_BRANCHES = {0x06: 'blez', 0x07: 'bgtz', 0x16: 'blezl', 0x17: 'bgtzl'}
+# loads and stores of general purpose registers: "rt,offset(base)"
+MEMORY_ACCESS = {
+    0x20: 'lb', 0x21: 'lh', 0x22: 'lwl', 0x23: 'lw', 0x24: 'lbu', 0x25: 'lhu', 0x26: 'lwr',
+    0x28: 'sb', 0x29: 'sh', 0x2a: 'swl', 0x2b: 'sw', 0x2e: 'swr', 0x30: 'll', 0x38: 'sc'
+}
+# loads and stores of floating point registers: "$fT,offset(base)"
+COPROCESSOR_MEMORY_ACCESS = {0x31: 'lwc1', 0x35: 'ldc1', 0x39: 'swc1', 0x3d: 'sdc1'}
+
+# SPECIAL2 (opcode 0x1c) instructions keyed by function field
+SPECIAL2_ACCUMULATE = {0x00: 'madd', 0x01: 'maddu', 0x04: 'msub', 0x05: 'msubu'}
+SPECIAL2_COUNT = {0x20: 'clz', 0x21: 'clo'}
+# SPECIAL3 (opcode 0x1f) BSHFL instructions keyed by sa field
+BSHFL = {0x02: 'wsbh', 0x10: 'seb', 0x18: 'seh'}
+
+# COP1 arithmetic keyed by function field, fmt is appended (ex: add.s)
+COP1_THREE_REGISTER = {0x00: 'add', 0x01: 'sub', 0x02: 'mul', 0x03: 'div'}
+COP1_TWO_REGISTER = {0x04: 'sqrt', 0x05: 'abs', 0x06: 'mov', 0x07: 'neg', 0x0c: 'round.w', 0x0d: 'trunc.w',
+                     0x0e: 'ceil.w', 0x0f: 'floor.w', 0x20: 'cvt.s', 0x21: 'cvt.d', 0x24: 'cvt.w'}
+COP1_FORMATS = {0x10: 's', 0x11: 'd', 0x14: 'w', 0x15: 'l'}
+COP1_CONDITIONS = ['f', 'un', 'eq', 'ueq', 'olt', 'ult', 'ole', 'ule',
+                   'sf', 'ngle', 'seq', 'ngl', 'lt', 'nge', 'le', 'ngt']
+
+
+def _signed(value):
+    """Returns the 16-bit immediate value as a signed integer"""
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def decode(word, address, symbolize=None):
+    """Returns a tuple of (mnemonic, operands string) for the instruction word located at address
+
+    Operands are formatted like GNU objdump's MIPS disassembler, including its pseudo-instructions
+    (nop, move, li, b, beqz, bnez, bal, negu, not) so results are interchangeable with parsed objdump text.
+    Words that aren't recognised are returned as a mnemonic of '0x%x' with no operands, the way objdump prints them.
+
+    word -- the 32-bit instruction word as an integer
+    address -- the address of the instruction word, used to compute branch and jump targets
+    symbolize -- optional callable returning the '<symbol+0xoffset>' string for a target address or None
+    """
+    opcode = word >> 26
+    rs = (word >> 21) & 0x1f
+    rt = (word >> 16) & 0x1f
+    rd = (word >> 11) & 0x1f
+    sa = (word >> 6) & 0x1f
+    function = word & 0x3f
+    immediate = word & 0xffff
+
+    if opcode == 0x00:
+        return _decode_special(word, rs, rt, rd, sa, function)
+
+    if opcode == 0x01:
+        mnemonic = REGIMM_BRANCHES.get(rt)
+        if mnemonic is None:
+            return _unknown(word)
+        target = _branch_target(address, immediate, symbolize)
+        if mnemonic == 'bgezal' and rs == 0:
+            return 'bal', target
+        return mnemonic, "%s,%s" % (REGISTER_NAMES[rs], target)
+
+    if opcode in (0x02, 0x03):
+        target = ((address + 4) & 0xf0000000) | ((word & 0x03ffffff) << 2)
+        return 'j' if opcode == 0x02 else 'jal', _format_target(target, symbolize)
+
+    if opcode in TWO_REGISTER_BRANCHES:
+        mnemonic = TWO_REGISTER_BRANCHES[opcode]
+        target = _branch_target(address, immediate, symbolize)
+        if mnemonic == 'beq' and rs == 0 and rt == 0:
+            return 'b', target
+        if mnemonic in ('beq', 'bne') and rt == 0:
+            return 'beqz' if mnemonic == 'beq' else 'bnez', "%s,%s" % (REGISTER_NAMES[rs], target)
+        return mnemonic, "%s,%s,%s" % (REGISTER_NAMES[rs], REGISTER_NAMES[rt], target)
+
+    if opcode in ONE_REGISTER_BRANCHES:
+        return ONE_REGISTER_BRANCHES[opcode], "%s,%s" % (
+            REGISTER_NAMES[rs], _branch_target(address, immediate, symbolize))
+
+    if opcode in SIGNED_IMMEDIATE:
+        mnemonic = SIGNED_IMMEDIATE[opcode]
+        if mnemonic == 'addiu' and rs == 0:
+            return 'li', "%s,%d" % (REGISTER_NAMES[rt], _signed(immediate))
+        return mnemonic, "%s,%s,%d" % (REGISTER_NAMES[rt], REGISTER_NAMES[rs], _signed(immediate))
+
+    if opcode in UNSIGNED_IMMEDIATE:
+        mnemonic = UNSIGNED_IMMEDIATE[opcode]
+        if mnemonic == 'ori' and rs == 0:
+            return 'li', "%s,0x%x" % (REGISTER_NAMES[rt], immediate)
+        return mnemonic, "%s,%s,0x%x" % (REGISTER_NAMES[rt], REGISTER_NAMES[rs], immediate)
+
+    if opcode == 0x0f:
+        return 'lui', "%s,0x%x" % (REGISTER_NAMES[rt], immediate)
+
+    if opcode in MEMORY_ACCESS:
+        return MEMORY_ACCESS[opcode], "%s,%d(%s)" % (REGISTER_NAMES[rt], _signed(immediate), REGISTER_NAMES[rs])
+
+    if opcode in COPROCESSOR_MEMORY_ACCESS:
+        return COPROCESSOR_MEMORY_ACCESS[opcode], "$f%d,%d(%s)" % (rt, _signed(immediate), REGISTER_NAMES[rs])
+
+    if opcode == 0x2f:
+        return 'cache', "0x%x,%d(%s)" % (rt, _signed(immediate), REGISTER_NAMES[rs])
+
+    if opcode == 0x33:
+        return 'pref', "0x%x,%d(%s)" % (rt, _signed(immediate), REGISTER_NAMES[rs])
+
+    if opcode == 0x10:
+        return _decode_cop0(word, rs, rt, rd, function)
+
+    if opcode == 0x11:
+        return _decode_cop1(word, address, rs, rt, rd, sa, function, immediate, symbolize)
+
+    if opcode == 0x1c:
+        return _decode_special2(word, rs, rt, rd, function)
+
+    if opcode == 0x1f:
+        return _decode_special3(word, rs, rt, rd, sa, function)
+
+    return _unknown(word)
+
+
+def _decode_special(word, rs, rt, rd, sa, function):
+    """Decodes instructions with the SPECIAL (0) opcode"""
+    if function in SPECIAL_SHIFT:
+        if word == 0:
+            return 'nop', ''
+        if function == 0x00 and rd == 0 and rt == 0:
+            if sa == 1:
+                return 'ssnop', ''
+            if sa == 3:
+                return 'ehb', ''
+        return SPECIAL_SHIFT[function], "%s,%s,0x%x" % (REGISTER_NAMES[rd], REGISTER_NAMES[rt], sa)
+
+    if function in SPECIAL_VARIABLE_SHIFT:
+        return SPECIAL_VARIABLE_SHIFT[function], "%s,%s,%s" % (
+            REGISTER_NAMES[rd], REGISTER_NAMES[rt], REGISTER_NAMES[rs])
+
+    if function == 0x08:
+        return 'jr', REGISTER_NAMES[rs]
+
+    if function == 0x09:
+        if rd == 31:
+            return 'jalr', REGISTER_NAMES[rs]
+        return 'jalr', "%s,%s" % (REGISTER_NAMES[rd], REGISTER_NAMES[rs])
+
+    if function in SPECIAL_THREE_REGISTER:
+        mnemonic = SPECIAL_THREE_REGISTER[function]
+        if mnemonic in ('addu', 'or') and rt == 0:
+            return 'move', "%s,%s" % (REGISTER_NAMES[rd], REGISTER_NAMES[rs])
+        if mnemonic in ('sub', 'subu') and rs == 0:
+            return 'neg' if mnemonic == 'sub' else 'negu', "%s,%s" % (REGISTER_NAMES[rd], REGISTER_NAMES[rt])
+        if mnemonic == 'nor' and rt == 0:
+            return 'not', "%s,%s" % (REGISTER_NAMES[rd], REGISTER_NAMES[rs])
+        return mnemonic, "%s,%s,%s" % (REGISTER_NAMES[rd], REGISTER_NAMES[rs], REGISTER_NAMES[rt])
+
+    if function in SPECIAL_MULTIPLY:
+        return SPECIAL_MULTIPLY[function], "%s,%s" % (REGISTER_NAMES[rs], REGISTER_NAMES[rt])
+
+    if function in SPECIAL_DIVIDE:
+        return SPECIAL_DIVIDE[function], "zero,%s,%s" % (REGISTER_NAMES[rs], REGISTER_NAMES[rt])
+
+    if function in SPECIAL_TRAP:
+        code = (word >> 6) & 0x3ff
+        operands = "%s,%s" % (REGISTER_NAMES[rs], REGISTER_NAMES[rt])
+        return SPECIAL_TRAP[function], operands + (",0x%x" % code if code else '')
+
+    if function == 0x10:
+        return 'mfhi', REGISTER_NAMES[rd]
+    if function == 0x11:
+        return 'mthi', REGISTER_NAMES[rs]
+    if function == 0x12:
+        return 'mflo', REGISTER_NAMES[rd]
+    if function == 0x13:
+        return 'mtlo', REGISTER_NAMES[rs]
+
+    if function == 0x0c:
+        code = (word >> 6) & 0xfffff
+        return 'syscall', "0x%x" % code if code else ''
+
+    if function == 0x0d:
+        code, sub_code = (word >> 16) & 0x3ff, (word >> 6) & 0x3ff
+        if sub_code:
+            return 'break', "0x%x,0x%x" % (code, sub_code)
+        return 'break', "0x%x" % code if code else ''
+
+    if function == 0x0f:
+        return 'sync', ''
+
+    return _unknown(word)
+
+
+def _decode_special2(word, rs, rt, rd, function):
+    """Decodes instructions with the SPECIAL2 (0x1c) opcode"""
+    if function == 0x02:
+        return 'mul', "%s,%s,%s" % (REGISTER_NAMES[rd], REGISTER_NAMES[rs], REGISTER_NAMES[rt])
+    if function in SPECIAL2_ACCUMULATE:
+        return SPECIAL2_ACCUMULATE[function], "%s,%s" % (REGISTER_NAMES[rs], REGISTER_NAMES[rt])
+    if function in SPECIAL2_COUNT:
+        return SPECIAL2_COUNT[function], "%s,%s" % (REGISTER_NAMES[rd], REGISTER_NAMES[rs])
+    return _unknown(word)
+
+
+def _decode_special3(word, rs, rt, rd, sa, function):
+    """Decodes instructions with the SPECIAL3 (0x1f) opcode"""
+    if function == 0x00:
+        return 'ext', "%s,%s,0x%x,0x%x" % (REGISTER_NAMES[rt], REGISTER_NAMES[rs], sa, rd + 1)
+    if function == 0x04:
+        return 'ins', "%s,%s,0x%x,0x%x" % (REGISTER_NAMES[rt], REGISTER_NAMES[rs], sa, rd - sa + 1)
+    if function == 0x20 and sa in BSHFL:
+        return BSHFL[sa], "%s,%s" % (REGISTER_NAMES[rd], REGISTER_NAMES[rt])
+    if function == 0x3b:
+        return 'rdhwr', "%s,$%d" % (REGISTER_NAMES[rt], rd)
+    return _unknown(word)
+
+
+def _decode_cop0(word, rs, rt, rd, function):
+    """Decodes coprocessor 0 moves and the handful of privileged instructions that appear in user code"""
+    if rs == 0x00:
+        return 'mfc0', "%s,$%d" % (REGISTER_NAMES[rt], rd)
+    if rs == 0x04:
+        return 'mtc0', "%s,$%d" % (REGISTER_NAMES[rt], rd)
+    if rs == 0x10:
+        if function == 0x18:
+            return 'eret', ''
+        if function == 0x20:
+            return 'wait', ''
+    return _unknown(word)
+
+
+def _decode_cop1(word, address, rs, rt, rd, sa, function, immediate, symbolize):
+    """Decodes coprocessor 1 (floating point) moves, branches and arithmetic"""
+    if rs == 0x00:
+        return 'mfc1', "%s,$f%d" % (REGISTER_NAMES[rt], rd)
+    if rs == 0x02:
+        return 'cfc1', "%s,$%d" % (REGISTER_NAMES[rt], rd)
+    if rs == 0x04:
+        return 'mtc1', "%s,$f%d" % (REGISTER_NAMES[rt], rd)
+    if rs == 0x06:
+        return 'ctc1', "%s,$%d" % (REGISTER_NAMES[rt], rd)
+    if rs == 0x08:
+        mnemonic = ['bc1f', 'bc1t', 'bc1fl', 'bc1tl'][rt & 0x3]
+        return mnemonic, _branch_target(address, immediate, symbolize)
+
+    fmt = COP1_FORMATS.get(rs)
+    if fmt is None:
+        return _unknown(word)
+    # fs is in the rd field and fd is in the sa field for cop1 arithmetic
+    if function in COP1_THREE_REGISTER:
+        return "%s.%s" % (COP1_THREE_REGISTER[function], fmt), "$f%d,$f%d,$f%d" % (sa, rd, rt)
+    if function in COP1_TWO_REGISTER:
+        return "%s.%s" % (COP1_TWO_REGISTER[function], fmt), "$f%d,$f%d" % (sa, rd)
+    if function >= 0x30:
+        return "c.%s.%s" % (COP1_CONDITIONS[function & 0xf], fmt), "$f%d,$f%d" % (rd, rt)
+    return _unknown(word)
+
+
+def _branch_target(address, immediate, symbolize):
+    """Returns the formatted target of a PC-relative branch"""
+    target = (address + 4 + (_signed(immediate) << 2)) & 0xffffffff
+    return _format_target(target, symbolize)
+
+
+def _format_target(target, symbolize):
+    """Formats a branch or jump target the way objdump does: 'ADDRESS <SYMBOL+0xOFFSET>'"""
+    symbol = symbolize(target) if symbolize else None
+    if symbol:
+        return "%x %s" % (target, symbol)
+    return "%x" % target
+
+
+def _unknown(word):
+    """objdump prints words it can't decode as the raw hex value in place of a mnemonic"""
+    return "0x%x" % word, ''
@@ -1,48 +1,305 @@
+import array
+import collections
+import multiprocessing
 import re
+import time
+import compressed
+import instrumentation
 import utils
 
 ALL_JUMP_BLOCKS = []
 OBJDUMP_FUNCTIONS = []
+# InstructionIndex over ALL_JUMP_BLOCKS, see get_instruction_index()
+INSTRUCTION_INDEX = None
+# number of lines of the .text section given to each worker process when parsing in parallel
+PARALLEL_CHUNK_LINES = 50000
+# SearchRegistry for ALL_JUMP_BLOCKS, see get_search_registry()
+SEARCH_REGISTRY = None
+# number of search pattern strings whose compiled SearchPattern is kept, see compile_search_pattern()
+SEARCH_PATTERN_CACHE_SIZE = 256
+
+HEX_DIGITS = '0123456789abcdef'
+OPERATOR_CHARACTERS = 'abcdefghijklmnopqrstuvwxyz0123456789'
+# operator fields already known to be a whole operator, see tokenize_instruction_line()
+_OPERATOR_FIELDS = set()
+
+
+def parse_objdump_output_file(file_path, workers=1):
+    """Parses the objdump output in file_path, which may be compressed with gzip, bzip2 or xz (see: compressed),
+    see: extract_functions_from_objdump_lines()
+    """
+    f = compressed.open_lines(file_path)
+    try:
+        # iterate over the file object itself so lines are read (and decompressed) as they're parsed instead of all
+        # at once
+        functions = extract_functions_from_objdump_lines(f, workers)
+    finally:
+        f.close()
+    return functions
 
 
-def parse_objdump_output_file(file_path):
-    f = open(file_path, 'r')
-    objdump_lines = f.readlines()
-    f.close()
-    extract_functions_from_objdump_lines(objdump_lines)
+def extract_functions_from_objdump_lines(objdump_lines, workers=1):
+    """Returns a list of ObjdumpFunctions created by parsing lines from objdump output's .text section
 
+    objdump_lines -- list of lines or any iterator over lines (open file, pipe, sys.stdin, etc.)
+    workers -- number of processes to parse with, None for one per CPU. The result is the same regardless.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    with instrumentation.timer('parse'):
+        if workers > 1:
+            functions = _parallel_extract_functions(objdump_lines, workers)
+        else:
+            functions = list(iter_functions_from_objdump_lines(objdump_lines))
 
-def extract_functions_from_objdump_lines(objdump_lines):
-    """Returns a list of ObjdumpFunctions created by parsing lines from objdump output's .text section"""
+    global OBJDUMP_FUNCTIONS
+    OBJDUMP_FUNCTIONS = functions
+    return functions
 
-    # we only care about the .text section, so we'll find where it is so we know where to start from
-    start_of_text_section = 0
-    for i in xrange(len(objdump_lines)):
-        if objdump_lines[i] == "Disassembly of section .text:\n":
-            start_of_text_section = i+2
-            break
 
+def _parallel_extract_functions(objdump_lines, workers):
+    """Splits the .text section of objdump_lines into chunks at blank lines between functions, parses the chunks in a
+    pool of worker processes, and adds their functions' jump blocks to ALL_JUMP_BLOCKS in address order.
+    Returns the list of Functions.
+    """
     functions = []
-    function = None
-    for line in objdump_lines[start_of_text_section:]:
-        if Function.FIRST_LINE_PATTERN.match(line):
-            function = Function(line)
-        elif Instruction.INSTRUCTION_LINE_PATTERN.match(line):
-            function.add_instruction(line)
+    pool = multiprocessing.Pool(workers)
+    try:
+        # only keep a couple of chunks per worker in flight so the input is never read much ahead of the workers
+        pending = collections.deque()
+        for chunk in _iter_text_section_chunks(objdump_lines, PARALLEL_CHUNK_LINES):
+            pending.append(pool.apply_async(_parse_chunk, (chunk,)))
+            if len(pending) >= workers * 2:
+                _merge_parsed_functions(pending.popleft().get(), functions)
+        while pending:
+            _merge_parsed_functions(pending.popleft().get(), functions)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return functions
+
+
+def _iter_text_section_chunks(objdump_lines, chunk_lines):
+    """Generator yielding lists of the lines from the .text section of objdump_lines, each about chunk_lines long and
+    ending with the blank line after a function so that chunks can be parsed independently.
+    Section headers are handled the same way as iter_functions_from_objdump_lines().
+    """
+    in_text_section = True
+    seen_text_section = False
+    chunk = []
+    for line in objdump_lines:
+        if line.startswith("Disassembly of section"):
+            if seen_text_section:
+                break
+            in_text_section = line == "Disassembly of section .text:\n"
+            seen_text_section = in_text_section
+            # pass the header on so the worker discards any function in progress the same way a serial parse would
+            chunk.append(line)
+        elif in_text_section:
+            chunk.append(line)
+            if line == "\n" and len(chunk) >= chunk_lines:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_chunk(lines):
+    """Parses a chunk of .text section lines in a worker process and returns its Functions"""
+    # the parent process collects the jump blocks from the returned functions
+    return list(iter_functions_from_objdump_lines(lines, accumulate=False))
+
+
+def _merge_parsed_functions(parsed_functions, functions):
+    """Adds functions parsed by a worker process and their jump blocks to functions and ALL_JUMP_BLOCKS"""
+    for function in parsed_functions:
+        ALL_JUMP_BLOCKS.extend(function.jump_blocks)
+        functions.append(function)
+
+
+def iter_functions_from_objdump_lines(objdump_lines, accumulate=True):
+    """Generator that parses lines from objdump output's .text section and yields each Function (with its jump blocks
+    already extracted) as soon as its last line has been read.
+
+    Only the lines of the function currently being parsed are held. The functions themselves are not stored in
+    OBJDUMP_FUNCTIONS (see: extract_functions_from_objdump_lines()), but by default their jump blocks are added to
+    ALL_JUMP_BLOCKS as they're yielded so they can be searched afterwards, which keeps every instruction in memory.
+    Callers that only consume the stream should pass accumulate=False, then nothing is kept once a function is
+    dropped and memory use is bounded by the largest function rather than the size of the dump.
+
+    objdump_lines -- list of lines or any iterator over lines (open file, pipe, sys.stdin, etc.)
+    accumulate -- whether to add the jump blocks to ALL_JUMP_BLOCKS
+    """
+    if instrumentation.ENABLED:
+        return _iter_functions_with_stats(objdump_lines, accumulate)
+    return _iter_functions(objdump_lines, accumulate)
+
+
+def _iter_functions(objdump_lines, accumulate):
+    from_fields = Instruction.from_fields
+    for first_line, instruction_fields in iter_function_fields_from_objdump_lines(objdump_lines):
+        function = Function(first_line)
+        function.instructions = [from_fields(*fields) for fields in instruction_fields]
+        function.extract_jump_blocks(accumulate)
+        yield function
+
+
+def _iter_functions_with_stats(objdump_lines, accumulate):
+    """_iter_functions() timing reading the input, finding and tokenizing the functions' lines, creating their
+    instructions and extracting their jump blocks separately (see: instrumentation)
+    """
+    lines = instrumentation.TimedIterator(objdump_lines)
+    function_lines = iter_function_fields_from_objdump_lines(lines)
+    scan_time = instruction_time = jump_block_time = 0.0
+    function_count = instruction_count = jump_block_count = 0
+    try:
+        while True:
+            start = time.time()
+            try:
+                first_line, instruction_fields = next(function_lines)
+            except StopIteration:
+                break
+            scanned = time.time()
+            function = Function(first_line)
+            for fields in instruction_fields:
+                function.add_instruction_fields(*fields)
+            parsed = time.time()
+            function.extract_jump_blocks(accumulate)
+            extracted = time.time()
+
+            scan_time += scanned - start
+            instruction_time += parsed - scanned
+            jump_block_time += extracted - parsed
+            function_count += 1
+            instruction_count += len(function.instructions)
+            jump_block_count += len(function.jump_blocks)
+            yield function
+    finally:
+        instrumentation.add_time('parse.read', lines.elapsed)
+        # reading happens while the lines are scanned for functions
+        instrumentation.add_time('parse.scan_lines', scan_time - lines.elapsed)
+        instrumentation.add_time('parse.instructions', instruction_time)
+        instrumentation.add_time('parse.jump_blocks', jump_block_time)
+        instrumentation.count('lines_read', lines.count)
+        instrumentation.count('functions_parsed', function_count)
+        instrumentation.count('instructions_parsed', instruction_count)
+        instrumentation.count('jump_blocks_extracted', jump_block_count)
+
+
+def iter_function_lines_from_objdump_lines(objdump_lines):
+    """Generator that yields (first line, list of instruction lines) for each function in objdump output's .text
+    section as soon as its last line has been read, without parsing the instructions
+
+    objdump_lines -- list of lines or any iterator over lines (open file, pipe, sys.stdin, etc.)
+    """
+    return _iter_function_parts(objdump_lines, False)
+
+
+def iter_function_fields_from_objdump_lines(objdump_lines):
+    """Generator that yields (first line, list of instruction fields) for each function in objdump output's .text
+    section as soon as its last line has been read. The fields are the (address, raw word, operator, operands) of
+    each instruction line (see: tokenize_instruction_line()), so each line is only looked at once.
+
+    objdump_lines -- list of lines or any iterator over lines (open file, pipe, sys.stdin, etc.)
+    """
+    return _iter_function_parts(objdump_lines, True)
+
+
+def _iter_function_parts(objdump_lines, tokenized):
+    """Yields (first line, list of the instruction lines or, if tokenized, their fields) for each function"""
+    # lines before the first section header are parsed (input may be a bare list of function lines),
+    # sections other than .text are skipped and the first section following .text ends parsing
+    in_text_section = True
+    seen_text_section = False
+    first_line = None
+    instruction_parts = None
+    for line in objdump_lines:
+        if line[:1] == ' ' and in_text_section:
+            # by far the most common case, an indented instruction line (the cases below never start with a space).
+            # instruction lines outside of a function are skipped
+            if first_line is not None:
+                fields = tokenize_instruction_line(line)
+                if fields is not None:
+                    instruction_parts.append(fields if tokenized else line)
         elif line == "\n":
             # no longer in a function block
-            if function:
-                # if we were in the process of building a function, add it to the list and reset it
-                function.extract_jump_blocks()
-                functions.append(function)
-                function = None
+            if first_line:
+                # if we were in the process of building a function, yield it and reset it
+                yield first_line, instruction_parts
+                first_line = None
+                instruction_parts = None
         elif line.startswith("Disassembly of section"):
-            # we hit a section that isn't .text, we're done here
-            break
-
-    global OBJDUMP_FUNCTIONS
-    OBJDUMP_FUNCTIONS = functions
-    return functions
+            if seen_text_section:
+                # we hit a section that isn't .text, we're done here
+                break
+            in_text_section = line == "Disassembly of section .text:\n"
+            seen_text_section = in_text_section
+            first_line = None
+            instruction_parts = None
+        elif not in_text_section:
+            continue
+        elif line[:1] in HEX_DIGITS and Function.FIRST_LINE_PATTERN.match(line):
+            # instruction lines are indented, only lines starting with an address can be a function's first line
+            first_line = line
+            instruction_parts = []
+        elif first_line is not None:
+            fields = tokenize_instruction_line(line)
+            if fields is not None:
+                instruction_parts.append(fields if tokenized else line)
+
+
+def tokenize_instruction_line(line):
+    """Returns (address, raw word, operator, operands) for a line of objdump output containing an instruction, or None
+    for any other line. The address and raw word are integers and operands is the operands string, ex:
+    '  400a10:\t8fbf001c \tlw\tra,28(sp)\n' -> (0x400a10, 0x8fbf001c, 'lw', 'ra,28(sp)')
+
+    Lines in objdump's usual layout (address, colon, tab, raw word, space, tab, operator, tab, operands) are split
+    with a handful of string operations, anything else goes through Instruction.INSTRUCTION_LINE_PATTERN, so the
+    result is always the same as the pattern's.
+    """
+    fields = line.split('\t', 3)
+    if len(fields) == 4:
+        address, raw_word, operator, operands = fields
+        if operands[-1:] == '\n':
+            operands = operands[:-1]
+        # the pattern would skip leading whitespace and stop at a newline
+        usual = operands and not operands[0].isspace() and '\n' not in operands
+    elif len(fields) == 3:
+        address, raw_word, operator = fields
+        if operator[-1:] == '\n':
+            operator = operator[:-1]
+        operands = ''
+        usual = True
+    else:
+        usual = False
+
+    if usual and len(raw_word) == 9 and raw_word[8] == ' ' and address[-1:] == ':':
+        if operator not in _OPERATOR_FIELDS and operator and not operator.strip(OPERATOR_CHARACTERS):
+            _OPERATOR_FIELDS.add(operator)
+        address = address[:-1].lstrip()
+        raw_word = raw_word[:8]
+        if address and operator in _OPERATOR_FIELDS and not (address + raw_word).strip(HEX_DIGITS):
+            return int(address, 16), int(raw_word, 16), operator, operands
+
+    match = Instruction.INSTRUCTION_LINE_PATTERN.match(line)
+    if match is None:
+        return None
+    address, raw_word, operator, operands = match.groups('')
+    return int(address, 16), int(raw_word, 16), operator, operands
+
+
+def iter_jump_blocks_from_objdump_lines(objdump_lines, accumulate=True):
+    """Generator that yields each jump block (InstructionSequence) as soon as the function containing it is parsed
+
+    objdump_lines -- list of lines or any iterator over lines (open file, pipe, sys.stdin, etc.)
+    accumulate -- whether to add the jump blocks to ALL_JUMP_BLOCKS, see: iter_functions_from_objdump_lines()
+    """
+    for function in iter_functions_from_objdump_lines(objdump_lines, accumulate):
+        for jump_block in function.jump_blocks:
+            yield jump_block
 
 
 def find_function(name):
@@ -52,16 +309,211 @@ def find_function(name):
             return fxn
 
 
+def get_instruction_index():
+    """Returns the InstructionIndex for ALL_JUMP_BLOCKS, indexing any blocks added since it was last used
+
+    The index is rebuilt from scratch if ALL_JUMP_BLOCKS was replaced (ex: a new binary was loaded) or shrank.
+    """
+    global INSTRUCTION_INDEX
+    if (
+        INSTRUCTION_INDEX is None or
+        INSTRUCTION_INDEX.blocks is not ALL_JUMP_BLOCKS or
+        INSTRUCTION_INDEX.indexed_count > len(ALL_JUMP_BLOCKS)
+    ):
+        INSTRUCTION_INDEX = InstructionIndex(ALL_JUMP_BLOCKS)
+    if INSTRUCTION_INDEX.indexed_count < len(ALL_JUMP_BLOCKS):
+        with instrumentation.timer('instruction_index'):
+            INSTRUCTION_INDEX.update()
+    return INSTRUCTION_INDEX
+
+
+def get_search_registry():
+    """Returns the SearchRegistry for ALL_JUMP_BLOCKS, starting an empty one if ALL_JUMP_BLOCKS was replaced
+    (ex: a new binary was loaded) or changed size
+    """
+    global SEARCH_REGISTRY
+    if (
+        SEARCH_REGISTRY is None or
+        SEARCH_REGISTRY.blocks is not ALL_JUMP_BLOCKS or
+        SEARCH_REGISTRY.block_count != len(ALL_JUMP_BLOCKS)
+    ):
+        SEARCH_REGISTRY = SearchRegistry(ALL_JUMP_BLOCKS)
+    return SEARCH_REGISTRY
+
+
+def search_query_key(pattern, disallowed_registers=None, desired_jump_register=None):
+    """Returns a hashable key identifying the results of search() for these arguments"""
+    return compile_search_pattern(pattern), tuple(disallowed_registers or ()), desired_jump_register or None
+
+
 def search(pattern_str, disallowed_registers=None, desired_jump_register=None):
     """Uses pattern_str to search for and return all matching """
-    results = []
-    pattern = InstructionSequence.extract_search_criteria(pattern_str)
-    for instruction_sequence in ALL_JUMP_BLOCKS:
-        result = instruction_sequence.search(pattern, disallowed_registers, desired_jump_register)
-        if result:
-            results.append(result)
+    return search_many([(pattern_str, disallowed_registers, desired_jump_register)])[0]
+
+
+def iter_search(pattern, disallowed_registers=None, desired_jump_register=None):
+    """Generator yielding (block id, matching subsequence) for each jump block in ALL_JUMP_BLOCKS matching pattern,
+    in block order. The block id is the block's index in ALL_JUMP_BLOCKS.
+
+    Only blocks containing an instruction with the pattern's operator and destination register are searched
+    (see: InstructionIndex).
+
+    pattern -- string in the 'search pattern' format or search criteria tuple
+               (see: InstructionSequence.extract_search_criteria())
+    """
+    pattern = InstructionSequence.get_search_criteria(pattern)
+    desired_operator, desired_first_operand_registers, desired_operands = pattern
+    scanned = matches = 0
+    try:
+        for block_id, candidate_indexes in get_instruction_index().candidates(
+                desired_operator, desired_first_operand_registers):
+            scanned += 1
+            result = ALL_JUMP_BLOCKS[block_id].search(pattern, disallowed_registers, desired_jump_register,
+                                                      candidate_indexes)
+            if result:
+                matches += 1
+                yield block_id, result
+    finally:
+        instrumentation.count('blocks_scanned', scanned)
+        instrumentation.count('search_matches', matches)
+
+
+def search_many(queries):
+    """Runs several searches in a single pass over the jump blocks and returns a list of results for each query,
+    equivalent to [search(*query) for query in queries]
+
+    Every block that's a candidate for at least one query (see: InstructionIndex) is visited once and checked against
+    each query it's a candidate for. Identical queries are only searched once, and queries already searched for in
+    the same jump blocks are answered from the SearchRegistry.
+
+    queries -- list of (pattern, disallowed_registers, desired_jump_register) tuples with the same meaning as
+               search()'s arguments or pattern strings on their own
+    """
+    registry = get_search_registry()
+    distinct_queries = []
+    distinct_keys = []
+    candidates_by_query = []
+    keys = []
+    for query in queries:
+        if isinstance(query, basestring):
+            query = (query, None, None)
+        key = search_query_key(*query)
+        keys.append(key)
+        if key not in registry.results and key not in distinct_keys:
+            pattern, disallowed_registers, desired_jump_register = key
+            distinct_keys.append(key)
+            distinct_queries.append((pattern, list(disallowed_registers), desired_jump_register))
+
+    if distinct_queries:
+        # indexed outside of the search's time, it's only built once per binary
+        instruction_index = get_instruction_index()
+    with instrumentation.timer('search'):
+        if distinct_queries:
+            candidates_by_query = [dict(instruction_index.candidates(pattern[0], pattern[1]))
+                                   for pattern, disallowed_registers, desired_jump_register in distinct_queries]
+
+        candidate_block_ids = set()
+        for candidates in candidates_by_query:
+            candidate_block_ids.update(candidates)
+
+        results = [[] for query in distinct_queries]
+        for block_id in sorted(candidate_block_ids):
+            instruction_sequence = ALL_JUMP_BLOCKS[block_id]
+            for query_number, candidates in enumerate(candidates_by_query):
+                if block_id in candidates:
+                    pattern, disallowed_registers, desired_jump_register = distinct_queries[query_number]
+                    result = instruction_sequence.search(pattern, disallowed_registers, desired_jump_register,
+                                                         candidates[block_id])
+                    if result:
+                        results[query_number].append(result)
+    if instrumentation.ENABLED:
+        instrumentation.count('searches', len(distinct_queries))
+        instrumentation.count('search_cache_hits', len(keys) - len(distinct_queries))
+        instrumentation.count('blocks_scanned', sum(len(candidates) for candidates in candidates_by_query))
+        instrumentation.count('search_matches', sum(len(query_results) for query_results in results))
+
+    for key, query_results in zip(distinct_keys, results):
+        registry.results[key] = query_results
+    return [list(registry.results[key]) for key in keys]
+
+
+class SearchRegistry(object):
+    """Search results for one list of jump blocks, and anything built from them, so that every query is only searched
+    for once per loaded binary
+
+    results -- search_query_key() -> list of matching subsequences
+    derived -- caller chosen key -> object built from search results (ex: the Gadgets of a GadgetType, see: derive())
+    """
+
+    def __init__(self, blocks):
+        """
+        blocks -- list of InstructionSequence objects searched, normally ALL_JUMP_BLOCKS
+        """
+        self.blocks = blocks
+        self.block_count = len(blocks)
+        self.results = {}
+        self.derived = {}
+
+    def derive(self, key, build):
+        """Returns the object stored for key, storing the result of calling build() first if there isn't one"""
+        value = self.derived.get(key)
+        if value is None:
+            value = self.derived[key] = build()
+        return value
+
 
-    return results
+class InstructionIndex(object):
+    """Inverted index from (operator, first operand) to the positions of matching instructions in a list of jump blocks
+
+    Each key maps to a postings list stored as two parallel arrays: the ids (list indexes) of the blocks containing
+    such an instruction and the instruction's index within the block, both in ascending block order.
+    """
+
+    def __init__(self, blocks):
+        """
+        blocks -- list of InstructionSequence objects to index, normally ALL_JUMP_BLOCKS
+        """
+        self.blocks = blocks
+        self.indexed_count = 0
+        self.postings = {}
+
+    def update(self):
+        """Indexes blocks appended to self.blocks since the last update"""
+        for block_id in xrange(self.indexed_count, len(self.blocks)):
+            for instruction_index, instruction in enumerate(self.blocks[block_id]):
+                key = (instruction.operator, instruction.operands[0])
+                postings = self.postings.get(key)
+                if postings is None:
+                    postings = self.postings[key] = (array.array('I'), array.array('I'))
+                postings[0].append(block_id)
+                postings[1].append(instruction_index)
+        self.indexed_count = len(self.blocks)
+
+    def candidates(self, operator, first_operand_registers):
+        """Returns a list of (block id, sorted list of instruction indexes) in block order for every instruction whose
+        operator is operator and whose first operand is one of first_operand_registers (the union of their postings)
+
+        operator -- operator name, ex: 'lw'
+        first_operand_registers -- list of register names, ex: the expansion of 's*'
+        """
+        postings_lists = [self.postings[(operator, register)] for register in set(first_operand_registers)
+                          if (operator, register) in self.postings]
+        if len(postings_lists) == 1:
+            # already in order, group the indexes by block
+            block_ids, instruction_indexes = postings_lists[0]
+            results = []
+            for block_id, instruction_index in zip(block_ids, instruction_indexes):
+                if results and results[-1][0] == block_id:
+                    results[-1][1].append(instruction_index)
+                else:
+                    results.append((block_id, [instruction_index]))
+            return results
+
+        by_block = {}
+        for block_ids, instruction_indexes in postings_lists:
+            for block_id, instruction_index in zip(block_ids, instruction_indexes):
+                by_block.setdefault(block_id, []).append(instruction_index)
+        return [(block_id, sorted(by_block[block_id])) for block_id in sorted(by_block)]
 
 
 class Function(object):
@@ -73,7 +525,23 @@ class Function(object):
         """
         first_line -- first line of a function from objdump output that contains its name and start offset
         """
-        self.start, self.name = Function.FIRST_LINE_PATTERN.findall(first_line)[0]
+        start, name = Function.FIRST_LINE_PATTERN.findall(first_line)[0]
+        self._init_fields(start, name)
+
+    @classmethod
+    def from_fields(cls, start, name):
+        """Returns a new, empty Function for input that isn't objdump text (ex: a symbol table entry)
+
+        start -- the function's start offset as a hex string
+        name -- the function's name
+        """
+        function = cls.__new__(cls)
+        function._init_fields(start, name)
+        return function
+
+    def _init_fields(self, start, name):
+        self.start = start
+        self.name = name
         self.jump_blocks = []
         self.instructions = []
 
@@ -84,11 +552,17 @@ class Function(object):
         """
         self.instructions.append(Instruction(line))
 
-    def extract_jump_blocks(self):
+    def add_instruction_fields(self, address, raw_word, operator, operands):
+        """Adds an instruction object made from the fields of its line (see: tokenize_instruction_line())"""
+        self.instructions.append(Instruction.from_fields(address, raw_word, operator, operands))
+
+    def extract_jump_blocks(self, accumulate=True):
         """Extracts suitable subsets from self.instructions and stores them in self.jump_blocks
 
         Suitable instruction subsets end in a jump instruction (plus branch delay slot instruction)
         and do not contain branch instructions.
+
+        accumulate -- whether to also add them to ALL_JUMP_BLOCKS
         """
         i = 0
         block = []
@@ -105,8 +579,8 @@ class Function(object):
                 block = []
             i += 1
 
-        global ALL_JUMP_BLOCKS
-        ALL_JUMP_BLOCKS.extend(self.jump_blocks)
+        if accumulate:
+            ALL_JUMP_BLOCKS.extend(self.jump_blocks)
 
 
 class Instruction(object):
@@ -141,16 +615,45 @@ class Instruction(object):
             for operator in Instruction.OP_TYPES[operator_type]:
                 Instruction.OPERATOR_TO_TYPE[operator] = operator_type
 
+    # instructions are by far the most numerous objects, so they have no __dict__ and store the offset and raw word
+    # as integers. operators and operands are interned and equal operand lists share a single tuple
+    __slots__ = ('address', 'raw_word', 'operator', 'operands', 'operator_type')
+
+    # maps operands strings to the shared tuple of interned operands for them
+    OPERANDS_CACHE = {}
+
     def __init__(self, line):
         """
         line -- string consisting of a line from a function in objdump output that contains
                 its offset, operator, and operands
         """
-        offset, raw, operator, operands = Instruction.INSTRUCTION_LINE_PATTERN.findall(line)[0]
-        self.offset = offset
-        self.raw = raw
-        self.operands = operands.split(',')
-        self.operator = operator
+        fields = tokenize_instruction_line(line)
+        if fields is None:
+            raise ValueError("Not an instruction line: %r" % line)
+        self._init_fields(*fields)
+
+    @classmethod
+    def from_fields(cls, address, raw_word, operator, operands):
+        """Returns a new Instruction built from fields that have already been separated, skipping tokenizing a line
+
+        address -- the instruction's offset as an integer
+        raw_word -- the raw instruction word as an integer
+        operator -- operator name, ex: 'lw'
+        operands -- comma separated operands string, ex: 'ra,28(sp)'
+        """
+        instruction = cls.__new__(cls)
+        instruction._init_fields(address, raw_word, operator, operands)
+        return instruction
+
+    def _init_fields(self, address, raw_word, operator, operands):
+        self.address = address
+        self.raw_word = raw_word
+        operands_tuple = Instruction.OPERANDS_CACHE.get(operands)
+        if operands_tuple is None:
+            operands_tuple = Instruction.OPERANDS_CACHE[operands] = tuple(
+                intern(operand) for operand in operands.split(','))
+        self.operands = operands_tuple
+        self.operator = intern(operator)
         try:
             self.operator_type = Instruction.OPERATOR_TO_TYPE[self.operator]
         except KeyError:
@@ -160,6 +663,16 @@ class Instruction(object):
                 if not self.operator.startswith('0x'):
                     print "Unknown operator: %s at %s. Please submit a bug report." % (self.operator, self.offset)
 
+    @property
+    def offset(self):
+        """The instruction's offset as a hex string"""
+        return "%x" % self.address
+
+    @property
+    def raw(self):
+        """The raw instruction word as a hex string"""
+        return "%08x" % self.raw_word
+
     def __repr__(self):
         return "%s: %s %s" % (self.offset, self.operator, ",".join(self.operands))
 
@@ -185,12 +698,79 @@ class Instruction(object):
 Instruction._build_operator_to_type_dict()
 
 
+class SearchPattern(collections.namedtuple('SearchPattern', 'operator first_operand_registers operands')):
+    """An immutable, compiled search pattern (see: compile_search_pattern())
+
+    It is a search criteria tuple, so it can be used anywhere one is accepted, with first_operand_registers as a
+    frozenset and operands as a tuple.
+    """
+    __slots__ = ()
+
+    def matches(self, instruction):
+        """Returns True if instruction has the operator, a first operand in first_operand_registers and other
+        operands containing the pattern's operands (see: Instruction.check_other_operands_match())
+        """
+        return (
+            instruction.operator == self.operator and
+            instruction.operands[0] in self.first_operand_registers and
+            instruction.check_other_operands_match(self.operands)
+        )
+
+
+class _LRUCache(object):
+    """Mapping that keeps the max_size most recently used items"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = collections.OrderedDict()
+
+    def get(self, key):
+        value = self._items.pop(key, None)
+        if value is not None:
+            self._items[key] = value
+        return value
+
+    def put(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+_compiled_search_patterns = _LRUCache(SEARCH_PATTERN_CACHE_SIZE)
+
+
+def compile_search_pattern(pattern):
+    """Returns the SearchPattern for pattern, reusing the one compiled for the same string recently
+
+    pattern -- string in the 'search pattern' format, search criteria tuple or SearchPattern
+    """
+    if isinstance(pattern, SearchPattern):
+        return pattern
+    if isinstance(pattern, basestring):
+        compiled = _compiled_search_patterns.get(pattern)
+        if compiled is None:
+            compiled = InstructionSequence.extract_search_criteria(pattern)
+            _compiled_search_patterns.put(pattern, compiled)
+        return compiled
+    assert type(pattern) == tuple and len(pattern) == 3, "'pattern' must be a string or search criteria tuple"
+    desired_operator, desired_first_operand_registers, desired_operands = pattern
+    return SearchPattern(desired_operator, frozenset(desired_first_operand_registers), tuple(desired_operands))
+
+
 class InstructionSequence(list):
     """Subclass of list specifically to store Instruction objects in order."""
 
-    def __init__(self, instructions):
+    def __init__(self, instructions, register_changes=None):
         """
         instructions -- list of Instruction objects ending with a jump and branch delay slot
+        register_changes -- optional, previously computed register_changes for instructions (ex: from a gadget index)
         """
         list.__init__(self, instructions)
 
@@ -199,7 +779,10 @@ class InstructionSequence(list):
         # the register this sequence will eventually jump to
         self.jump_register = self[-2].operands[0]
 
-        self._store_register_changes()
+        if register_changes is None:
+            self._store_register_changes()
+        else:
+            self.register_changes = register_changes
 
     def _store_register_changes(self):
         """Iterates over instructions in reverse order to find the last time a register is changed and stores the
@@ -285,8 +868,10 @@ class InstructionSequence(list):
         """Extracts the desired operator and operands, expanding a pattern for the first operand
            into a list of registers for the first operand.
 
-        Returns a tuple (referred to as a 'search criteria tuple') of:
-            operator, list of register names from expanding first operand pattern, list of original search operands
+        Returns a SearchPattern, a tuple (referred to as a 'search criteria tuple') of:
+            operator, set of register names from expanding first operand pattern, tuple of original search operands
+
+        compile_search_pattern() caches the result for each search_str.
 
         search_str -- a string of the format: OPERATOR OPERAND1_PATTERN,OPERAND2
         """
@@ -302,20 +887,18 @@ class InstructionSequence(list):
         else:
             desired_first_operand_registers = [desired_operands[0]]
 
-        return desired_operator, desired_first_operand_registers, desired_operands
+        return SearchPattern(
+            intern(desired_operator), frozenset(desired_first_operand_registers), tuple(desired_operands)
+        )
 
     @staticmethod
     def get_search_criteria(pattern):
-        """Returns a search criteria tuple
+        """Returns the compiled SearchPattern for pattern (see: compile_search_pattern())
 
-        pattern -- string in the 'search pattern' format or search criteria tuple
+        pattern -- string in the 'search pattern' format, search criteria tuple or SearchPattern
                    (see: InstructionSequence.extract_search_criteria())
         """
-        if type(pattern) == str:
-            pattern = InstructionSequence.extract_search_criteria(pattern)
-        else:
-            assert type(pattern) == tuple and len(pattern) == 3, "'pattern' must be a string or search criteria tuple"
-        return pattern
+        return compile_search_pattern(pattern)
 
     def instruction_matches(self, instruction_index, desired_operator, desired_first_operand_registers, desired_operands):
         """Returns True if the Instruction at self[instruction_index] matches the criteria of the 'desired' arguments"""
@@ -328,7 +911,17 @@ class InstructionSequence(list):
             self.register_changes.get(instruction.operands[0], -1) <= instruction_index
         )
 
-    def search(self, pattern, disallowed_registers=None, desired_jump_register=None):
+    def find_matching_instruction(self, pattern):
+        """Returns the first instruction that matches pattern the way search() matches instructions, or None
+
+        pattern -- string in the 'search pattern' format, search criteria tuple or SearchPattern
+        """
+        search_criteria = InstructionSequence.get_search_criteria(pattern)
+        for i in xrange(len(self)):
+            if self.instruction_matches(i, *search_criteria):
+                return self[i]
+
+    def search(self, pattern, disallowed_registers=None, desired_jump_register=None, candidate_indexes=None):
         """Searches for and, if found, returns a portion of this InstructionSequence that matches criteria
 
         Criteria: matches pattern,
@@ -341,6 +934,8 @@ class InstructionSequence(list):
 
         disallowed_registers -- optional list of registers that must not be changed in instructions after a match
         desired_jump_register -- optional string name of the register the jump instruction must jump to
+        candidate_indexes -- optional ascending list of the only instruction indexes that need to be checked
+                             (ex: from InstructionIndex.candidates()), all instructions are checked by default
         """
         (
             desired_operator,
@@ -358,8 +953,11 @@ class InstructionSequence(list):
         if desired_jump_register and self.jump_register != desired_jump_register:
             return None
 
+        if candidate_indexes is None:
+            candidate_indexes = xrange(len(self))
+
         # iterate over the instructions in order and return the first one that matches the criteria
-        for index in xrange(len(self)):
+        for index in candidate_indexes:
             if self.instruction_matches(index, desired_operator, desired_first_operand_registers, desired_operands):
                 match = self._include_copy_to_jump_register(self[index:], disallowed_registers)
                 if match:
@@ -0,0 +1,333 @@
+"""Combines searches and predicates over objdump_handler.ALL_JUMP_BLOCKS with AND, OR and AND NOT
+
+Every term evaluates to a ResultSet, a bitmap with one bit per jump block (a Python int, with bit i set if block i of
+ALL_JUMP_BLOCKS matches), so combining terms is a single integer operation however many blocks match. Terms are
+searches (see: objdump_handler.search()), writes(REGISTERS) and jumps(REGISTERS), and their bitmaps are kept in the
+loaded binary's objdump_handler.SearchRegistry.
+
+Expressions (see: parse()) combine terms with 'and', 'or', 'not' (or '&', '|', '!') and parentheses, 'not' binding
+tightest and 'or' loosest. Search patterns are quoted, ex:
+
+    'lw s0,sp' and 'move t9,s0' and not writes(a0)
+
+Since terms only record which blocks match, they don't know where in a block their match starts:
+    - 'and' between two searches only requires both to match somewhere in the block, in any order. Above, the
+      'lw s0,sp' may come after the 'move t9,s0'
+    - writes() looks at the whole block, including instructions before the subsequence a search matched, so
+      'not writes(a0)' also drops blocks that only change a0 before the gadget starts. Pass a0 as one of the
+      disallowed registers of the searches instead to only exclude changes within the matched subsequence
+"""
+import binascii
+import re
+import objdump_handler
+import utils
+
+
+class QueryError(ValueError):
+    """Raised for an expression that can't be parsed"""
+    pass
+
+
+# positions of the set bits of each byte value, see iter_bitmap()
+_BYTE_BITS = [tuple(bit for bit in xrange(8) if value >> bit & 1) for value in xrange(256)]
+
+
+def bitmap_from_ids(block_ids):
+    """Returns the bitmap with the bits of the ids in block_ids set
+
+    block_ids -- sequence of non-negative integers, ex: an InstructionIndex postings array
+    """
+    if not len(block_ids):
+        return 0
+    # set the bits in a byte array and convert it once rather than or-ing one bit at a time into a growing int
+    data = bytearray((max(block_ids) >> 3) + 1)
+    for block_id in block_ids:
+        data[block_id >> 3] |= 1 << (block_id & 7)
+    data.reverse()
+    return int(binascii.hexlify(data), 16)
+
+
+def iter_bitmap(bitmap):
+    """Generator yielding the positions of the set bits of bitmap in ascending order"""
+    if not bitmap:
+        return
+    hex_digits = '%x' % bitmap
+    data = bytearray(binascii.unhexlify('0' * (len(hex_digits) & 1) + hex_digits))
+    data.reverse()
+    for byte_index, byte in enumerate(data):
+        if byte:
+            base = byte_index << 3
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+class ResultSet(object):
+    """Set of the ids (indexes in ALL_JUMP_BLOCKS) of the jump blocks matching a query, stored as a bitmap
+
+    Sets are combined with & (AND), | (OR) and - (AND NOT), which return new sets. Iterating over a set yields its
+    block ids in ascending order.
+
+    bitmap -- integer with the bit of each block id in the set set
+    sequences -- tuple of dicts mapping block ids to the subsequence a search matched (see: sequence())
+    """
+
+    def __init__(self, bitmap, sequences=()):
+        self.bitmap = bitmap
+        self.sequences = tuple(sequences)
+
+    def __and__(self, other):
+        # block level: two searches in the same block match in any order (see the module docstring)
+        return ResultSet(self.bitmap & other.bitmap, self.sequences + other.sequences)
+
+    def __or__(self, other):
+        return ResultSet(self.bitmap | other.bitmap, self.sequences + other.sequences)
+
+    def __sub__(self, other):
+        return ResultSet(self.bitmap & ~other.bitmap, self.sequences)
+
+    def __len__(self):
+        return bin(self.bitmap).count('1')
+
+    def __nonzero__(self):
+        return self.bitmap != 0
+
+    def __iter__(self):
+        return iter_bitmap(self.bitmap)
+
+    def __contains__(self, block_id):
+        return bool(self.bitmap >> block_id & 1)
+
+    def sequence(self, block_id):
+        """Returns the longest of the subsequences of block block_id matched by the searches this set was made from,
+        which ends with the others since they all end with the block's jump, or the whole block if no search matched
+        it (ex: a set made only from writes())
+        """
+        longest = None
+        for sequences in self.sequences:
+            sequence = sequences.get(block_id)
+            if sequence is not None and (longest is None or len(sequence) > len(longest)):
+                longest = sequence
+        if longest is None:
+            return objdump_handler.ALL_JUMP_BLOCKS[block_id]
+        return longest
+
+    def iter_results(self):
+        """Generator yielding (block id, matching subsequence) for each block in the set, see: sequence()"""
+        for block_id in self:
+            yield block_id, self.sequence(block_id)
+
+    def results(self):
+        """Returns the list of matching subsequences in block order, like objdump_handler.search()"""
+        return [sequence for block_id, sequence in self.iter_results()]
+
+
+def all_blocks():
+    """Returns the ResultSet of every block in ALL_JUMP_BLOCKS"""
+    return ResultSet((1 << len(objdump_handler.ALL_JUMP_BLOCKS)) - 1)
+
+
+def search(pattern, disallowed_registers=None, desired_jump_register=None):
+    """Returns the ResultSet of the blocks objdump_handler.search() matches with these arguments"""
+    def build():
+        sequences = dict(objdump_handler.iter_search(pattern, disallowed_registers, desired_jump_register))
+        return ResultSet(bitmap_from_ids(sequences.keys()), [sequences])
+
+    key = ('query', objdump_handler.search_query_key(pattern, disallowed_registers, desired_jump_register))
+    return objdump_handler.get_search_registry().derive(key, build)
+
+
+def writes(registers):
+    """Returns the ResultSet of the blocks with an instruction that changes one of registers (the same instructions
+    as InstructionSequence.register_changes), found from the InstructionIndex without looking at the blocks
+
+    The whole block is considered, not just the subsequence a search combined with this set matched, see the module
+    docstring
+
+    registers -- list of register names
+    """
+    def build():
+        registers_set = set(registers)
+        bitmap = 0
+        index = objdump_handler.get_instruction_index()
+        # only the matching keys' postings are looked up, which a stored index reads on first use
+        for operator, first_operand in index.postings.keys():
+            if (
+                first_operand in registers_set and
+                objdump_handler.Instruction.OPERATOR_TO_TYPE.get(operator) in
+                objdump_handler.Instruction.CHANGE_OP_TYPES
+            ):
+                bitmap |= bitmap_from_ids(index.postings[(operator, first_operand)][0])
+        return ResultSet(bitmap)
+
+    return objdump_handler.get_search_registry().derive(('query', 'writes', tuple(sorted(set(registers)))), build)
+
+
+def jumps(registers):
+    """Returns the ResultSet of the blocks that jump to one of registers
+
+    registers -- list of register names
+    """
+    def build():
+        registers_set = set(registers)
+        return ResultSet(bitmap_from_ids([block_id for block_id, block in enumerate(objdump_handler.ALL_JUMP_BLOCKS)
+                                          if block.jump_register in registers_set]))
+
+    return objdump_handler.get_search_registry().derive(('query', 'jumps', tuple(sorted(set(registers)))), build)
+
+
+# name -> function taking a list of registers, for the terms of expressions
+PREDICATES = {
+    'writes': writes,
+    'jumps': jumps,
+}
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<pattern>'[^']*'|"[^"]*")                                # quoted search pattern
+        |(?P<operator>and|or|not)\b
+        |(?P<predicate>[a-z_]+)\s*\(\s*(?P<registers>[^()]*?)\s*\)    # predicate call, ex: writes(a0,s*)
+        |(?P<symbol>[()&|!])
+    )
+""", re.VERBOSE)
+
+_SYMBOL_OPERATORS = {'&': 'and', '|': 'or', '!': 'not'}
+
+
+def tokenize(expression):
+    """Returns the list of (kind, value) tokens in expression, kind being 'pattern', 'predicate' (with a (name,
+    registers) value), 'and', 'or', 'not', '(' or ')'
+    """
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if match is None:
+            raise QueryError("Unexpected %r at position %d" % (expression[position:].lstrip()[:10], position))
+        position = match.end()
+        if match.group('pattern'):
+            tokens.append(('pattern', match.group('pattern')[1:-1]))
+        elif match.group('predicate'):
+            tokens.append(('predicate', (match.group('predicate'), match.group('registers'))))
+        elif match.group('operator'):
+            tokens.append((match.group('operator'), None))
+        else:
+            symbol = match.group('symbol')
+            tokens.append((_SYMBOL_OPERATORS.get(symbol, symbol), None))
+    return tokens
+
+
+def parse(expression):
+    """Returns the syntax tree of expression, nested tuples of:
+
+        ('search', PATTERN)
+        (PREDICATE, [REGISTER, ...])  -- PREDICATE being a name in PREDICATES
+        ('and', LEFT, RIGHT), ('or', LEFT, RIGHT), ('not', OPERAND)
+
+    :raises QueryError: if expression isn't valid
+    """
+    parser = _Parser(tokenize(expression))
+    tree = parser.parse_or()
+    if parser.position < len(parser.tokens):
+        raise QueryError("Unexpected %s after a complete expression" % parser.describe(parser.tokens[parser.position]))
+    return tree
+
+
+class _Parser(object):
+    """Recursive descent parser over the tokens of an expression"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def take(self):
+        if self.position >= len(self.tokens):
+            raise QueryError("Unexpected end of expression")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    @staticmethod
+    def describe(token):
+        kind, value = token
+        if kind == 'pattern':
+            return "pattern %r" % value
+        if kind == 'predicate':
+            return "%s(%s)" % value
+        return repr(kind)
+
+    def parse_or(self):
+        tree = self.parse_and()
+        while self.peek() == 'or':
+            self.take()
+            tree = ('or', tree, self.parse_and())
+        return tree
+
+    def parse_and(self):
+        tree = self.parse_not()
+        while self.peek() == 'and':
+            self.take()
+            tree = ('and', tree, self.parse_not())
+        return tree
+
+    def parse_not(self):
+        if self.peek() == 'not':
+            self.take()
+            return 'not', self.parse_not()
+        return self.parse_term()
+
+    def parse_term(self):
+        token = self.take()
+        kind, value = token
+        if kind == 'pattern':
+            try:
+                objdump_handler.compile_search_pattern(value)
+            except Exception:
+                raise QueryError("Invalid search pattern %r" % value)
+            return 'search', value
+        if kind == 'predicate':
+            name, register_pattern = value
+            if name not in PREDICATES:
+                raise QueryError("Unknown predicate %s(), expected one of: %s" % (name, ", ".join(sorted(PREDICATES))))
+            registers = utils.build_register_list_from_pattern(register_pattern)
+            if not registers:
+                raise QueryError("%s() needs registers, ex: %s(a0,s*)" % (name, name))
+            return name, registers
+        if kind == '(':
+            tree = self.parse_or()
+            if self.peek() != ')':
+                raise QueryError("Missing ')'")
+            self.take()
+            return tree
+        raise QueryError("Expected a pattern, a predicate or '(' but got %s" % self.describe(token))
+
+
+def evaluate(expression, disallowed_registers=None, desired_jump_register=None):
+    """Returns the ResultSet of the blocks matching expression in ALL_JUMP_BLOCKS
+
+    expression -- expression string or syntax tree from parse()
+    disallowed_registers, desired_jump_register -- used for every search in expression, see objdump_handler.search()
+    """
+    tree = parse(expression) if isinstance(expression, basestring) else expression
+    return _evaluate(tree, disallowed_registers, desired_jump_register)
+
+
+def _evaluate(tree, disallowed_registers, desired_jump_register):
+    kind = tree[0]
+    if kind == 'search':
+        return search(tree[1], disallowed_registers, desired_jump_register)
+    if kind in PREDICATES:
+        return PREDICATES[kind](tree[1])
+    if kind == 'not':
+        return all_blocks() - _evaluate(tree[1], disallowed_registers, desired_jump_register)
+    left = _evaluate(tree[1], disallowed_registers, desired_jump_register)
+    if kind == 'and' and tree[2][0] == 'not':
+        # AND NOT, without going through the complement
+        return left - _evaluate(tree[2][1], disallowed_registers, desired_jump_register)
+    right = _evaluate(tree[2], disallowed_registers, desired_jump_register)
+    return left & right if kind == 'and' else left | right
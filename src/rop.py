@@ -1,9 +1,150 @@
+import collections
+import heapq
+import time
+import instrumentation
 import objdump_handler
+import utils
+
+
+class BuildStats(object):
+    """Statistics about a rop.Builder search"""
+
+    # values of stop_reason
+    EXHAUSTED = 'exhausted'  # every possible sequence was considered
+    MAX_COUNT = 'max_count'  # the requested number of sequences was found
+    TIME_BUDGET = 'time_budget'
+    NODE_BUDGET = 'node_budget'
+
+    def __init__(self):
+        # the number of search states entered (one per partial sequence extended)
+        self.nodes_expanded = 0
+        # the number of times a subtree was skipped because its state was known to fail
+        self.subtrees_skipped = 0
+        # the number of search states whose subtree was searched without finding a sequence
+        self.backtracks = 0
+        # the number of times a gadget was checked against the fresh registers of a partial sequence
+        self.compatibility_checks = 0
+        self.sequences_found = 0
+        # wall-clock seconds spent finding the pipeline's gadgets before searching (see: GadgetType.populate)
+        self.populate_elapsed = 0.0
+        # wall-clock seconds spent searching
+        self.elapsed = 0.0
+        # why the search ended, None while it's running
+        self.stop_reason = None
+
+    def __repr__(self):
+        return (
+            "BuildStats(nodes_expanded=%d, subtrees_skipped=%d, backtracks=%d, compatibility_checks=%d, "
+            "sequences_found=%d, populate_elapsed=%.3f, elapsed=%.3f, stop_reason=%s)" % (
+                self.nodes_expanded, self.subtrees_skipped, self.backtracks, self.compatibility_checks,
+                self.sequences_found, self.populate_elapsed, self.elapsed, self.stop_reason)
+        )
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class CompatibilityGraph(object):
+    """For each stage of a pipeline, the gadgets that can follow a given gadget of the previous stage.
+
+    Adjacency lists are built with GadgetType.is_pair_compatible() as the search first goes through them and then
+    reused, so the builder only has to check fresh registers while searching. Previous gadgets with the same
+    GadgetType.compatibility_key() share a single list, and stages that don't override is_pair_compatible()
+    use their whole rop_gadgets list.
+    """
+
+    def __init__(self, pipeline):
+        """
+        pipeline -- list of GadgetType objects with their gadgets already searched for
+        """
+        self.pipeline = pipeline
+        self.gadget_lists = [stage.rop_gadgets for stage in pipeline]
+        # per stage, whether the pair check has to run at all
+        self.filters_pairs = [_is_overridden(stage, 'is_pair_compatible', GadgetType) for stage in pipeline]
+        # per stage, whether the stage has its own is_compatible() that has to be called while searching
+        self.custom_compatibility = [_is_overridden(stage, 'is_compatible', GadgetType) for stage in pipeline]
+        # per stage, compatibility_key -> list of gadgets that can follow a previous gadget with that key
+        self._successors = [{} for stage in pipeline]
+
+    def is_current(self, pipeline):
+        """Returns True if this graph was built for pipeline and none of its stages' gadgets have changed since"""
+        return (
+            len(pipeline) == len(self.pipeline) and
+            all(stage is built_stage for stage, built_stage in zip(pipeline, self.pipeline)) and
+            all(stage.rop_gadgets is gadgets for stage, gadgets in zip(pipeline, self.gadget_lists))
+        )
+
+    def successors(self, depth, previous_gadget):
+        """Returns an iterable of the gadgets of stage depth that can follow previous_gadget, in priority order"""
+        if not self.filters_pairs[depth]:
+            return self.gadget_lists[depth]
+        stage = self.pipeline[depth]
+        key = stage.compatibility_key(previous_gadget)
+        successors = self._successors[depth].get(key)
+        if successors is None:
+            successors = self._successors[depth][key] = _FilteredGadgets(
+                self.gadget_lists[depth], lambda gadget: stage.is_pair_compatible(gadget, previous_gadget)
+            )
+        return successors
+
+    def precompute(self):
+        """Builds every adjacency list up front instead of as the search reaches them"""
+        for depth in xrange(1, len(self.pipeline)):
+            for previous_gadget in self.gadget_lists[depth - 1]:
+                self.successors(depth, previous_gadget)
+
+    def is_compatible(self, depth, gadget, previous_gadget, fresh_registers):
+        """Returns True if gadget, already known to be one of previous_gadget's successors, fits fresh_registers"""
+        stage = self.pipeline[depth]
+        if self.custom_compatibility[depth]:
+            return stage.is_compatible(gadget, previous_gadget, fresh_registers)
+        return stage.is_register_compatible(gadget, fresh_registers)
+
+
+class _FilteredGadgets(object):
+    """The gadgets of a list that pass a filter, checked as iteration reaches them and remembered for later iterations,
+    so a LazyGadgetList is only analyzed as far as the search gets
+    """
+
+    def __init__(self, gadgets, accept):
+        self._remaining = iter(gadgets)
+        self._accept = accept
+        self._gadgets = []
+
+    def _filter_next(self):
+        """Adds the next accepted gadget to self._gadgets, returning False if there are none left"""
+        for gadget in self._remaining:
+            if self._accept(gadget):
+                self._gadgets.append(gadget)
+                return True
+        return False
+
+    def __iter__(self):
+        i = 0
+        while i < len(self._gadgets) or self._filter_next():
+            yield self._gadgets[i]
+            i += 1
+
+
+class NoGadgetsError(Exception):
+    """Raised by Builder when a gadget type in its pipeline has no gadgets, so no rop sequence can be built"""
+    pass
+
+
+class _BudgetExhausted(Exception):
+    """Unwinds the recursive search when a time or node budget runs out"""
+
+    def __init__(self, stop_reason):
+        Exception.__init__(self, stop_reason)
+        self.stop_reason = stop_reason
 
 
 class Builder(object):
     """For building a sequence of ROP gadgets from subclasses of GadgetType"""
 
+    # number of candidates of a search node between checks of the time budget
+    DEADLINE_CHECK_INTERVAL = 256
+
     def __init__(self, pipeline):
         """
         pipeline -- list of GadgetType objects in the same order as the desire rop sequence
@@ -11,89 +152,203 @@ class Builder(object):
         self.pipeline = pipeline
         self.rop_sequence = []
         self.rop_sequence_offsets = []
+        # all sequences found by the last call to run_many()
+        self.rop_sequences = []
+        # (pipeline depth, fresh registers, GadgetType.compatibility_key of the previous gadget) states that are
+        # known not to lead to a complete sequence
+        self.failed_states = set()
+        self.stats = BuildStats()
+        self._compatibility_graph = None
+        self._deadline = None
+        self._node_budget = None
+
+    @property
+    def skipped_subtrees(self):
+        """The number of times a subtree was skipped because its state was in self.failed_states"""
+        return self.stats.subtrees_skipped
+
+    @property
+    def compatibility_graph(self):
+        """The CompatibilityGraph for self.pipeline, reused by later runs as long as the pipeline's gadgets don't
+        change
+        """
+        if self._compatibility_graph is None or not self._compatibility_graph.is_current(self.pipeline):
+            self._compatibility_graph = CompatibilityGraph(self.pipeline)
+        return self._compatibility_graph
 
     def run(self):
         """Processes the pipeline and returns a valid rop sequence or None if not possible
 
-        :raises Exception: if no gadgets are found for one of the gadget types in self.pipeline
+        :raises NoGadgetsError: if no gadgets are found for one of the gadget types in self.pipeline
         """
+        sequences = list(self.iter_sequences(max_count=1))
+        self.rop_sequence = sequences[0] if sequences else []
+        self.rop_sequence_offsets = [gadget[0].offset for gadget in self.rop_sequence]
+
+    def run_many(self, max_count, time_budget=None, node_budget=None):
+        """Returns a tuple of (list of up to max_count valid rop sequences in priority order, BuildStats), stopping
+        early with the sequences found so far when a budget runs out. The sequences are also stored in
+        self.rop_sequences.
+
+        See iter_sequences() for the arguments.
+        """
+        self.rop_sequences = list(self.iter_sequences(max_count, time_budget, node_budget))
+        return self.rop_sequences, self.stats
+
+    def iter_sequences(self, max_count=None, time_budget=None, node_budget=None):
+        """Generator that lazily yields valid rop sequences (lists of Gadgets) in priority order.
+
+        Sequences come out in the order of each GadgetType's rop_gadgets (see: GadgetType.prioritize), comparing
+        the first stage's gadgets first, then the second's, and so on, so the first sequence yielded is the one run()
+        finds. self.stats is updated as the search runs and its stop_reason is set when it ends.
+
+        max_count -- optional maximum number of sequences to yield
+        time_budget -- optional number of wall-clock seconds after which to stop searching
+        node_budget -- optional number of search nodes (see: BuildStats.nodes_expanded) after which to stop searching
+
+        :raises NoGadgetsError: if no gadgets are found for one of the gadget types in self.pipeline
+        """
+        # find the gadgets for every stage of the pipeline in one pass over the jump blocks
+        populate_start = time.time()
+        GadgetType.populate(self.pipeline)
+        populate_elapsed = time.time() - populate_start
+
         for i, pipe in enumerate(self.pipeline):
             if not pipe.rop_gadgets:
                 # there's no sense attempting to build if we don't have all the materials
                 # usefully notifies of a failure early (and the cause) especially since, if the last pipe is empty,
                 # recursive calls to Builder._build will iterate over every gadget of every pipe only to return None
-                raise Exception("No gadgets found for type: %s. Canceling build." % pipe.__class__.__name__)
+                raise NoGadgetsError("No gadgets found for type: %s. Canceling build." % pipe.__class__.__name__)
 
-        result = Builder._build(self.pipeline, set(), [])
-        self.rop_sequence = result if result else []
-        self.rop_sequence_offsets = [gadget[0].offset for gadget in self.rop_sequence]
+        self.failed_states = set()
+        self._graph = self.compatibility_graph
+        self.stats = stats = BuildStats()
+        stats.populate_elapsed = populate_elapsed
+        start_time = time.time()
+        self._deadline = start_time + time_budget if time_budget is not None else None
+        self._node_budget = node_budget
 
-    @staticmethod
-    def _build(pipeline, fresh_registers, rop_sequence):
-        """Returns the first valid sequence of gadgets encountered by recursively calling itself, advancing through the
-        pipeline as gadgets are found that are valid for in the context of rop_sequence.
+        try:
+            if max_count is not None and max_count <= 0:
+                stats.stop_reason = BuildStats.MAX_COUNT
+                return
+            for sequence in self._build(self.pipeline, 0, []):
+                stats.sequences_found += 1
+                stats.elapsed = time.time() - start_time
+                yield sequence
+                if max_count is not None and stats.sequences_found >= max_count:
+                    stats.stop_reason = BuildStats.MAX_COUNT
+                    return
+            stats.stop_reason = BuildStats.EXHAUSTED
+        except _BudgetExhausted as e:
+            stats.stop_reason = e.stop_reason
+        finally:
+            stats.elapsed = time.time() - start_time
+            if instrumentation.ENABLED:
+                instrumentation.add_time('build.populate', stats.populate_elapsed)
+                instrumentation.add_time('build.search', stats.elapsed)
+                instrumentation.count('builder_nodes_expanded', stats.nodes_expanded)
+                instrumentation.count('builder_backtracks', stats.backtracks)
+                instrumentation.count('builder_subtrees_skipped', stats.subtrees_skipped)
+                instrumentation.count('compatibility_checks', stats.compatibility_checks)
+
+    def _expand_node(self):
+        """Counts a search node and raises _BudgetExhausted if a budget has run out"""
+        if self._node_budget is not None and self.stats.nodes_expanded >= self._node_budget:
+            raise _BudgetExhausted(BuildStats.NODE_BUDGET)
+        self._check_deadline()
+        self.stats.nodes_expanded += 1
+
+    def _check_deadline(self):
+        """Raises _BudgetExhausted if the time budget has run out"""
+        if self._deadline is not None and time.time() > self._deadline:
+            raise _BudgetExhausted(BuildStats.TIME_BUDGET)
+
+    def _build(self, pipeline, fresh_registers, rop_sequence):
+        """Generator yielding every valid sequence of gadgets that extends rop_sequence, by recursively calling itself,
+        advancing through the pipeline as gadgets are found that are valid for in the context of rop_sequence.
         If a gadget fitting into the sequence cannot be found, the method returns and picks up where it left off for the
         previous gadget type in the pipeline.
 
+        Whether the rest of the pipeline can be completed only depends on the pipeline depth, fresh_registers, and
+        the part of the previous gadget the current GadgetType's is_compatible() looks at, so states whose subtree
+        was fully searched without finding a sequence are recorded in self.failed_states and skipped when they come
+        up again.
+
         pipeline -- list containing GadgetType classes in the same order that's desired for rop_sequence
                     each recursive call causes pipeline to start with the next GadgetType
-        fresh_registers -- list of registers currently available for use
+        fresh_registers -- register mask (see: utils.register_mask) of the registers currently available for use
         rop_sequence -- the current list of Gadgets up to but not including pipeline[0] that are compatible
         """
         crnt_gadget_type = pipeline[0]
-        for gadget in crnt_gadget_type.rop_gadgets:
-            if len(rop_sequence) == 0 or crnt_gadget_type.is_compatible(gadget, rop_sequence[-1], fresh_registers):
+        state = None
+        if rop_sequence:
+            state = (
+                len(rop_sequence),
+                fresh_registers,
+                crnt_gadget_type.compatibility_key(rop_sequence[-1])
+            )
+            if state in self.failed_states:
+                self.stats.subtrees_skipped += 1
+                return
+        self._expand_node()
+
+        depth = len(rop_sequence)
+        if depth == 0:
+            candidates = crnt_gadget_type.rop_gadgets
+        else:
+            # only gadgets that can follow the previous one are considered, leaving the fresh register check
+            candidates = self._graph.successors(depth, rop_sequence[-1])
+
+        found = False
+        stats = self.stats
+        # a node can have many candidates that all fail is_compatible() without expanding another node, so the time
+        # budget is also checked while going through them
+        check_interval = self.DEADLINE_CHECK_INTERVAL if self._deadline is not None else None
+        for i, gadget in enumerate(candidates):
+            if check_interval and i and not i % check_interval:
+                self._check_deadline()
+            if depth:
+                stats.compatibility_checks += 1
+            if depth == 0 or self._graph.is_compatible(depth, gadget, rop_sequence[-1], fresh_registers):
                 new_sequence = rop_sequence + [gadget]
                 if len(pipeline) > 1:
-                    next_fresh_registers = fresh_registers.copy()
                     # update by removing any dependent registers since they were used by gadget
                     # and by removing all registers gadget changed with an operator that wasn't 'move', 'lw', or 'addiu'
-                    next_fresh_registers -= gadget.dependent_registers | gadget.stale_registers
-                    # update by adding all registers that gadget loaded with fresh memory values
-                    next_fresh_registers |= gadget.fresh_registers
-                    result = Builder._build(pipeline[1:], next_fresh_registers, new_sequence)
-                    if result is not None:
-                        return result
+                    # then by adding all registers that gadget loaded with fresh memory values
+                    next_fresh_registers = (fresh_registers & ~gadget.consumed_mask) | gadget.fresh_mask
+                    for result in self._build(pipeline[1:], next_fresh_registers, new_sequence):
+                        found = True
+                        yield result
                 else:
-                    return new_sequence
-        return None
+                    found = True
+                    yield new_sequence
+
+        # only reached when the subtree was searched completely
+        if not found:
+            stats.backtracks += 1
+            if state is not None:
+                self.failed_states.add(state)
 
     @staticmethod
     def intersect(gadgets_a, gadgets_b):
         """Returns the list of Gadgets where a Gadget from gadgets_a was contained within a Gadget from gadgets_b or
-        vice-versa.
+        vice-versa, in the order of gadgets_b.
 
-        The function works by iterating over gadgets_a and gadgets_b individually
-        making maps of each Gadget's last Instruction's offset to the Gadget itself
-        and making sets of those offsets. The sets are then intersected and the offsets are used to look up the Gadgets.
-        The larger of the two Gadgets will always contain the smaller one,
-        so it is added to the list of common gadgets that will be returned.
+        Gadgets containing one another end with the same Instruction, so gadgets_a is mapped by the address of each
+        Gadget's last Instruction and gadgets_b is looked up in that map. The larger of the two Gadgets will always
+        contain the smaller one, so it is the one returned.
+        For combining more than two searches, see the query module, which does this with bitmaps of jump blocks.
 
         gadgets_a -- list of Gadget objects
         gadgets_b -- list of Gadget objects
         """
-        a_map_last_offset_to_gadget = {}
-        a_offset_set = set()
-        for gadget in gadgets_a:
-            offset = gadget[-1].offset
-            a_map_last_offset_to_gadget[offset] = gadget
-            a_offset_set.add(offset)
-
-        b_map_last_offset_to_gadget = {}
-        b_offset_set = set()
-        for gadget in gadgets_b:
-            offset = gadget[-1].offset
-            b_map_last_offset_to_gadget[offset] = gadget
-            b_offset_set.add(offset)
-
-        common = a_offset_set.intersection(b_offset_set)
-
+        a_map_last_offset_to_gadget = dict((gadget[-1].address, gadget) for gadget in gadgets_a)
         common_gadgets = []
-        for offset in common:
-            a_gadget = a_map_last_offset_to_gadget[offset]
-            b_gadget = b_map_last_offset_to_gadget[offset]
-            common_gadgets.append(a_gadget if len(a_gadget) > len(b_gadget) else b_gadget)
-
+        for b_gadget in gadgets_b:
+            a_gadget = a_map_last_offset_to_gadget.get(b_gadget[-1].address)
+            if a_gadget is not None:
+                common_gadgets.append(a_gadget if len(a_gadget) > len(b_gadget) else b_gadget)
         return common_gadgets
 
 
@@ -105,13 +360,15 @@ class Gadget(objdump_handler.InstructionSequence):
         gadget -- InstructionSequence object to initialize with
         gadget_type -- the subclass of GadgetType that describes this gadget
         """
-        objdump_handler.InstructionSequence.__init__(self, gadget)
+        # reuse the register changes if gadget is already an InstructionSequence
+        objdump_handler.InstructionSequence.__init__(self, gadget, getattr(gadget, 'register_changes', None))
         self.type = gadget_type
-        self.fresh_registers = set()
-        self.dependent_registers = set()
-        # registers to be removed from fresh_registers during build
+        # register masks (see: utils.register_mask) so the builder can combine them with single integer operations
+        self.fresh_mask = 0
+        self.dependent_mask = 0
+        # registers to be removed from fresh registers during build
         # since they were changed that is not a memory location
-        self.stale_registers = set()
+        self.stale_mask = 0
 
         # use self._get_last_change_to_jump_register giving it len(self) as the default index
         # to return if no controllable jump is found (so that it being returned means no controllable jump was found)
@@ -123,19 +380,46 @@ class Gadget(objdump_handler.InstructionSequence):
                     instruction.operator == 'lw' or
                     (instruction.operator == 'addiu' and instruction.operands[1] == 'sp')
                 ):
-                    self.fresh_registers.add(instruction.operands[0])
+                    self.fresh_mask |= utils.register_bit(instruction.operands[0])
                 elif instruction.operator == 'move':
                     # maintain fresh and dependent register sets for 'move' instructions
                     # TODO: can't reliably use 'lw' until we start keeping track of changes to $sp
-                    if instruction.operands[1] in self.fresh_registers:
-                        self.fresh_registers.remove(instruction.operands[1])
+                    bit = utils.register_bit(instruction.operands[1])
+                    if self.fresh_mask & bit:
+                        self.fresh_mask &= ~bit
                     else:
-                        self.dependent_registers.add(instruction.operands[1])
+                        self.dependent_mask |= bit
                 else:
                     # operation that changes a register, but to a value that isn't a memory address (ex: li)
-                    if instruction.operands[0] in self.fresh_registers:
-                        self.fresh_registers.remove(instruction.operands[0])
-                    self.stale_registers.add(instruction.operands[0])
+                    bit = utils.register_bit(instruction.operands[0])
+                    self.fresh_mask &= ~bit
+                    self.stale_mask |= bit
+
+        # registers that are no longer fresh once this gadget has run
+        self.consumed_mask = self.dependent_mask | self.stale_mask
+
+        # InstructionSequences with the same instructions as this gadget at other addresses (see: GadgetType.dedupe)
+        self.equivalents = []
+
+    @property
+    def occurrences(self):
+        """List of this gadget followed by its equivalents, any of which can be used in its place"""
+        return [self] + self.equivalents
+
+    @property
+    def fresh_registers(self):
+        """Set of the names of the registers this gadget loads with values from memory"""
+        return set(utils.register_names(self.fresh_mask))
+
+    @property
+    def dependent_registers(self):
+        """Set of the names of the registers whose values this gadget moves into other registers"""
+        return set(utils.register_names(self.dependent_mask))
+
+    @property
+    def stale_registers(self):
+        """Set of the names of the registers this gadget changes to something other than a value from memory"""
+        return set(utils.register_names(self.stale_mask))
 
     def find_matching_instruction(self, pattern=None):
         """Uses pattern to find the first matching instruction in this gadget.
@@ -143,51 +427,373 @@ class Gadget(objdump_handler.InstructionSequence):
         pattern -- if is None:
                        self.type.search_pattern will be used.
                    else:
-                       string in the 'search pattern' format or search criteria tuple
-                       (see: InstructionSequence.extract_search_criteria())
+                       string in the 'search pattern' format, search criteria tuple or compiled SearchPattern
+                       (see: objdump_handler.compile_search_pattern())
+        """
+        return objdump_handler.InstructionSequence.find_matching_instruction(
+            self, pattern if pattern is not None else self.type.search_pattern
+        )
+
+
+class LazyGadgetList(object):
+    """Read-only sequence of the Gadgets made from search results, in the same order GadgetType.search() sorts them,
+    that only creates (and analyzes) a Gadget when an item at or past it is used
+
+    Priorities are computed on the results up front and the results are kept in a heap, so getting the first gadgets
+    doesn't depend on sorting or analyzing all of them: a result's register changes are only found when it becomes a
+    Gadget (or if prioritize() uses them). Results without a controllable jump are skipped as they come off the heap.
+    len() has to go through every result.
+    """
+
+    def __init__(self, results, gadget_type, prioritize, reverse=False, dedupe=False):
         """
-        pattern = pattern if pattern is not None else self.type.search_pattern
-        search_criteria = objdump_handler.InstructionSequence.get_search_criteria(pattern)
-        for i in xrange(len(self)):
-            if self.instruction_matches(i, *search_criteria):
-                return self[i]
+        results -- list of InstructionSequence objects from objdump_handler.search()
+        gadget_type -- the subclass of GadgetType the gadgets are created for
+        prioritize -- function returning the sort key of a result (see: GadgetType.prioritize)
+        reverse -- if True, gadgets come out in descending priority order
+        dedupe -- if True, results with the same instructions are ranked and analyzed once, as a single Gadget with
+                  the others as its equivalents (see: GadgetType.dedupe)
+        """
+        self.gadget_type = gadget_type
+        if dedupe:
+            groups = group_equivalent_results(results)
+            results = [group[0] for group in groups]
+            self._equivalents = [group[1:] for group in groups]
+        else:
+            self._equivalents = None
+        # search results are plain lists, prioritize() may need InstructionSequence methods
+        results = [_UnanalyzedSequence(result) for result in results]
+        # the result's position breaks ties so the order is the same as the stable sort in GadgetType.search()
+        if reverse:
+            self._heap = [(_Descending(prioritize(result)), i, result) for i, result in enumerate(results)]
+        else:
+            self._heap = [(prioritize(result), i, result) for i, result in enumerate(results)]
+        heapq.heapify(self._heap)
+        self._gadgets = []
+
+    @property
+    def materialized_count(self):
+        """The number of Gadgets created so far"""
+        return len(self._gadgets)
+
+    def _materialize_next(self):
+        """Creates the next Gadget with a controllable jump, returning False if there are no results left"""
+        while self._heap:
+            priority, i, result = heapq.heappop(self._heap)
+            gadget = Gadget(result, self.gadget_type)
+            instrumentation.count('gadgets_constructed')
+            if gadget.has_controllable_jump:
+                if self._equivalents is not None:
+                    gadget.equivalents = _equivalent_sequences(self._equivalents[i], gadget)
+                self._gadgets.append(gadget)
+                return True
+        return False
+
+    def _materialize_through(self, index):
+        while len(self._gadgets) <= index and self._materialize_next():
+            pass
+
+    def __iter__(self):
+        # by position rather than over self._gadgets so iterators stay valid while others extend the list
+        i = 0
+        while i < len(self._gadgets) or self._materialize_next():
+            yield self._gadgets[i]
+            i += 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice) or i < 0:
+            self._materialize_through(len(self._heap) + len(self._gadgets))
+            return self._gadgets[i]
+        self._materialize_through(i)
+        return self._gadgets[i]
+
+    def __len__(self):
+        self._materialize_through(len(self._heap) + len(self._gadgets))
+        return len(self._gadgets)
+
+    def __nonzero__(self):
+        self._materialize_through(0)
+        return len(self._gadgets) > 0
+
+
+class _UnanalyzedSequence(objdump_handler.InstructionSequence):
+    """InstructionSequence of a search result that only finds its register_changes the first time they're used, so
+    LazyGadgetList can prioritize results without analyzing them
+    """
+
+    def __init__(self, instructions):
+        list.__init__(self, instructions)
+        self.jump_register = self[-2].operands[0]
+        self._register_changes = None
+
+    @property
+    def register_changes(self):
+        if self._register_changes is None:
+            # _store_register_changes() fills in the dict returned here
+            self._register_changes = {}
+            self._store_register_changes()
+        return self._register_changes
+
+
+class _Descending(object):
+    """Wraps a sort key so it orders in reverse, for LazyGadgetList's min heap"""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
 
 
 class GadgetType(object):
 
     search_pattern = None  # must specify in subclass
     reverse_search_results = False
+    # if True, rop_gadgets is a LazyGadgetList that only analyzes gadgets as they're used (see: search())
+    lazy = False
+    # if True, search results with the same instructions become a single Gadget (see: search())
+    dedupe = False
 
     def __init__(self, *args, **kwargs):
-        self.rop_gadgets = []
-        self.search()
+        """
+        lazy -- optional keyword argument overriding GadgetType.lazy for this instance
+        dedupe -- optional keyword argument overriding GadgetType.dedupe for this instance
+        """
+        # gadgets are searched for the first time rop_gadgets is used unless populate() fills them in first
+        self._rop_gadgets = None
+        if 'lazy' in kwargs:
+            self.lazy = kwargs['lazy']
+        if 'dedupe' in kwargs:
+            self.dedupe = kwargs['dedupe']
+
+    @property
+    def rop_gadgets(self):
+        """List of Gadgets matching this type in priority order, searched for on first use"""
+        if self._rop_gadgets is None:
+            self._rop_gadgets = []
+            self.search()
+        return self._rop_gadgets
+
+    @rop_gadgets.setter
+    def rop_gadgets(self, rop_gadgets):
+        self._rop_gadgets = rop_gadgets
 
-    def search(self):
+    @staticmethod
+    def populate(gadget_types):
+        """Searches for the gadgets of every GadgetType in gadget_types that hasn't searched yet in a single pass over
+        the jump blocks (see: objdump_handler.search_many())
+
+        Types without a search_query() (ex: ones that override search() with their own logic) are left to search
+        on their own when their rop_gadgets are first used.
+
+        gadget_types -- list of GadgetType objects, ex: a rop.Builder pipeline
+        """
+        pending = [gadget_type for gadget_type in gadget_types
+                   if gadget_type._rop_gadgets is None and gadget_type.search_query() is not None]
+        all_results = objdump_handler.search_many([gadget_type.search_query() for gadget_type in pending])
+        for gadget_type, results in zip(pending, all_results):
+            gadget_type.search(results)
+
+    def search_query(self):
+        """Returns the (pattern, disallowed_registers, desired_jump_register) arguments for objdump_handler.search()
+        whose results search() turns into gadgets, or None if this type doesn't search with a single query
+        """
+        if self.search_pattern is None:
+            return None
+        return self.search_pattern, None, None
+
+    def search(self, results=None):
         """Finds all instruction sequences in objdump_handler that match self.search_pattern and contain
         controllable jumps and stores them as Gadget objects in self.rop_gadgets and orders them by self.prioritize()
+
+        The sorted Gadgets are kept in the loaded binary's objdump_handler.SearchRegistry, so other instances of the
+        same class with the same query share them instead of searching again.
+
+        If self.lazy is True, self.rop_gadgets is a LazyGadgetList instead, so only the results the builder actually
+        uses are turned into Gadgets. self.prioritize() is then given the InstructionSequence results themselves.
+
+        If self.dedupe is True, results with the same instructions (see: equivalence_key()) are analyzed and ranked
+        once: only the first becomes a Gadget, with the others in its equivalents, so rop.Builder tries each distinct
+        gadget once and any of its occurrences can be used in the rop sequence (see: choose_occurrences()).
+
+        results -- optional results of objdump_handler.search() for self.search_query() if they've already been found
         """
-        results = objdump_handler.search(self.search_pattern)
-        for result in results:
-            gadget = Gadget(result, self.__class__)
-            if gadget.has_controllable_jump:
-                self.rop_gadgets.append(gadget)
+        query = self.search_query()
+        registry = objdump_handler.get_search_registry()
+        key = (self.__class__, self.reverse_search_results, objdump_handler.search_query_key(*query))
+        if self.dedupe:
+            key += ('dedupe',)
 
-        self.rop_gadgets = sorted(self.rop_gadgets, key=self.prioritize, reverse=self.reverse_search_results)
+        if self.lazy:
+            def build_lazy_gadgets():
+                query_results = results if results is not None else objdump_handler.search(*query)
+                return LazyGadgetList(query_results, self.__class__, self.prioritize, self.reverse_search_results,
+                                      self.dedupe)
+
+            # the list only grows as gadgets are used, so it's shared by every instance with the same query
+            self.rop_gadgets = registry.derive(key + ('lazy',), build_lazy_gadgets)
+            return self.rop_gadgets
+
+        def build_gadgets():
+            if self.dedupe:
+                # reuse the gadgets if they've already been analyzed for an instance that doesn't dedupe them, ex:
+                # the ControllableJump that CallToSleep is built from
+                analyzed = registry.derived.get(key[:-1])
+                if analyzed is not None:
+                    return _dedupe_gadgets(analyzed)
+            query_results = results if results is not None else objdump_handler.search(*query)
+            rop_gadgets = []
+            with instrumentation.timer('gadgets.construct'):
+                if self.dedupe:
+                    groups = group_equivalent_results(query_results)
+                else:
+                    groups = [[result] for result in query_results]
+                for group in groups:
+                    gadget = Gadget(group[0], self.__class__)
+                    if gadget.has_controllable_jump:
+                        gadget.equivalents = _equivalent_sequences(group[1:], gadget)
+                        rop_gadgets.append(gadget)
+            instrumentation.count('gadgets_constructed', len(groups))
+            with instrumentation.timer('gadgets.sort'):
+                return sorted(rop_gadgets, key=self.prioritize, reverse=self.reverse_search_results)
+
+        # each instance gets its own list so changing it doesn't affect the others
+        self.rop_gadgets = list(registry.derive(key, build_gadgets))
         return self.rop_gadgets
 
     def is_compatible(self, gadget, previous_gadget, fresh_registers):
         """Returns True if gadget is compatible with previous_gadget and fresh_registers.
         For gadget to be compatible, its dependent_registers must all be contained in fresh_registers
+        and it must be compatible with previous_gadget (see: is_pair_compatible())
 
         gadget -- the Gadget object being checked for compatibility
         previous_gadget -- the Gadget object coming prior to gadget
-        fresh_registers -- list of register names that are available for use by gadget
+        fresh_registers -- register mask (see: utils.register_mask) of the registers available for use by gadget,
+                           or an iterable of register names as before masks were introduced
         """
-        return gadget.dependent_registers <= fresh_registers
+        if not isinstance(fresh_registers, (int, long)):
+            fresh_registers = utils.register_mask(fresh_registers, ignore_unknown=True)
+        return self.is_register_compatible(gadget, fresh_registers) and self.is_pair_compatible(gadget, previous_gadget)
+
+    def is_register_compatible(self, gadget, fresh_registers):
+        """Returns True if all of gadget's dependent_registers are contained in fresh_registers
+
+        gadget -- the Gadget object being checked for compatibility
+        fresh_registers -- register mask (see: utils.register_mask) of the registers available for use by gadget
+        """
+        return not gadget.dependent_mask & ~fresh_registers
+
+    def is_pair_compatible(self, gadget, previous_gadget):
+        """Returns True if gadget can follow previous_gadget regardless of which registers are fresh.
+        Any gadget can follow any other by default.
+
+        Unlike is_register_compatible(), the result only depends on the two gadgets, so rop.Builder precomputes it
+        (see: CompatibilityGraph)
+        """
+        return True
+
+    def compatibility_key(self, previous_gadget):
+        """Returns a hashable summary of everything about previous_gadget that is_compatible() depends on, used by
+        rop.Builder to recognise search states it has already seen and to share precomputed compatible gadgets
+        between previous gadgets.
+
+        GadgetType.is_compatible() doesn't look at previous_gadget so it returns None. Subclasses whose is_compatible()
+        or is_pair_compatible() does should override this as well, otherwise previous_gadget's identity is used,
+        which is always safe.
+        """
+        if _is_overridden(self, 'is_compatible', GadgetType) or _is_overridden(self, 'is_pair_compatible', GadgetType):
+            return id(previous_gadget)
+        return None
 
     @classmethod
     def prioritize(cls, gadget):
         """By default, rop_gadgets is prioritized its length in descending order
         so that gadgets with the fewest side effects come first.
         """
-        return len(gadget)
\ No newline at end of file
+        return len(gadget)
+
+
+def _is_overridden(obj, method_name, base_class):
+    """Returns True if obj's class overrides base_class's method_name"""
+    method = getattr(type(obj), method_name)
+    return getattr(method, '__func__', method) is not getattr(base_class, method_name).__func__
+
+
+def equivalence_key(instructions):
+    """Returns a hashable description of a list of Instructions that doesn't depend on where they are, so the same
+    gadget at different addresses has the same key. Branch and jump targets are absolute, so gadgets containing them
+    only have the same key if they go to the same place.
+    """
+    # operand tuples are shared between identical instructions (see: Instruction.OPERANDS_CACHE)
+    return tuple([(instruction.operator, instruction.operands) for instruction in instructions])
+
+
+def group_equivalent_results(results):
+    """Returns lists of the results that have the same instructions (see: equivalence_key()), each in the order of
+    results, ordered by their first result's position in results
+    """
+    groups = collections.OrderedDict()
+    for result in results:
+        groups.setdefault(equivalence_key(result), []).append(result)
+    return groups.values()
+
+
+def _dedupe_gadgets(gadgets):
+    """Returns a copy of the first of each group of gadgets with the same instructions, in the order of gadgets, with
+    the others as its equivalents. Equivalent gadgets have the same priority, so this is the same as grouping the
+    search results before analyzing and sorting them.
+    """
+    deduped = []
+    for group in group_equivalent_results(gadgets):
+        # gadgets is shared with the instances that don't dedupe, their gadgets keep no equivalents
+        gadget = Gadget.__new__(Gadget)
+        list.__init__(gadget, group[0])
+        gadget.__dict__.update(group[0].__dict__)
+        gadget.equivalents = group[1:]
+        deduped.append(gadget)
+    return deduped
+
+
+def _equivalent_sequences(results, gadget):
+    """Returns results as InstructionSequences sharing gadget's register changes, since their instructions are the
+    same, rather than analyzing each of them again
+    """
+    return [objdump_handler.InstructionSequence(result, gadget.register_changes) for result in results]
+
+
+def choose_occurrences(rop_sequence, accept):
+    """Returns a list with the first of each gadget's occurrences (see: Gadget.occurrences) in rop_sequence that
+    accept returns True for, or None if none of a gadget's occurrences are accepted
+
+    rop_sequence -- list of Gadgets, ex: rop.Builder.rop_sequence
+    accept -- function taking an InstructionSequence and returning True if it can be used
+    """
+    chosen = []
+    for gadget in rop_sequence:
+        for occurrence in gadget.occurrences:
+            if accept(occurrence):
+                chosen.append(occurrence)
+                break
+        else:
+            return None
+    return chosen
+
+
+def has_bad_bytes(address, bad_bytes):
+    """Returns True if any of the 4 bytes of address is in bad_bytes
+
+    address -- integer address, ex: a gadget's first instruction's address
+    bad_bytes -- collection of integers from 0 to 255 that can't be part of the payload, ex: set([0x00, 0x0a])
+    """
+    return any((address >> shift) & 0xff in bad_bytes for shift in (0, 8, 16, 24))
+
+
+def avoid_bad_bytes(rop_sequence, bad_bytes):
+    """Returns a list with an occurrence of each gadget in rop_sequence whose address doesn't contain any of
+    bad_bytes (see: choose_occurrences() and has_bad_bytes()), or None if a gadget only has occurrences that do
+    """
+    return choose_occurrences(rop_sequence, lambda occurrence: not has_bad_bytes(occurrence[0].address, bad_bytes))
@@ -0,0 +1,285 @@
+"""Keeps parsed binaries in memory and answers search and rop.Builder requests from clients over a UNIX socket
+
+The protocol is JSON Lines: the client sends one request object per line and the server answers each one with zero
+or more item lines followed by a final line with "ok" set.
+
+    {"command": "search", "file": PATH, "pattern": PATTERN, "jump_register": REG, "disallowed_registers": PATTERN,
+     "limit": N, "expr": BOOL}
+        -> {"gadget": GADGET} per gadget, then {"ok": true, "count": N}
+    {"command": "build", "file": PATH, "pipeline": [GADGET_TYPE, ...], "ensure_compatible": BOOL,
+     "max_sequences": N, "time_budget": SECONDS}
+        -> {"sequence": [GADGET, ...]} per rop sequence, then {"ok": true, "count": N, "stop_reason": REASON}
+    {"command": "load", "file": PATH}
+        -> {"ok": true, "functions": N, "jump_blocks": N}
+    {"command": "binaries"}
+        -> {"ok": true, "binaries": [PATH, ...]}
+
+GADGET is utils.instruction_sequence_to_dict() of the gadget. Binaries are loaded the first time a request names
+them, and kept for later requests. With "expr" set, PATTERN is a query.parse() expression. Searches stop at
+"limit" gadgets. Failures are answered with {"ok": false, "error": MESSAGE}.
+"""
+import itertools
+import json
+import os
+import socket
+import SocketServer
+import threading
+import batch
+import loader
+import objdump_handler
+import query
+import rop
+import utils
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser('~'), '.mipsropsearch', 'server.sock')
+
+
+class RequestError(Exception):
+    """Raised for requests the server can't answer, the message is sent back to the client"""
+    pass
+
+
+class Corpus(object):
+    """A loaded binary: the objdump_handler state for it, and the caches built on that state, kept so it can be put
+    back in place for each request while several binaries are loaded
+    """
+
+    def __init__(self, file_path, use_index=False, index_dir=None, workers=1):
+        """Loads file_path (see: loader.load_file())"""
+        self.file_path = file_path
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.functions = loader.load_file(file_path, use_index, index_dir, workers)
+        self.jump_blocks = objdump_handler.ALL_JUMP_BLOCKS
+        self.instruction_index = None
+        self.search_registry = None
+
+    def activate(self):
+        """Makes this binary the one searched by objdump_handler"""
+        objdump_handler.OBJDUMP_FUNCTIONS = self.functions
+        objdump_handler.ALL_JUMP_BLOCKS = self.jump_blocks
+        objdump_handler.INSTRUCTION_INDEX = self.instruction_index
+        objdump_handler.SEARCH_REGISTRY = self.search_registry
+
+    def deactivate(self):
+        """Keeps the caches objdump_handler built for this binary while it was active"""
+        self.instruction_index = objdump_handler.INSTRUCTION_INDEX
+        self.search_registry = objdump_handler.SEARCH_REGISTRY
+
+
+class QueryServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Serves each client in its own thread. objdump_handler's state is global, so requests themselves are answered
+    one at a time, but their responses are written to the clients outside of self.lock so a client that's slow to
+    read doesn't hold up the others.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, use_index=False, index_dir=None, workers=1):
+        """
+        socket_path -- path of the UNIX socket to listen on, replaced if it already exists
+        use_index, index_dir, workers -- how binaries are loaded (see: loader.load_file())
+        """
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        socket_dir = os.path.dirname(socket_path)
+        if socket_dir and not os.path.isdir(socket_dir):
+            os.makedirs(socket_dir)
+        SocketServer.UnixStreamServer.__init__(self, socket_path, QueryHandler)
+        self.use_index = use_index
+        self.index_dir = index_dir
+        self.workers = workers
+        self.corpora = {}
+        self.lock = threading.Lock()
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+    def corpus(self, file_path):
+        """Returns the Corpus for file_path, loading it first if it hasn't been. Must be called with self.lock held."""
+        if not file_path:
+            raise RequestError("'file' is required")
+        key = os.path.realpath(file_path)
+        corpus = self.corpora.get(key)
+        if corpus is None:
+            try:
+                corpus = Corpus(key, self.use_index, self.index_dir, self.workers)
+            except Exception as e:
+                raise RequestError("Couldn't load %s: %s" % (file_path, e))
+            corpus.deactivate()
+            self.corpora[key] = corpus
+        return corpus
+
+    def handle_request_object(self, request):
+        """Answers request, a decoded request object. Returns the list of item objects to send followed by the final
+        response object.
+        """
+        command = request.get('command')
+        with self.lock:
+            if command == 'binaries':
+                return [], {'ok': True, 'binaries': sorted(self.corpora)}
+
+            corpus = self.corpus(request.get('file'))
+            corpus.activate()
+            try:
+                if command == 'load':
+                    return [], {'ok': True, 'functions': len(corpus.functions), 'jump_blocks': len(corpus.jump_blocks)}
+                elif command == 'search':
+                    return self._search(request)
+                elif command == 'build':
+                    return self._build(request)
+                raise RequestError("Unknown command: %s" % command)
+            finally:
+                corpus.deactivate()
+
+    def _search(self, request):
+        if not request.get('pattern'):
+            raise RequestError("'pattern' is required")
+        disallowed_registers = request.get('disallowed_registers')
+        if disallowed_registers:
+            disallowed_registers = utils.build_register_list_from_pattern(disallowed_registers)
+        limit = request.get('limit')
+
+        # JSON strings are unicode, patterns are compiled from (and interned as) byte strings
+        pattern = str(request['pattern'])
+        if request.get('expr'):
+            try:
+                block_results = query.evaluate(pattern, disallowed_registers,
+                                               request.get('jump_register')).iter_results()
+            except query.QueryError as e:
+                raise RequestError(str(e))
+            results = (result for block_id, result in block_results)
+        elif limit is None:
+            # the whole list, kept in the search registry for later requests
+            results = objdump_handler.search(pattern, disallowed_registers, request.get('jump_register'))
+        else:
+            # searched lazily so it stops once there are enough
+            results = (result for block_id, result in objdump_handler.iter_search(
+                pattern, disallowed_registers, request.get('jump_register')))
+        items = [{'gadget': utils.instruction_sequence_to_dict(result)}
+                 for result in itertools.islice(results, limit)]
+        return items, {'ok': True, 'count': len(items)}
+
+    def _build(self, request):
+        try:
+            pipeline = batch.build_pipeline(request.get('pipeline') or [], request.get('ensure_compatible', False))
+        except ValueError as e:
+            raise RequestError(str(e))
+        if not pipeline:
+            raise RequestError("'pipeline' is required")
+
+        builder = rop.Builder(pipeline)
+        try:
+            items = [{'sequence': [utils.instruction_sequence_to_dict(gadget) for gadget in sequence]}
+                     for sequence in builder.iter_sequences(request.get('max_sequences', 1),
+                                                            request.get('time_budget'))]
+        except rop.NoGadgetsError as e:
+            raise RequestError(str(e))
+        return items, {'ok': True, 'count': len(items), 'stop_reason': builder.stats.stop_reason}
+
+
+class QueryHandler(SocketServer.StreamRequestHandler):
+    """Reads request lines from one client until it disconnects"""
+
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise RequestError("Requests must be JSON objects")
+                items, response = self.server.handle_request_object(request)
+            except (ValueError, RequestError) as e:
+                items, response = [], {'ok': False, 'error': str(e)}
+            except Exception as e:
+                # ex: a malformed search pattern, the connection stays usable for the next request
+                items, response = [], {'ok': False, 'error': "%s: %s" % (e.__class__.__name__, e)}
+            try:
+                for item in items:
+                    self.send(item)
+                self.send(response)
+            except socket.error:
+                # the client went away in the middle of a response
+                return
+
+    def finish(self):
+        try:
+            SocketServer.StreamRequestHandler.finish(self)
+        except socket.error:
+            # the client went away without reading everything
+            pass
+
+    def send(self, response):
+        self.wfile.write(json.dumps(response, sort_keys=True) + "\n")
+        self.wfile.flush()
+
+
+class Client(object):
+    """Connection to a QueryServer"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH):
+        """
+        :raises socket.error: if no server is listening on socket_path
+        """
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+        self.file = self.socket.makefile('rwb')
+        # the final response of the last request
+        self.last_response = None
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def request(self, request):
+        """Generator that sends request and yields each item the server answers with
+
+        :raises RequestError: if the server couldn't answer the request
+        """
+        self.file.write(json.dumps(request) + "\n")
+        self.file.flush()
+        for line in iter(self.file.readline, ''):
+            response = json.loads(line)
+            if 'ok' not in response:
+                yield response
+            elif response['ok']:
+                self.last_response = response
+                return
+            else:
+                raise RequestError(response['error'])
+        raise RequestError("Connection closed by server")
+
+    def search(self, file_path, pattern, jump_register=None, disallowed_registers=None, limit=None, expr=False):
+        """Generator yielding each gadget dict (see: utils.instruction_sequence_to_dict()) matching the search
+
+        disallowed_registers -- register list pattern, ex: 'a0,s*,t4-t8'
+        expr -- whether pattern is a query expression, see: query.parse()
+        """
+        request = {'command': 'search', 'file': os.path.abspath(file_path), 'pattern': pattern,
+                   'jump_register': jump_register, 'disallowed_registers': disallowed_registers, 'limit': limit,
+                   'expr': expr}
+        for response in self.request(request):
+            yield response['gadget']
+
+    def build(self, file_path, pipeline, ensure_compatible=False, max_sequences=1, time_budget=None):
+        """Generator yielding each rop sequence, as a list of gadget dicts, built from pipeline (names of gadget_types
+        classes)
+        """
+        request = {'command': 'build', 'file': os.path.abspath(file_path), 'pipeline': pipeline,
+                   'ensure_compatible': ensure_compatible, 'max_sequences': max_sequences,
+                   'time_budget': time_budget}
+        for response in self.request(request):
+            yield response['sequence']
+
+    def load(self, file_path):
+        """Loads file_path on the server if it isn't already and returns the server's response"""
+        for response in self.request({'command': 'load', 'file': os.path.abspath(file_path)}):
+            pass
+        return self.last_response
+
+    def binaries(self):
+        """Returns the paths of the binaries loaded on the server"""
+        for response in self.request({'command': 'binaries'}):
+            pass
+        return self.last_response['binaries']
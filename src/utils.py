@@ -23,6 +23,77 @@ def build_register_list_from_pattern(register_list_pattern):
     return register_list
 
 
+# o32 names of the 32 general purpose registers, their index in this list is their number and their bit in a register
+# mask. Other names (ex: floating point registers or 's9' from an 's*' pattern) have no bit
+REGISTER_NAMES = (
+    'zero', 'at', 'v0', 'v1', 'a0', 'a1', 'a2', 'a3',
+    't0', 't1', 't2', 't3', 't4', 't5', 't6', 't7',
+    's0', 's1', 's2', 's3', 's4', 's5', 's6', 's7',
+    't8', 't9', 'k0', 'k1', 'gp', 'sp', 's8', 'ra'
+)
+REGISTER_IDS = dict((name, register_id) for register_id, name in enumerate(REGISTER_NAMES))
+
+# register list pattern -> register mask, see build_register_mask_from_pattern()
+_register_mask_patterns = {}
+
+
+def register_id(register):
+    """Returns the bit number used for register in register masks
+
+    :raises ValueError: if register isn't the name of a general purpose register
+    """
+    try:
+        return REGISTER_IDS[register]
+    except KeyError:
+        raise ValueError("unknown register: %r" % (register,))
+
+
+def register_bit(register):
+    """Returns the mask with only register's bit set, or 0 if register isn't the name of a general purpose register"""
+    bit = REGISTER_IDS.get(register)
+    if bit is None:
+        return 0
+    return 1 << bit
+
+
+def register_mask(registers, ignore_unknown=False):
+    """Returns the integer mask with the bit of each register name in registers set
+
+    ignore_unknown -- if True, names that aren't general purpose registers are skipped instead of raising ValueError
+    """
+    mask = 0
+    for register in registers:
+        if ignore_unknown:
+            mask |= register_bit(register)
+        else:
+            mask |= 1 << register_id(register)
+    return mask
+
+
+def register_names(mask):
+    """Returns the list of register names whose bits are set in mask, in register number order"""
+    names = []
+    bit = 0
+    while mask:
+        if mask & 1:
+            names.append(REGISTER_NAMES[bit])
+        mask >>= 1
+        bit += 1
+    return names
+
+
+def build_register_mask_from_pattern(register_list_pattern):
+    """Same as build_register_list_from_pattern() but returns the register mask of the expanded names, caching the
+    result for each pattern. Expanded names that aren't general purpose registers (ex: 's9' from 's*') are skipped
+    """
+    mask = _register_mask_patterns.get(register_list_pattern)
+    if mask is None:
+        mask = _register_mask_patterns[register_list_pattern] = register_mask(
+            build_register_list_from_pattern(register_list_pattern), ignore_unknown=True
+        )
+    return mask
+
+
 def print_list(l, depth=0, last_was_list=False):
     """Recursively prints contents of lists of lists"""
     if isinstance(l, list):
@@ -31,4 +102,17 @@ def print_list(l, depth=0, last_was_list=False):
         if last_was_list:
             print ""
     else:
-        print "%s%s" % ("\t"*depth, l)
\ No newline at end of file
+        print "%s%s" % ("\t"*depth, l)
+
+
+def instruction_sequence_to_dict(instructions):
+    """Returns a JSON serializable dict describing a search result or gadget (a list of Instructions ending with a
+    jump and its branch delay slot)
+    """
+    return {
+        'offsets': [instruction.offset for instruction in instructions],
+        'jump_register': instructions[-2].operands[0],
+        'instructions': [
+            ("%s %s" % (instruction.operator, ",".join(instruction.operands))).rstrip() for instruction in instructions
+        ]
+    }
@@ -0,0 +1,155 @@
+"""Optional search engine that stores every jump block instruction as parallel NumPy arrays (struct of arrays)
+
+Pattern matching and the "destination register isn't changed later in the block" check run as vectorized masks over
+all blocks at once. Only blocks with a hit are turned back into InstructionSequence results, using the same
+InstructionSequence.search() logic as objdump_handler.search(), so results are identical.
+
+Requires numpy, which is not needed by the rest of the package.
+"""
+import objdump_handler
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the VectorCorpus for objdump_handler.ALL_JUMP_BLOCKS, see get_corpus()
+CORPUS = None
+
+
+def get_corpus():
+    """Returns the VectorCorpus for objdump_handler.ALL_JUMP_BLOCKS, rebuilding it if the blocks have changed"""
+    global CORPUS
+    if (
+        CORPUS is None or
+        CORPUS.blocks is not objdump_handler.ALL_JUMP_BLOCKS or
+        CORPUS.block_count != len(objdump_handler.ALL_JUMP_BLOCKS)
+    ):
+        CORPUS = VectorCorpus(objdump_handler.ALL_JUMP_BLOCKS)
+    return CORPUS
+
+
+def search(pattern, disallowed_registers=None, desired_jump_register=None):
+    """Same as objdump_handler.search() but matches with NumPy masks over objdump_handler.ALL_JUMP_BLOCKS"""
+    return get_corpus().search(pattern, disallowed_registers, desired_jump_register)
+
+
+class VectorCorpus(object):
+    """Parallel arrays with one entry per instruction of every jump block
+
+    operator -- string id of the operator
+    destination -- string id of the first operand (the destination register for changing operators)
+    sources -- 2D array of string ids of the remaining operands, -1 where an instruction has fewer operands
+    operand_count -- number of operands
+    block -- id (index in blocks) of the jump block the instruction belongs to
+    index -- the instruction's index within its block
+    last_write -- index in the block where the destination register was last changed (register_changes), -1 if never
+    """
+
+    def __init__(self, blocks):
+        """
+        blocks -- list of InstructionSequence objects, normally objdump_handler.ALL_JUMP_BLOCKS
+
+        :raises ImportError: if numpy isn't installed
+        """
+        if numpy is None:
+            raise ImportError("vector_search requires numpy")
+
+        self.blocks = blocks
+        self.block_count = len(blocks)
+        self.string_ids = {}
+        self.strings = []
+
+        operators, destinations, sources, operand_counts = [], [], [], []
+        block_ids, indexes, last_writes, jump_registers = [], [], [], []
+        for block_id, block in enumerate(blocks):
+            jump_registers.append(self._string_id(block.jump_register))
+            for index, instruction in enumerate(block):
+                operands = instruction.operands
+                operators.append(self._string_id(instruction.operator))
+                destinations.append(self._string_id(operands[0]))
+                sources.append([self._string_id(operand) for operand in operands[1:]])
+                operand_counts.append(len(operands))
+                block_ids.append(block_id)
+                indexes.append(index)
+                last_writes.append(block.register_changes.get(operands[0], -1))
+
+        source_width = max([len(operand_ids) for operand_ids in sources] or [0])
+        self.sources = numpy.full((len(sources), max(source_width, 1)), -1, dtype=numpy.int32)
+        for row, operand_ids in enumerate(sources):
+            self.sources[row, :len(operand_ids)] = operand_ids
+
+        self.operator = numpy.array(operators, dtype=numpy.int32)
+        self.destination = numpy.array(destinations, dtype=numpy.int32)
+        self.operand_count = numpy.array(operand_counts, dtype=numpy.int32)
+        self.block = numpy.array(block_ids, dtype=numpy.int32)
+        self.index = numpy.array(indexes, dtype=numpy.int32)
+        self.last_write = numpy.array(last_writes, dtype=numpy.int32)
+        self.block_jump_register = numpy.array(jump_registers, dtype=numpy.int32)
+
+    def _string_id(self, string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def _operand_predicate(self, desired_operand):
+        """Returns a boolean array indexed by string id (plus a trailing False for padding ids of -1) that's True
+        where desired_operand is a substring of the string, the same test as Instruction.check_other_operands_match
+        """
+        return numpy.array([desired_operand in string for string in self.strings] + [False], dtype=bool)
+
+    def match_mask(self, pattern, desired_jump_register=None):
+        """Returns a boolean array that's True for every instruction matching pattern the way
+        InstructionSequence.instruction_matches() does, in blocks jumping to desired_jump_register if given
+
+        pattern -- string in the 'search pattern' format or search criteria tuple
+        """
+        desired_operator, desired_first_operand_registers, desired_operands = \
+            objdump_handler.InstructionSequence.get_search_criteria(pattern)
+
+        operator_id = self.string_ids.get(desired_operator)
+        register_ids = [self.string_ids[register] for register in desired_first_operand_registers
+                        if register in self.string_ids]
+        # operands (immediates included) are matched as substrings like objdump_handler does, through the string ids
+        if operator_id is None or not register_ids or len(desired_operands) - 1 > self.sources.shape[1]:
+            # no instruction has that operator, destination or that many operands
+            return numpy.zeros(len(self.operator), dtype=bool)
+
+        mask = (self.operator == operator_id) & numpy.in1d(self.destination, register_ids)
+        # the destination register can't be changed again later in the block
+        mask &= self.last_write <= self.index
+        mask &= self.operand_count >= len(desired_operands)
+        for operand_index in xrange(1, len(desired_operands)):
+            column = self.sources[:, operand_index - 1]
+            mask &= self._operand_predicate(desired_operands[operand_index])[column]
+
+        if desired_jump_register:
+            jump_register_id = self.string_ids.get(desired_jump_register)
+            if jump_register_id is None:
+                return numpy.zeros(len(self.operator), dtype=bool)
+            mask &= self.block_jump_register[self.block] == jump_register_id
+
+        return mask
+
+    def iter_search(self, pattern, disallowed_registers=None, desired_jump_register=None):
+        """Generator yielding (block id, matching subsequence) like objdump_handler.iter_search()"""
+        pattern = objdump_handler.InstructionSequence.get_search_criteria(pattern)
+        hits = numpy.nonzero(self.match_mask(pattern, desired_jump_register))[0]
+        if not len(hits):
+            return
+
+        # hits are in block order, so split them wherever the block id changes
+        hit_blocks = self.block[hits]
+        boundaries = numpy.nonzero(numpy.diff(hit_blocks))[0] + 1
+        for block_hits in numpy.split(hits, boundaries):
+            block_id = int(self.block[block_hits[0]])
+            result = self.blocks[block_id].search(pattern, disallowed_registers, desired_jump_register,
+                                                  self.index[block_hits].tolist())
+            if result:
+                yield block_id, result
+
+    def search(self, pattern, disallowed_registers=None, desired_jump_register=None):
+        """Returns the list of matching subsequences like objdump_handler.search()"""
+        return [result for block_id, result in self.iter_search(pattern, disallowed_registers, desired_jump_register)]
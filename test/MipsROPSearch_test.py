@@ -0,0 +1,118 @@
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import StringIO
+import utils
+from src import MipsROPSearch, instrumentation, objdump_handler, query
+from src import utils as src_utils
+
+
+class CommandLineTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.directory = tempfile.mkdtemp()
+        self.objdump_path = os.path.join(self.directory, "sample.objdump")
+        f = open(self.objdump_path, 'w')
+        f.writelines(utils.create_objdump_lines(12))
+        f.close()
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        shutil.rmtree(self.directory)
+
+    def _run(self, *argv):
+        original_argv, original_stdout = sys.argv, sys.stdout
+        sys.argv = ["MipsROPSearch.py"] + list(argv)
+        sys.stdout = StringIO.StringIO()
+        try:
+            MipsROPSearch.main()
+            return sys.stdout.getvalue()
+        finally:
+            sys.argv, sys.stdout = original_argv, original_stdout
+
+    def _expected_results(self, *search_args):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.parse_objdump_output_file(self.objdump_path)
+        return objdump_handler.search(*search_args)
+
+    def test_text_output_same_as_print_list(self):
+        output = self._run(self.objdump_path, "move **", "t9")
+        expected = StringIO.StringIO()
+        original_stdout, sys.stdout = sys.stdout, expected
+        try:
+            src_utils.print_list(self._expected_results("move **", None, "t9"))
+        finally:
+            sys.stdout = original_stdout
+        self.assertEqual(output, expected.getvalue())
+
+    def test_limit(self):
+        output = self._run(self.objdump_path, "lw s*", "--top", "2", "--format", "jsonl")
+        self.assertEqual(len(output.splitlines()), 2)
+
+    def test_jsonl_output(self):
+        for options in [[], ["--workers", "2"]]:
+            objdump_handler.ALL_JUMP_BLOCKS = []
+            output = self._run(self.objdump_path, "li a0", "t9", "--format", "jsonl", *options)
+            gadgets = [json.loads(line) for line in output.splitlines()]
+            expected = self._expected_results("li a0", None, "t9")
+            self.assertEqual(len(gadgets), len(expected))
+            self.assertEqual(gadgets[0]["jump_register"], "t9")
+            self.assertEqual(gadgets[0]["offsets"], [instruction.offset for instruction in expected[0]])
+            self.assertEqual(gadgets[0]["instructions"], ["move t9,s1", "li a0,1", "jalr t9", "move a1,s0"])
+
+    def test_stats(self):
+        original_stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            output = self._run(self.objdump_path, "move **", "t9", "--stats")
+            report = sys.stderr.getvalue()
+        finally:
+            sys.stderr = original_stderr
+            instrumentation.disable()
+        # the report doesn't change the results
+        self.assertEqual(output, self._run(self.objdump_path, "move **", "t9"))
+        counts = dict(line.split() for line in report.splitlines()[report.splitlines().index(
+            "%-36s %12s" % ("counter", "count")) + 1:])
+        self.assertEqual(int(counts['functions_parsed']), 12)
+        self.assertEqual(int(counts['search_matches']), len(self._expected_results("move **", None, "t9")))
+
+    def test_compressed_input(self):
+        expected = self._run(self.objdump_path, "lw s*", "--format", "jsonl")
+        gzip_path = self.objdump_path + ".gz"
+        f = gzip.open(gzip_path, 'wb')
+        f.writelines(utils.create_objdump_lines(12))
+        f.close()
+        for options in [[], ["--workers", "2"]]:
+            objdump_handler.ALL_JUMP_BLOCKS = []
+            self.assertEqual(self._run(gzip_path, "lw s*", "--format", "jsonl", *options), expected)
+
+        f = open(gzip_path, 'rb')
+        original_stdin, sys.stdin = sys.stdin, f
+        try:
+            self.assertEqual(self._run("-", "lw s*", "--format", "jsonl"), expected)
+        finally:
+            sys.stdin = original_stdin
+            f.close()
+
+    def test_expression(self):
+        expression = "'move t9' and not 'li a0'"
+        objdump_handler.parse_objdump_output_file(self.objdump_path)
+        expected = [src_utils.instruction_sequence_to_dict(result)
+                    for result in query.evaluate(expression, ["a1"], "t9").results()]
+        self.assertTrue(expected)
+        for options in [[], ["--workers", "2"]]:
+            objdump_handler.ALL_JUMP_BLOCKS = []
+            output = self._run(self.objdump_path, expression, "t9", "a1", "--expr", "--format", "jsonl", *options)
+            self.assertEqual([json.loads(line) for line in output.splitlines()], expected)
+
+        original_stderr, sys.stderr = sys.stderr, StringIO.StringIO()
+        try:
+            self.assertRaises(SystemExit, self._run, self.objdump_path, "'move t9' and", "--expr")
+            self.assertIn("Unexpected end of expression", sys.stderr.getvalue())
+        finally:
+            sys.stderr = original_stderr
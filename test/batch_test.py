@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+import utils
+from src import batch, objdump_handler
+
+
+class BatchTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.directory = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.directory, "dumps")
+        os.makedirs(os.path.join(self.input_dir, "nested"))
+        self.file_paths = []
+        for name, function_count in [("first.objdump", 12), (os.path.join("nested", "second.objdump"), 6)]:
+            file_path = os.path.join(self.input_dir, name)
+            f = open(file_path, 'w')
+            f.writelines(utils.create_objdump_lines(function_count))
+            f.close()
+            self.file_paths.append(file_path)
+        self.output_dir = os.path.join(self.directory, "reports")
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        shutil.rmtree(self.directory)
+
+    def test_find_binaries(self):
+        self.assertEqual(batch.find_binaries([self.input_dir]), sorted(self.file_paths))
+        self.assertEqual(batch.find_binaries([os.path.join(self.input_dir, "*.objdump")]), [self.file_paths[0]])
+
+    def test_build_pipeline(self):
+        pipeline = batch.build_pipeline(["StackLocator", "ControllableJump"], ensure_compatible=True)
+        self.assertTrue(pipeline[1].ensure_compatible)
+        self.assertRaises(ValueError, batch.build_pipeline, ["InstructionSequence"])
+
+    def test_reports_written(self):
+        job = batch.BatchJob(patterns=["move **", ("li a0", None, "t9")], pipeline=["StackLocator"])
+        for workers in [1, 2]:
+            progress = StringIO.StringIO()
+            aggregate = batch.run_batch(self.file_paths, job, self.output_dir, workers, progress)
+            self.assertEqual(len(progress.getvalue().splitlines()), 2)
+            self.assertEqual(aggregate['failed'], 0)
+            self.assertEqual([summary['file'] for summary in aggregate['binaries']], sorted(self.file_paths))
+
+            for summary, function_count in zip(aggregate['binaries'], [12, 6]):
+                f = open(os.path.join(self.output_dir, summary['report']))
+                report = json.load(f)
+                f.close()
+                objdump_handler.ALL_JUMP_BLOCKS = []
+                objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(function_count))
+                self.assertEqual(report['functions'], function_count)
+                self.assertEqual(
+                    [len(search['gadgets']) for search in report['searches']],
+                    [len(objdump_handler.search("move **")), len(objdump_handler.search("li a0", None, "t9"))]
+                )
+                self.assertEqual(summary['sequences'], 1)
+            self.assertTrue(os.path.exists(os.path.join(self.output_dir, batch.REPORT_FILE_NAME)))
+
+    def test_failure_recorded(self):
+        missing_path = os.path.join(self.directory, "missing.objdump")
+        aggregate = batch.run_batch([missing_path] + self.file_paths, batch.BatchJob(patterns=["move **"]),
+                                    self.output_dir, 1, None)
+        self.assertEqual(aggregate['failed'], 1)
+        errors = dict((summary['file'], summary['error']) for summary in aggregate['binaries'])
+        self.assertIn("IOError", errors[missing_path])
+        self.assertIsNone(errors[self.file_paths[0]])
+
+    def test_build_and_unexpected_failures(self):
+        # the synthetic binaries have no call to sleep
+        report = batch.scan_binary(self.file_paths[0], batch.BatchJob(pipeline=["CallToSleep"]))
+        self.assertIsNone(report['error'])
+        self.assertEqual(report['sequences'], [])
+        self.assertIn("No gadgets found for type: CallToSleep", report['build_stop_reason'])
+
+        # a bug rather than a bad binary keeps its traceback
+        report = batch.scan_binary(self.file_paths[0], batch.BatchJob(patterns=[5]))
+        self.assertIn("TypeError", report['error'])
+        self.assertIn("Traceback", report['traceback'])
+        self.assertNotIn('traceback', batch.scan_binary(self.directory, batch.BatchJob()))
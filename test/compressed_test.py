@@ -0,0 +1,125 @@
+import bz2
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+import StringIO
+import utils
+from src import compressed, loader, objdump_handler
+
+
+def _xz_command_available():
+    try:
+        subprocess.Popen(['xz', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+    except OSError:
+        return False
+    return True
+
+
+class CompressedInputTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.directory = tempfile.mkdtemp()
+        self.lines = utils.create_objdump_lines(40)
+        self.text = "".join(self.lines)
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, data):
+        file_path = os.path.join(self.directory, name)
+        f = open(file_path, 'wb')
+        f.write(data)
+        f.close()
+        return file_path
+
+    def _gzip(self, text):
+        data = StringIO.StringIO()
+        f = gzip.GzipFile(fileobj=data, mode='wb')
+        f.write(text)
+        f.close()
+        return data.getvalue()
+
+    def _xz(self, text):
+        if compressed.lzma is not None:
+            return compressed.lzma.compress(text)
+        process = subprocess.Popen(['xz', '--compress', '--stdout'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return process.communicate(text)[0]
+
+    def _compressed_files(self):
+        files = [("gzip", self._write("dump.gz", self._gzip(self.text))),
+                 ("bzip2", self._write("dump.bz2", bz2.compress(self.text)))]
+        if compressed.lzma is not None or _xz_command_available():
+            files.append(("xz", self._write("dump.xz", self._xz(self.text))))
+        return files
+
+    def _read_lines(self, file_path, chunk_size=compressed.CHUNK_SIZE):
+        original_chunk_size, compressed.CHUNK_SIZE = compressed.CHUNK_SIZE, chunk_size
+        lines = compressed.open_lines(file_path)
+        try:
+            return list(lines)
+        finally:
+            lines.close()
+            compressed.CHUNK_SIZE = original_chunk_size
+
+    def test_detect_compression(self):
+        for compression, file_path in self._compressed_files():
+            f = open(file_path, 'rb')
+            self.assertEqual(compressed.detect_compression(f.read(compressed.MAGIC_LENGTH)), compression)
+            f.close()
+        self.assertIsNone(compressed.detect_compression(self.text))
+        self.assertIsNone(compressed.detect_compression(""))
+
+    def test_same_lines(self):
+        plain_path = self._write("dump.objdump", self.text)
+        self.assertIsInstance(compressed.open_lines(plain_path), file)
+        self.assertEqual(self._read_lines(plain_path), self.lines)
+        for compression, file_path in self._compressed_files():
+            # small chunks so lines are split between them
+            for chunk_size in [compressed.CHUNK_SIZE, 7]:
+                self.assertEqual(self._read_lines(file_path, chunk_size), self.lines, compression)
+
+    def test_concatenated_streams(self):
+        for data in [self._gzip(self.text) + self._gzip(self.text), bz2.compress(self.text) * 2]:
+            file_path = self._write("double", data)
+            for chunk_size in [compressed.CHUNK_SIZE, 5]:
+                self.assertEqual(self._read_lines(file_path, chunk_size), self.lines * 2)
+
+    def test_no_trailing_newline(self):
+        file_path = self._write("dump.gz", self._gzip("first\nlast"))
+        self.assertEqual(self._read_lines(file_path), ["first\n", "last"])
+
+    def test_truncated_and_corrupt_input(self):
+        data = bz2.compress(self.text)
+        for bad_data in [data[:len(data) // 2], self._gzip(self.text)[:-10],
+                         data[:20] + "\xff" * 40 + data[60:]]:
+            file_path = self._write("bad", bad_data)
+            self.assertRaises(compressed.DecompressionError, self._read_lines, file_path)
+
+    def test_stream(self):
+        for data in [self.text, self._gzip(self.text), bz2.compress(self.text)]:
+            lines = compressed.open_stream_lines(StringIO.StringIO(data))
+            self.assertEqual(list(lines), self.lines)
+            lines.close()
+
+    def test_close_before_end(self):
+        file_path = self._write("dump.gz", self._gzip(self.text * 50))
+        lines = compressed.open_lines(file_path)
+        iterator = iter(lines)
+        self.assertEqual(next(iterator), self.lines[0])
+        lines.close()
+        self.assertTrue(lines.compressed_file.closed)
+
+    def test_loaders_parse_compressed_files(self):
+        plain_path = self._write("dump.objdump", self.text)
+        expected = [repr(function.instructions) for function in objdump_handler.parse_objdump_output_file(plain_path)]
+        for compression, file_path in self._compressed_files():
+            objdump_handler.ALL_JUMP_BLOCKS = []
+            functions = objdump_handler.parse_objdump_output_file(file_path)
+            self.assertEqual([repr(function.instructions) for function in functions], expected)
+            functions = list(loader.iter_functions_from_file(file_path))
+            self.assertEqual([repr(function.instructions) for function in functions], expected)
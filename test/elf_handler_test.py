@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+import utils
+from src import elf_handler, mips_decoder, objdump_handler
+
+
+class DecoderTests(unittest.TestCase):
+
+    def assertDecodes(self, word, expected, address=0x400000):
+        mnemonic, operands = mips_decoder.decode(word, address)
+        self.assertEqual(("%s %s" % (mnemonic, operands)).strip(), expected)
+
+    def test_loads_and_stores(self):
+        self.assertDecodes(0x8fbf001c, "lw ra,28(sp)")
+        self.assertDecodes(0xafb0fff8, "sw s0,-8(sp)")
+
+    def test_immediates(self):
+        self.assertDecodes(0x27bdffe0, "addiu sp,sp,-32")
+        self.assertDecodes(0x3c1c0005, "lui gp,0x5")
+        self.assertDecodes(0x308400ff, "andi a0,a0,0xff")
+
+    def test_pseudo_instructions(self):
+        self.assertDecodes(0x00000000, "nop")
+        self.assertDecodes(0x02002021, "move a0,s0")
+        self.assertDecodes(0x24040001, "li a0,1")
+        self.assertDecodes(0x34048000, "li a0,0x8000")
+        self.assertDecodes(0x00021023, "negu v0,v0")
+
+    def test_jumps(self):
+        self.assertDecodes(0x03e00008, "jr ra")
+        self.assertDecodes(0x0320f809, "jalr t9")
+        self.assertDecodes(0x0c100010, "jal 400040")
+
+    def test_branches(self):
+        self.assertDecodes(0x10400003, "beqz v0,400010")
+        self.assertDecodes(0x1000ffff, "b 400000")
+        self.assertDecodes(0x04110002, "bal 40000c")
+
+    def test_unknown_word(self):
+        self.assertDecodes(0xfc000000, "0xfc000000")
+
+
+class ElfParseTests(unittest.TestCase):
+
+    WORDS = [
+        0x27bdffe0,  # addiu sp,sp,-32
+        0x8fbf001c,  # lw ra,28(sp)
+        0x03e00008,  # jr ra
+        0x27bd0020,  # addiu sp,sp,32
+        0x0320c821,  # move t9,t9
+        0x02002021,  # move a0,s0
+        0x0320f809,  # jalr t9
+        0x24050001,  # li a1,1
+        0x00000000,  # nop
+    ]
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.paths = []
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        for path in self.paths:
+            os.remove(path)
+
+    def _write_elf(self, big_endian):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, utils.build_mips_elf(self.WORDS, [("first", 0x400000), ("second", 0x400010)],
+                                          big_endian=big_endian))
+        os.close(fd)
+        self.paths.append(path)
+        return path
+
+    def _check_functions(self, functions):
+        self.assertEqual([(fxn.name, fxn.start) for fxn in functions], [("first", "00400000"), ("second", "00400010")])
+        self.assertEqual(repr(functions[0].instructions[1]), "400004: lw ra,28(sp)")
+        self.assertEqual(functions[0].instructions[1].raw, "8fbf001c")
+        self.assertEqual([len(fxn.jump_blocks) for fxn in functions], [1, 1])
+        self.assertEqual(functions[1].jump_blocks[0].jump_register, "t9")
+
+    def test_big_endian(self):
+        path = self._write_elf(True)
+        self.assertTrue(elf_handler.is_elf_file(path))
+        self._check_functions(elf_handler.parse_elf_file(path))
+
+    def test_little_endian(self):
+        self._check_functions(elf_handler.parse_elf_file(self._write_elf(False)))
+
+    def test_matches_objdump_text_search(self):
+        elf_handler.parse_elf_file(self._write_elf(True))
+        result = objdump_handler.search("lw ra,sp", None, "ra")
+        self.assertEqual([repr(inst) for inst in result[0]],
+                         ["400004: lw ra,28(sp)", "400008: jr ra", "40000c: addiu sp,sp,32"])
+
+    def test_not_elf_raises(self):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, "not an elf file")
+        os.close(fd)
+        self.paths.append(path)
+        self.assertFalse(elf_handler.is_elf_file(path))
+        self.assertRaises(elf_handler.ElfError, elf_handler.parse_elf_file, path)
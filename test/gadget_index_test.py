@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+import utils
+from src import gadget_index, loader, objdump_handler
+
+
+class GadgetIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.directory = tempfile.mkdtemp()
+        self.objdump_path = os.path.join(self.directory, "sample.objdump")
+        f = open(self.objdump_path, 'w')
+        f.writelines(utils.SAMPLE_OBJDUMP_LINES)
+        f.close()
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        shutil.rmtree(self.directory)
+
+    def _write_and_load(self):
+        functions = objdump_handler.parse_objdump_output_file(self.objdump_path)
+        index_path = os.path.join(self.directory, "sample.idx")
+        gadget_index.write_index(index_path, functions)
+        return functions, gadget_index.GadgetIndex(index_path)
+
+    def test_round_trip_functions(self):
+        functions, index = self._write_and_load()
+        self.assertEqual(len(index.functions), len(functions))
+        for original, loaded in zip(functions, index.functions):
+            self.assertEqual((loaded.start, loaded.name), (original.start, original.name))
+            self.assertEqual([repr(inst) for inst in loaded.instructions],
+                             [repr(inst) for inst in original.instructions])
+            self.assertEqual([inst.raw for inst in loaded.instructions], [inst.raw for inst in original.instructions])
+
+    def test_round_trip_jump_blocks(self):
+        functions, index = self._write_and_load()
+        original_blocks = objdump_handler.ALL_JUMP_BLOCKS
+        self.assertEqual(len(index.jump_blocks), len(original_blocks))
+        for original, loaded in zip(original_blocks, index.jump_blocks):
+            self.assertEqual([repr(inst) for inst in loaded], [repr(inst) for inst in original])
+            self.assertEqual(loaded.register_changes, original.register_changes)
+            self.assertEqual(loaded.jump_register, original.jump_register)
+
+    def test_blocks_share_function_instructions(self):
+        functions, index = self._write_and_load()
+        self.assertIs(index.jump_blocks[1][0], index.functions[1].instructions[0])
+        self.assertIs(index.functions[1].jump_blocks[0], index.jump_blocks[1])
+
+    def test_installed_index_is_searchable(self):
+        functions, index = self._write_and_load()
+        expected = [repr(inst) for inst in objdump_handler.search("lw ra,sp")[0]]
+        index.install()
+        self.assertEqual([repr(inst) for inst in objdump_handler.search("lw ra,sp")[0]], expected)
+
+    def test_load_file_builds_then_reuses_index(self):
+        index_dir = os.path.join(self.directory, "index")
+        functions = loader.load_file(self.objdump_path, True, index_dir)
+        self.assertIsInstance(functions, list)
+        self.assertTrue(os.path.exists(gadget_index.index_path_for(self.objdump_path, index_dir)))
+
+        functions = loader.load_file(self.objdump_path, True, index_dir)
+        self.assertNotIsInstance(functions, list)
+        self.assertEqual([fxn.name for fxn in functions], ["first", "second"])
+
+    def test_bad_index_raises(self):
+        index_path = os.path.join(self.directory, "bad.idx")
+        f = open(index_path, 'wb')
+        f.write("not an index")
+        f.close()
+        self.assertRaises(gadget_index.IndexFormatError, gadget_index.GadgetIndex, index_path)
+
+    def test_stored_instruction_index(self):
+        functions, index = self._write_and_load()
+        expected = objdump_handler.get_instruction_index().postings
+        index.install()
+        instruction_index = objdump_handler.get_instruction_index()
+        self.assertEqual(dict((key, (list(block_ids), list(indexes)))
+                              for key, (block_ids, indexes) in instruction_index.postings.iteritems()),
+                         dict((key, (list(block_ids), list(indexes)))
+                              for key, (block_ids, indexes) in expected.iteritems()))
+        # only the candidate blocks of the search are created
+        self.assertEqual(len(objdump_handler.search("lw ra,sp")), 1)
+        self.assertEqual(sum(block is not None for block in index._blocks), 1)
+
+    def test_install_reads_lazily(self):
+        functions, index = self._write_and_load()
+        index.install()
+        postings = objdump_handler.get_instruction_index().postings
+        self.assertFalse(index._columns.get('posting_block'))
+        self.assertEqual(dict.__len__(postings), 0)
+        self.assertIn(('lw', 'ra'), postings)
+        self.assertNotIn(('lw', 'zz'), postings)
+        decoded_count = sum(string is not None for string in index._strings)
+        self.assertLess(decoded_count, len(index._strings))
+
+        self.assertEqual(len(objdump_handler.search("lw ra,sp")), 1)
+        self.assertEqual(dict.keys(postings), [('lw', 'ra')])
+
+    def test_parse_after_installed_index(self):
+        index_dir = os.path.join(self.directory, "index")
+        for repeat in xrange(2):
+            loader.load_file(self.objdump_path, True, index_dir)
+        installed_count = len(objdump_handler.ALL_JUMP_BLOCKS)
+        functions = list(loader.iter_functions_from_file(self.objdump_path))
+        self.assertEqual(len(objdump_handler.ALL_JUMP_BLOCKS), 2 * installed_count)
+        self.assertIs(objdump_handler.ALL_JUMP_BLOCKS[installed_count], functions[0].jump_blocks[0])
+        self.assertEqual(len(objdump_handler.search("lw ra,sp")), 2)
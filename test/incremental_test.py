@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+import utils
+from src import gadget_index, incremental, loader, objdump_handler
+
+
+def create_dump_lines(functions):
+    """Returns objdump lines for functions, a list of (name, list of instructions), laid out one after another"""
+    lines = ["\n", "Disassembly of section .text:\n", "\n"]
+    offset = 0x1000
+    for name, instructions in functions:
+        lines.append("%08x <%s>:\n" % (offset, name))
+        for instruction in instructions:
+            operator, _, operands = instruction.partition(" ")
+            # the raw word only has to identify the instruction text
+            raw = hash(instruction) & 0xffffffff
+            lines.append("    %x:\t%08x \t%s\t%s\n" % (offset, raw, operator, operands % {'here': offset}))
+            offset += 4
+        lines.append("\n")
+    return lines
+
+
+UNCHANGED = ("unchanged", ["lw ra,28(sp)", "lw s0,24(sp)", "jr ra", "addiu sp,sp,32"])
+MOVED = ("moved", ["move t9,s1", "jalr t9", "nop", "beqz v0,%(here)x <moved+0xc>", "nop", "lw s1,20(sp)", "jr ra",
+                   "nop"])
+CHANGED_BEFORE = ("changed", ["move t9,s2", "jalr t9", "nop"])
+CHANGED_AFTER = ("changed", ["move t9,s3", "jalr t9", "nop"])
+REMOVED = ("removed", ["lw s2,16(sp)", "jr ra", "nop"])
+ADDED = ("added", ["li a0,1", "move a1,s0", "jr ra", "nop"])
+
+
+class IncrementalTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.directory = tempfile.mkdtemp()
+        self.previous_path = self._write("previous.objdump", [UNCHANGED, REMOVED, MOVED, CHANGED_BEFORE])
+        self.new_path = self._write("new.objdump", [UNCHANGED, ADDED, MOVED, CHANGED_AFTER])
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, functions):
+        path = os.path.join(self.directory, name)
+        f = open(path, 'w')
+        f.writelines(create_dump_lines(functions))
+        f.close()
+        return path
+
+    def test_functions_compared(self):
+        update = loader.load_file_incrementally(self.new_path, self.previous_path, self.directory)
+        self.assertEqual(update.unchanged, ["unchanged"])
+        self.assertEqual(update.moved, ["moved"])
+        self.assertEqual(update.changed, ["changed"])
+        self.assertEqual(update.added, ["added"])
+        self.assertEqual(update.removed, ["removed"])
+
+    def test_gadget_diff(self):
+        update = loader.load_file_incrementally(self.new_path, self.previous_path, self.directory)
+        self.assertEqual([(name, [repr(inst) for inst in block]) for name, block in update.added_gadgets],
+                         [("added", ["1010: li a0,1", "1014: move a1,s0", "1018: jr ra", "101c: nop "]),
+                          ("changed", ["1040: move t9,s3", "1044: jalr t9", "1048: nop "])])
+        self.assertEqual([name for name, block in update.removed_gadgets], ["changed", "removed"])
+
+    def test_same_as_full_parse(self):
+        loader.load_file_incrementally(self.new_path, self.previous_path, self.directory)
+        incremental_functions = objdump_handler.OBJDUMP_FUNCTIONS
+        incremental_blocks = objdump_handler.ALL_JUMP_BLOCKS
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        functions = objdump_handler.parse_objdump_output_file(self.new_path)
+
+        self.assertEqual([(function.start, function.name) for function in incremental_functions],
+                         [(function.start, function.name) for function in functions])
+        for incremental_function, function in zip(incremental_functions, functions):
+            self.assertEqual([(repr(inst), inst.raw) for inst in incremental_function.instructions],
+                             [(repr(inst), inst.raw) for inst in function.instructions])
+        self.assertEqual([[repr(inst) for inst in block] for block in incremental_blocks],
+                         [[repr(inst) for inst in block] for block in objdump_handler.ALL_JUMP_BLOCKS])
+        self.assertEqual([block.register_changes for block in incremental_blocks],
+                         [block.register_changes for block in objdump_handler.ALL_JUMP_BLOCKS])
+
+    def test_new_index_written(self):
+        loader.load_file_incrementally(self.new_path, self.previous_path, self.directory)
+        index = gadget_index.GadgetIndex(gadget_index.index_path_for(self.new_path, self.directory))
+        self.assertEqual([function.name for function in index.functions],
+                         ["unchanged", "added", "moved", "changed"])
+        index.close()
+
+    def test_function_hash_ignores_address(self):
+        self.assertEqual(incremental.function_hash([1, 2, 3]), incremental.function_hash((1, 2, 3)))
+        self.assertNotEqual(incremental.function_hash([1, 2, 3]), incremental.function_hash([1, 2, 4]))
@@ -0,0 +1,75 @@
+import unittest
+import utils
+from src import instrumentation, objdump_handler, rop, gadget_types
+
+
+class InstrumentationTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.STATS.reset()
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def test_disabled_records_nothing(self):
+        instrumentation.STATS.reset()
+        with instrumentation.timer('parse'):
+            instrumentation.count('lines_read', 10)
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(6))
+        objdump_handler.search("lw s*")
+        self.assertEqual(instrumentation.STATS.as_dict(), {'times': {}, 'counts': {}})
+
+    def test_parse_counts(self):
+        instrumentation.enable()
+        lines = utils.create_objdump_lines(6)
+        functions = objdump_handler.extract_functions_from_objdump_lines(lines)
+        counts = instrumentation.STATS.counts
+        self.assertEqual(counts['lines_read'], len(lines))
+        self.assertEqual(counts['functions_parsed'], 6)
+        self.assertEqual(counts['instructions_parsed'], sum(len(function.instructions) for function in functions))
+        self.assertEqual(counts['jump_blocks_extracted'], len(objdump_handler.ALL_JUMP_BLOCKS))
+        times = instrumentation.STATS.times
+        for phase in ['parse', 'parse.read', 'parse.scan_lines', 'parse.instructions', 'parse.jump_blocks']:
+            self.assertIn(phase, times)
+        self.assertGreaterEqual(times['parse'], times['parse.instructions'])
+
+    def test_search_counts(self):
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(12))
+        instrumentation.enable()
+        results = objdump_handler.search_many(["lw s*", "move **", "lw s*"])
+        objdump_handler.search("move **")
+        counts = instrumentation.STATS.counts
+        self.assertEqual(counts['searches'], 2)
+        self.assertEqual(counts['search_cache_hits'], 2)
+        self.assertEqual(counts['search_matches'], len(results[0]) + len(results[1]))
+        self.assertGreaterEqual(counts['blocks_scanned'], counts['search_matches'])
+        self.assertIn('instruction_index', instrumentation.STATS.times)
+
+    def test_builder_counts(self):
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(12))
+        instrumentation.enable()
+        builder = rop.Builder([gadget_types.StackLocator(), gadget_types.ControllableJump()])
+        builder.run_many(3)
+        counts = instrumentation.STATS.counts
+        self.assertEqual(counts['builder_nodes_expanded'], builder.stats.nodes_expanded)
+        self.assertEqual(counts['compatibility_checks'], builder.stats.compatibility_checks)
+        self.assertEqual(counts['gadgets_constructed'], len(objdump_handler.search("addiu **,sp")) +
+                         len(objdump_handler.search("move **")))
+        for phase in ['build.populate', 'build.search', 'gadgets.construct', 'gadgets.sort', 'search']:
+            self.assertIn(phase, instrumentation.STATS.times)
+
+    def test_report(self):
+        stats = instrumentation.Stats()
+        stats.add_time('parse.read', 0.25)
+        stats.add_time('parse.instructions', 0.5)
+        stats.add_time('search', 1.0)
+        stats.add_time('search', 1.0)
+        stats.count('lines_read', 7)
+        report = stats.report().splitlines()
+        # parse only has sub-phases so it's shown as their total
+        self.assertEqual(report[1].split(), ['parse', '0.7500'])
+        self.assertEqual(report[2].split(), ['parse.instructions', '0.5000'])
+        self.assertEqual(report[4].split(), ['search', '2.0000'])
+        self.assertEqual(report[-1].split(), ['lines_read', '7'])
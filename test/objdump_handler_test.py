@@ -1,6 +1,6 @@
 import unittest
 import utils
-from src import objdump_handler
+from src import instrumentation, objdump_handler
 
 
 class FunctionTests(unittest.TestCase):
@@ -28,6 +28,296 @@ class FunctionTests(unittest.TestCase):
         self.assertEqual(len(fxn.jump_blocks), 2)
 
 
+class InstructionTests(unittest.TestCase):
+
+    def test_fields_stored_as_integers(self):
+        instruction = objdump_handler.Instruction("  400a20:\t8fbf001c \tlw\tra,28(sp)")
+        self.assertEqual((instruction.address, instruction.raw_word), (0x400a20, 0x8fbf001c))
+        self.assertEqual((instruction.offset, instruction.raw), ("400a20", "8fbf001c"))
+        self.assertEqual(repr(instruction), "400a20: lw ra,28(sp)")
+
+    def test_no_instance_dict(self):
+        instruction = objdump_handler.Instruction("  400a20:\t8fbf001c \tlw\tra,28(sp)")
+        self.assertFalse(hasattr(instruction, '__dict__'))
+
+    def test_equal_operands_are_shared(self):
+        first = objdump_handler.Instruction("  400a20:\t8fbf001c \tlw\tra,28(sp)")
+        second = objdump_handler.Instruction("  400b20:\t8fbf001c \tlw\tra,28(sp)")
+        self.assertIs(first.operands, second.operands)
+        self.assertEqual(first.operands, ("ra", "28(sp)"))
+
+
+class TokenizerTests(unittest.TestCase):
+
+    def _regex_fields(self, line):
+        """The fields the original regex based parsing got from line"""
+        if not objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN.match(line):
+            return None
+        offset, raw, operator, operands = objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN.findall(line)[0]
+        return int(offset, 16), int(raw, 16), operator, operands
+
+    def test_same_fields_as_regex(self):
+        lines = utils.OBJDUMP_LINE_CORPUS + utils.SAMPLE_OBJDUMP_LINES + utils.create_objdump_lines(3)
+        for line in lines:
+            self.assertEqual(objdump_handler.tokenize_instruction_line(line), self._regex_fields(line), repr(line))
+            # lines read with io.open() are unicode
+            self.assertEqual(objdump_handler.tokenize_instruction_line(unicode(line)), self._regex_fields(line),
+                             repr(line))
+
+    def test_usual_layout_skips_regex(self):
+        class NoRegex(object):
+            def match(self, line):
+                raise AssertionError("regex used for %r" % line)
+
+        original = objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN
+        objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN = NoRegex()
+        try:
+            self.assertEqual(objdump_handler.tokenize_instruction_line("  405a44:\t8f998018 \tlw\tt9,-32744(gp)\n"),
+                             (0x405a44, 0x8f998018, 'lw', 't9,-32744(gp)'))
+            self.assertEqual(objdump_handler.tokenize_instruction_line("  405a6c:\t00000000 \tnop\n"),
+                             (0x405a6c, 0, 'nop', ''))
+            line = "  405a54:\t1040000b \tbeqz\tv0,405a84 <main+0x34>"
+            self.assertEqual(objdump_handler.tokenize_instruction_line(line),
+                             (0x405a54, 0x1040000b, 'beqz', 'v0,405a84 <main+0x34>'))
+        finally:
+            objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN = original
+
+    def test_same_functions_as_regex(self):
+        # the corpus' function followed by the blank line ending it and the section header ending .text
+        lines = (utils.OBJDUMP_LINE_CORPUS[:3] + utils.create_objdump_lines(4)[3:] + utils.OBJDUMP_LINE_CORPUS[3:-1] +
+                 ["\n"] + utils.OBJDUMP_LINE_CORPUS[-1:])
+        expected = []
+        for line in lines:
+            # the original line classification
+            if line.startswith("Disassembly of section") and expected:
+                break
+            if objdump_handler.Function.FIRST_LINE_PATTERN.match(line):
+                expected.append((line, []))
+            elif objdump_handler.Instruction.INSTRUCTION_LINE_PATTERN.match(line) and expected:
+                expected[-1][1].append(self._regex_fields(line))
+        self.assertEqual(list(objdump_handler.iter_function_fields_from_objdump_lines(lines)), expected)
+        self.assertEqual([instruction_lines for first_line, instruction_lines in
+                          objdump_handler.iter_function_lines_from_objdump_lines(lines)][-1],
+                         [line for line in utils.OBJDUMP_LINE_CORPUS[4:-1] if self._regex_fields(line)])
+
+    def test_instruction_rejects_other_lines(self):
+        self.assertRaises(ValueError, objdump_handler.Instruction, "00405a30 <__start>:\n")
+
+
+class StreamingParseTests(unittest.TestCase):
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def test_only_text_section_functions_yielded(self):
+        functions = list(objdump_handler.iter_functions_from_objdump_lines(iter(utils.SAMPLE_OBJDUMP_LINES)))
+        self.assertEqual([fxn.name for fxn in functions], ["first", "second"])
+
+    def test_instruction_lines_without_function_skipped(self):
+        # before any section header, right after the .text header and between two functions
+        lines = list(utils.SAMPLE_OBJDUMP_LINES)
+        lines.insert(lines.index("00002010 <second>:\n"), "    200c:\t00000000 \tnop\n")
+        lines.insert(lines.index("Disassembly of section .text:\n") + 1, "    1ffc:\t00000000 \tnop\n")
+        lines[:0] = ["    1000:\t8fbf0010 \tlw\tra,16(sp)\n", "\n"]
+        for function_parts in [objdump_handler.iter_function_lines_from_objdump_lines(lines),
+                               objdump_handler.iter_function_fields_from_objdump_lines(lines)]:
+            self.assertEqual([len(instructions) for first_line, instructions in function_parts], [4, 4])
+        functions = list(objdump_handler.iter_functions_from_objdump_lines(lines))
+        self.assertEqual([fxn.name for fxn in functions], ["first", "second"])
+
+    def test_functions_yielded_before_input_exhausted(self):
+        lines = iter(utils.SAMPLE_OBJDUMP_LINES)
+        first_function = next(objdump_handler.iter_functions_from_objdump_lines(lines))
+        self.assertEqual(first_function.name, "first")
+        self.assertEqual(len(first_function.jump_blocks), 1)
+        # the generator stops reading at the blank line ending "first"
+        self.assertEqual(next(lines), "00002010 <second>:\n")
+
+    def test_jump_blocks_yielded_in_order(self):
+        jump_blocks = list(objdump_handler.iter_jump_blocks_from_objdump_lines(utils.SAMPLE_OBJDUMP_LINES))
+        self.assertEqual([block[-2].operator for block in jump_blocks], ["jalr", "jr"])
+        self.assertEqual(len(objdump_handler.ALL_JUMP_BLOCKS), 2)
+
+    def test_stream_without_accumulating(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        # with and without instrumentation, which parses through another function
+        for enable in [False, True]:
+            if enable:
+                instrumentation.enable()
+            try:
+                jump_blocks = list(objdump_handler.iter_jump_blocks_from_objdump_lines(utils.SAMPLE_OBJDUMP_LINES,
+                                                                                       accumulate=False))
+            finally:
+                instrumentation.disable()
+            self.assertEqual(len(jump_blocks), 2)
+            self.assertEqual(objdump_handler.ALL_JUMP_BLOCKS, [])
+
+    def test_extract_matches_streaming_parse(self):
+        functions = objdump_handler.extract_functions_from_objdump_lines(iter(utils.SAMPLE_OBJDUMP_LINES))
+        self.assertEqual(objdump_handler.OBJDUMP_FUNCTIONS, functions)
+        self.assertEqual(len(functions), 2)
+
+
+class ParallelParseTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.chunk_lines = objdump_handler.PARALLEL_CHUNK_LINES
+        objdump_handler.PARALLEL_CHUNK_LINES = 25
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.PARALLEL_CHUNK_LINES = self.chunk_lines
+
+    def _parse(self, lines, workers):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        functions = objdump_handler.extract_functions_from_objdump_lines(iter(lines), workers)
+        return (
+            [(fxn.start, fxn.name, [repr(inst) for inst in fxn.instructions]) for fxn in functions],
+            [[repr(inst) for inst in block] for block in objdump_handler.ALL_JUMP_BLOCKS],
+            [block.register_changes for block in objdump_handler.ALL_JUMP_BLOCKS]
+        )
+
+    def test_parallel_matches_serial(self):
+        lines = utils.create_objdump_lines(40)
+        self.assertEqual(self._parse(lines, 3), self._parse(lines, 1))
+
+    def test_parallel_handles_sections(self):
+        self.assertEqual(self._parse(utils.SAMPLE_OBJDUMP_LINES, 2), self._parse(utils.SAMPLE_OBJDUMP_LINES, 1))
+
+    def test_jump_blocks_shared_with_functions(self):
+        functions = objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(10), 2)
+        self.assertIs(objdump_handler.ALL_JUMP_BLOCKS[0], functions[0].jump_blocks[0])
+        self.assertIs(functions[0].jump_blocks[0][0], functions[0].instructions[0])
+
+
+class InstructionIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        utils.create_function_from_string_list([
+            "lw s0,24(sp)",
+            "lw s1,28(sp)",
+            "jr ra",
+            "addiu sp,sp,32",
+            "li a0,1",
+            "move t9,s0",
+            "jalr t9",
+            "lw s1,32(sp)",
+            "nop"
+        ])
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def test_candidates_for_single_register(self):
+        index = objdump_handler.get_instruction_index()
+        self.assertEqual(index.candidates("li", ["a0"]), [(1, [0])])
+        self.assertEqual(index.candidates("li", ["a1"]), [])
+
+    def test_candidates_for_wildcard_are_union(self):
+        index = objdump_handler.get_instruction_index()
+        self.assertEqual(index.candidates("lw", ["s0", "s1", "s2"]), [(0, [0, 1]), (1, [3])])
+
+    def test_index_rebuilt_when_blocks_replaced(self):
+        objdump_handler.get_instruction_index()
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.assertEqual(objdump_handler.get_instruction_index().candidates("li", ["a0"]), [])
+
+    def test_search_matches_full_scan(self):
+        for pattern in ["lw s*,sp", "li a0", "move **", "addiu sp,sp"]:
+            full_scan = [block.search(pattern) for block in objdump_handler.ALL_JUMP_BLOCKS]
+            self.assertEqual(objdump_handler.search(pattern), [result for result in full_scan if result])
+
+
+class SearchManyTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(12))
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def test_matches_individual_searches(self):
+        queries = [("lw s*,sp", None, None), ("move **", ["a1"], "t9"), "li a0", ("move **", None, None), "lw gp"]
+        # iter_search() doesn't go through the SearchRegistry
+        expected = [[result for block_id, result in objdump_handler.iter_search(*query)] if isinstance(query, tuple)
+                    else [result for block_id, result in objdump_handler.iter_search(query)]
+                    for query in queries]
+        self.assertEqual(objdump_handler.search_many(queries), expected)
+
+    def test_duplicate_queries_get_separate_lists(self):
+        first, second = objdump_handler.search_many(["li a0", "li a0"])
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+
+
+class SearchRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(12))
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def test_results_searched_once(self):
+        objdump_handler.search("lw s*,sp")
+        registry = objdump_handler.get_search_registry()
+        key = objdump_handler.search_query_key("lw s*,sp")
+        self.assertIn(key, registry.results)
+        # results come from the registry from now on
+        registry.results[key] = ["cached"]
+        self.assertEqual(objdump_handler.search("lw s*,sp"), ["cached"])
+        self.assertEqual(objdump_handler.search_many([("lw s*,sp", [], "")]), [["cached"]])
+
+    def test_new_binary_starts_new_registry(self):
+        registry = objdump_handler.get_search_registry()
+        self.assertIs(objdump_handler.get_search_registry(), registry)
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(3))
+        self.assertIsNot(objdump_handler.get_search_registry(), registry)
+
+    def test_derive_builds_once(self):
+        registry = objdump_handler.get_search_registry()
+        built = []
+        for i in xrange(2):
+            registry.derive("key", lambda: built.append(i) or ["value"])
+        self.assertEqual(built, [0])
+
+
+class SearchPatternTests(unittest.TestCase):
+
+    def test_compiled_pattern(self):
+        pattern = objdump_handler.compile_search_pattern("lw s*,sp")
+        self.assertEqual(pattern.operator, "lw")
+        self.assertEqual(pattern.first_operand_registers, frozenset("s%d" % i for i in xrange(10)))
+        self.assertEqual(pattern.operands, ("s*", "sp"))
+        self.assertTrue(pattern.matches(objdump_handler.Instruction("   0:\t8fb00018 \tlw\ts0,24(sp)")))
+        self.assertFalse(pattern.matches(objdump_handler.Instruction("   0:\t8fa40018 \tlw\ta0,24(sp)")))
+
+    def test_strings_compiled_once(self):
+        self.assertIs(
+            objdump_handler.compile_search_pattern("addiu **,sp"),
+            objdump_handler.InstructionSequence.get_search_criteria("addiu **,sp")
+        )
+
+    def test_criteria_tuple_accepted(self):
+        pattern = objdump_handler.compile_search_pattern(("move", ["t9"], ["t9", "s0"]))
+        self.assertEqual(pattern, objdump_handler.compile_search_pattern("move t9,s0"))
+        self.assertIs(objdump_handler.compile_search_pattern(pattern), pattern)
+
+    def test_cache_is_bounded(self):
+        cache = objdump_handler._LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(len(cache), 2)
+
+
 class InstructionSequenceSearchTests(unittest.TestCase):
 
     def test_match_on_delay_slot_includes_jump(self):
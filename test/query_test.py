@@ -0,0 +1,73 @@
+import unittest
+import utils
+from src import objdump_handler, query, rop
+
+
+class QueryTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(30))
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def _block_ids(self, *search_args):
+        return set(block_id for block_id, result in objdump_handler.iter_search(*search_args))
+
+    def test_bitmap_round_trip(self):
+        for block_ids in [[], [0], [7, 8], [3, 64, 65, 1000], range(0, 300, 3)]:
+            bitmap = query.bitmap_from_ids(block_ids)
+            self.assertEqual(bitmap, sum(1 << block_id for block_id in set(block_ids)))
+            self.assertEqual(list(query.iter_bitmap(bitmap)), sorted(set(block_ids)))
+
+    def test_set_operations(self):
+        moves, loads = query.search("move t9"), query.search("li a0")
+        move_ids, load_ids = self._block_ids("move t9"), self._block_ids("li a0")
+        self.assertTrue(move_ids & load_ids and move_ids - load_ids)
+        self.assertEqual(set(moves & loads), move_ids & load_ids)
+        self.assertEqual(set(moves | loads), move_ids | load_ids)
+        self.assertEqual(set(moves - loads), move_ids - load_ids)
+        self.assertEqual(len(moves & loads), len(move_ids & load_ids))
+        self.assertEqual(list(moves), sorted(move_ids))
+
+    def test_single_search_same_as_objdump_handler(self):
+        for search_args in [("lw s*,sp", None, None), ("move **", ["a1"], "t9"), ("li a0", None, "t9")]:
+            expected = [repr(result) for result in objdump_handler.search(*search_args)]
+            actual = [repr(result) for result in query.evaluate("'%s'" % search_args[0], *search_args[1:]).results()]
+            self.assertEqual(actual, expected, search_args)
+
+    def test_predicates(self):
+        blocks = objdump_handler.ALL_JUMP_BLOCKS
+        self.assertEqual(set(query.writes(["a0", "s1"])),
+                         set(block_id for block_id, block in enumerate(blocks)
+                             if "a0" in block.register_changes or "s1" in block.register_changes))
+        self.assertEqual(set(query.jumps(["ra"])),
+                         set(block_id for block_id, block in enumerate(blocks) if block.jump_register == "ra"))
+        self.assertEqual(len(query.evaluate("jumps(ra) or not jumps(ra)")), len(blocks))
+
+    def test_expression(self):
+        expected = (self._block_ids("move t9") | self._block_ids("lw s*,sp")) - set(query.writes(["a0"]))
+        self.assertTrue(expected)
+        for expression in ["('move t9' or 'lw s*,sp') and not writes(a0)",
+                           "(\"move t9\" | 'lw s*,sp') & !writes(a0)",
+                           "not (writes(a0) or not ('move t9' or 'lw s*,sp'))"]:
+            result_set = query.evaluate(expression)
+            self.assertEqual(set(result_set), expected, expression)
+            for block_id, result in result_set.iter_results():
+                # the longest matching subsequence is returned
+                self.assertEqual(result[0].operator, "lw")
+        self.assertEqual(query.evaluate("'move t9' and not writes(a0)", None, "t9").results(), [])
+
+    def test_parse(self):
+        self.assertEqual(query.parse("'lw s0' or 'move t9' and not jumps(t9)"),
+                         ('or', ('search', 'lw s0'), ('and', ('search', 'move t9'), ('not', ('jumps', ['t9'])))))
+        for expression in ["", "'lw s0' and", "('lw s0'", "'lw s0' 'lw s1'", "reads(a0)", "writes()", "'lw s0' %",
+                           "and 'lw s0'"]:
+            self.assertRaises(query.QueryError, query.parse, expression)
+
+    def test_intersect_same_as_and(self):
+        loads, moves = objdump_handler.search("li a0"), objdump_handler.search("move t9")
+        expected = [repr(result) for result in query.evaluate("'li a0' and 'move t9'").results()]
+        self.assertTrue(expected)
+        self.assertEqual([repr(gadget) for gadget in rop.Builder.intersect(moves, loads)], expected)
@@ -1,8 +1,21 @@
+import time
 import unittest
 from src import rop, gadget_types, objdump_handler
+from src import utils as src_utils
 import utils
 
 
+class StaticGadgetType(rop.GadgetType):
+    """GadgetType whose gadgets are given instead of searched for"""
+
+    def __init__(self, gadget_instruction_lists):
+        rop.GadgetType.__init__(self)
+        self.rop_gadgets = [
+            rop.Gadget(utils.create_instruction_sequence_from_string_list(instructions), type(self))
+            for instructions in gadget_instruction_lists
+        ]
+
+
 class BuilderTests(unittest.TestCase):
 
     def test_empty_pipe_raises_exception(self):
@@ -11,4 +24,403 @@ class BuilderTests(unittest.TestCase):
                 self.rop_gadgets = []
         
         builder = rop.Builder([FakeGadgetType()])
-        self.assertRaises(Exception, builder.run)
\ No newline at end of file
+        self.assertRaises(Exception, builder.run)
+
+    def test_failed_states_skipped(self):
+        loads = StaticGadgetType([["lw s0,24(sp)", "jr ra", "nop"]] * 4)
+        moves = StaticGadgetType([["move a0,s0", "jr ra", "nop"]] * 5)
+        # depends on s5, which is never fresh, so every path fails here
+        impossible = StaticGadgetType([["move a1,s5", "jr ra", "nop"]] * 3)
+        builder = rop.Builder([loads, moves, impossible])
+        builder.run()
+        self.assertEqual(builder.rop_sequence, [])
+        # the other 4 moves after the first reach the last stage in the same state,
+        # then the other 3 loads reach the second stage in the same state
+        self.assertEqual(builder.skipped_subtrees, 4 + 3)
+        # the last stage, the second and the first each searched their subtree once without finding anything
+        self.assertEqual(builder.stats.backtracks, 3)
+        # 5 moves after the first load and 3 impossible gadgets after the first move
+        self.assertEqual(builder.stats.compatibility_checks, 5 + 3)
+
+    def test_memoized_build_finds_sequence(self):
+        loads = StaticGadgetType([["lw s1,24(sp)", "jr ra", "nop"], ["lw s0,24(sp)", "jr ra", "nop"]])
+        moves = StaticGadgetType([["move a0,s0", "jr ra", "nop"]] * 3)
+        builder = rop.Builder([loads, moves])
+        builder.run()
+        self.assertEqual([repr(gadget[0]) for gadget in builder.rop_sequence], ["0: lw s0,24(sp)", "0: move a0,s0"])
+
+    def test_previous_gadget_distinguishes_state_for_custom_compatibility(self):
+        class PickyGadgetType(StaticGadgetType):
+            def is_compatible(self, gadget, previous_gadget, fresh_registers):
+                return previous_gadget[0].operands[0] == "s1"
+
+        first = StaticGadgetType([["lw s0,24(sp)", "jr ra", "nop"], ["lw s1,24(sp)", "jr ra", "nop"]])
+        second = StaticGadgetType([["nop", "jr ra", "nop"]])
+        third = PickyGadgetType([["nop", "jr ra", "nop"]])
+        builder = rop.Builder([first, second, third])
+        builder.run()
+        self.assertEqual(len(builder.rop_sequence), 0)
+
+        second = StaticGadgetType([["lw s1,24(sp)", "jr ra", "nop"], ["lw s0,24(sp)", "jr ra", "nop"]])
+        builder = rop.Builder([first, second, third])
+        builder.run()
+        self.assertEqual(repr(builder.rop_sequence[1][0]), "0: lw s1,24(sp)")
+
+
+class KBestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = StaticGadgetType([["lw s0,24(sp)", "jr ra", "nop"], ["lw s1,24(sp)", "jr ra", "nop"]])
+        self.moves = StaticGadgetType([["move a0,s0", "jr ra", "nop"], ["move a1,s1", "jr ra", "nop"],
+                                       ["move a2,s0", "jr ra", "nop"]])
+
+    def _first_instructions(self, sequences):
+        return [[repr(gadget[0]).split(": ")[1] for gadget in sequence] for sequence in sequences]
+
+    def test_sequences_in_priority_order(self):
+        builder = rop.Builder([self.loads, self.moves])
+        sequences, stats = builder.run_many(10)
+        self.assertEqual(self._first_instructions(sequences), [
+            ["lw s0,24(sp)", "move a0,s0"],
+            ["lw s0,24(sp)", "move a2,s0"],
+            ["lw s1,24(sp)", "move a1,s1"],
+        ])
+        self.assertEqual(stats.stop_reason, rop.BuildStats.EXHAUSTED)
+        self.assertEqual(stats.sequences_found, 3)
+        self.assertEqual(builder.rop_sequences, sequences)
+
+    def test_first_sequence_matches_run(self):
+        builder = rop.Builder([self.loads, self.moves])
+        builder.run()
+        first = next(builder.iter_sequences())
+        self.assertEqual(first, builder.rop_sequence)
+
+    def test_max_count(self):
+        sequences, stats = rop.Builder([self.loads, self.moves]).run_many(2)
+        self.assertEqual(len(sequences), 2)
+        self.assertEqual(stats.stop_reason, rop.BuildStats.MAX_COUNT)
+
+    def test_node_budget_returns_partial_results(self):
+        sequences, stats = rop.Builder([self.loads, self.moves]).run_many(10, node_budget=2)
+        self.assertEqual(self._first_instructions(sequences), [
+            ["lw s0,24(sp)", "move a0,s0"],
+            ["lw s0,24(sp)", "move a2,s0"],
+        ])
+        self.assertEqual(stats.stop_reason, rop.BuildStats.NODE_BUDGET)
+        self.assertEqual(stats.nodes_expanded, 2)
+
+    def test_time_budget(self):
+        sequences, stats = rop.Builder([self.loads, self.moves]).run_many(10, time_budget=-1)
+        self.assertEqual(sequences, [])
+        self.assertEqual(stats.stop_reason, rop.BuildStats.TIME_BUDGET)
+
+    def test_time_budget_checked_between_candidates(self):
+        class SlowGadgetType(StaticGadgetType):
+            def is_compatible(self, gadget, previous_gadget, fresh_registers):
+                time.sleep(0.01)
+                return False
+
+        slow = SlowGadgetType([["move a0,s0", "jr ra", "nop"]] * 50)
+        builder = rop.Builder([self.loads, slow])
+        builder.DEADLINE_CHECK_INTERVAL = 4
+        sequences, stats = builder.run_many(10, time_budget=0.05)
+        self.assertEqual(stats.stop_reason, rop.BuildStats.TIME_BUDGET)
+        self.assertLess(stats.compatibility_checks, 50)
+
+
+class CompatibilityGraphTests(unittest.TestCase):
+
+    class PairGadgetType(StaticGadgetType):
+        """Only follows gadgets whose first instruction writes s0, checked once per previous gadget"""
+        checks = 0
+
+        def is_pair_compatible(self, gadget, previous_gadget):
+            CompatibilityGraphTests.PairGadgetType.checks += 1
+            return previous_gadget[0].operands[0] == "s0"
+
+    def setUp(self):
+        CompatibilityGraphTests.PairGadgetType.checks = 0
+
+    def test_successors_filtered_by_pair_compatibility(self):
+        first = StaticGadgetType([["lw s1,24(sp)", "jr ra", "nop"], ["lw s0,24(sp)", "jr ra", "nop"]])
+        second = self.PairGadgetType([["move a0,s0", "jr ra", "nop"]] * 2)
+        graph = rop.CompatibilityGraph([first, second])
+        self.assertEqual(list(graph.successors(1, first.rop_gadgets[0])), [])
+        self.assertEqual(list(graph.successors(1, first.rop_gadgets[1])), second.rop_gadgets)
+        # asking again uses the adjacency list built the first time
+        list(graph.successors(1, first.rop_gadgets[1]))
+        self.assertEqual(self.PairGadgetType.checks, 4)
+
+    def test_unfiltered_stage_uses_all_gadgets(self):
+        first = StaticGadgetType([["lw s0,24(sp)", "jr ra", "nop"]])
+        second = StaticGadgetType([["move a0,s0", "jr ra", "nop"]])
+        graph = rop.CompatibilityGraph([first, second])
+        self.assertIs(graph.successors(1, first.rop_gadgets[0]), second.rop_gadgets)
+
+    def test_builder_reuses_graph_between_runs(self):
+        first = StaticGadgetType([["lw s1,24(sp)", "jr ra", "nop"], ["lw s0,24(sp)", "jr ra", "nop"]])
+        second = self.PairGadgetType([["move a0,s0", "jr ra", "nop"]] * 2)
+        builder = rop.Builder([first, second])
+        builder.run()
+        self.assertEqual([repr(gadget[0]) for gadget in builder.rop_sequence], ["0: lw s0,24(sp)", "0: move a0,s0"])
+        graph = builder.compatibility_graph
+        checks = self.PairGadgetType.checks
+        builder.run()
+        self.assertIs(builder.compatibility_graph, graph)
+        self.assertEqual(self.PairGadgetType.checks, checks)
+
+        second.rop_gadgets = list(second.rop_gadgets)
+        self.assertIsNot(builder.compatibility_graph, graph)
+
+    def test_ensure_compatible_controllable_jump(self):
+        class LoadGadgetType(StaticGadgetType):
+            search_pattern = "lw s*,"
+
+        loads = LoadGadgetType([["lw s1,24(sp)", "jr ra", "nop"], ["lw s0,24(sp)", "jr ra", "nop"]])
+        jumps = gadget_types.ControllableJump(ensure_compatible=True)
+        jumps.rop_gadgets = [
+            rop.Gadget(utils.create_instruction_sequence_from_string_list(["move t9,s0", "jalr t9", "nop"]),
+                       gadget_types.ControllableJump)
+        ]
+        builder = rop.Builder([loads, jumps])
+        builder.run()
+        self.assertEqual([repr(gadget[0]) for gadget in builder.rop_sequence], ["0: lw s0,24(sp)", "0: move t9,s0"])
+
+
+class GadgetRegisterTests(unittest.TestCase):
+
+    def test_register_masks(self):
+        gadget = rop.Gadget(utils.create_instruction_sequence_from_string_list(
+            ["lw s0,24(sp)", "lw s1,28(sp)", "lw s3,32(sp)", "move a0,s1", "move a1,s2", "li s0,1", "jr ra", "nop"]
+        ), rop.GadgetType)
+        self.assertEqual(gadget.fresh_mask, src_utils.register_mask(["s3"]))
+        self.assertEqual(gadget.dependent_mask, src_utils.register_mask(["s2"]))
+        self.assertEqual(gadget.stale_mask, src_utils.register_mask(["s0"]))
+        self.assertEqual(gadget.fresh_registers, set(["s3"]))
+        self.assertEqual(gadget.dependent_registers, set(["s2"]))
+        self.assertEqual(gadget.stale_registers, set(["s0"]))
+
+    def test_mask_from_pattern(self):
+        mask = src_utils.build_register_mask_from_pattern("a*,s0-3,ra")
+        self.assertEqual(
+            sorted(src_utils.register_names(mask)),
+            sorted(name for name in src_utils.build_register_list_from_pattern("a*,s0-3,ra")
+                   if name in src_utils.REGISTER_IDS)
+        )
+        self.assertTrue(mask & src_utils.register_mask(["ra"]))
+        self.assertFalse(mask & src_utils.register_mask(["t9"]))
+
+    def test_register_numbers(self):
+        self.assertEqual(src_utils.register_mask(["zero", "a0", "ra"]), (1 << 0) | (1 << 4) | (1 << 31))
+
+    def test_unknown_registers(self):
+        self.assertRaises(ValueError, src_utils.register_id, "s9")
+        self.assertRaises(ValueError, src_utils.register_mask, ["a0", "f0"])
+        self.assertEqual(src_utils.register_mask(["a0", "f0"], ignore_unknown=True), src_utils.register_mask(["a0"]))
+        self.assertEqual(src_utils.build_register_mask_from_pattern("s*"),
+                         src_utils.build_register_mask_from_pattern("s0-s8"))
+        gadget = rop.Gadget(utils.create_instruction_sequence_from_string_list(
+            ["lw s0,24(sp)", "lwc1 f0,28(sp)", "jr ra", "nop"]
+        ), rop.GadgetType)
+        self.assertEqual(gadget.fresh_registers, set(["s0"]))
+        self.assertEqual(len(src_utils.REGISTER_NAMES), 32)
+        self.assertEqual(len(src_utils.REGISTER_IDS), 32)
+
+    def test_is_compatible_accepts_register_names(self):
+        gadget = rop.Gadget(utils.create_instruction_sequence_from_string_list(
+            ["move a0,s1", "jr ra", "nop"]
+        ), rop.GadgetType)
+        gadget_type = rop.GadgetType()
+        self.assertTrue(gadget_type.is_compatible(gadget, None, set(["s1", "s9"])))
+        self.assertFalse(gadget_type.is_compatible(gadget, None, set(["s2"])))
+        self.assertTrue(gadget_type.is_compatible(gadget, None, src_utils.register_mask(["s1"])))
+
+
+class PopulateTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(30))
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def test_populate_matches_individual_searches(self):
+        gadget_type_classes = [gadget_types.SRegisterLoads, gadget_types.LoadArgForSleep, gadget_types.CallToSleep,
+                               gadget_types.StackLocator, gadget_types.ControllableJump]
+        populated = [gadget_type_class() for gadget_type_class in gadget_type_classes]
+        rop.GadgetType.populate(populated)
+        for gadget_type_class, gadget_type in zip(gadget_type_classes, populated):
+            expected = [[repr(inst) for inst in gadget] for gadget in gadget_type_class().rop_gadgets]
+            self.assertEqual([[repr(inst) for inst in gadget] for gadget in gadget_type.rop_gadgets], expected)
+
+    def test_populate_searches_in_one_pass(self):
+        searched = []
+        original_search_many = objdump_handler.search_many
+
+        def search_many(queries):
+            searched.append(queries)
+            return original_search_many(queries)
+
+        objdump_handler.search_many = search_many
+        try:
+            pipeline = [gadget_types.LoadArgForSleep(), gadget_types.StackLocator(), gadget_types.ControllableJump()]
+            rop.GadgetType.populate(pipeline)
+            for gadget_type in pipeline:
+                gadget_type.rop_gadgets
+        finally:
+            objdump_handler.search_many = original_search_many
+        self.assertEqual(len(searched), 1)
+        self.assertEqual(len(searched[0]), 3)
+
+    def test_gadgets_shared_between_gadget_types(self):
+        first = gadget_types.ControllableJump()
+        second = gadget_types.ControllableJump(ensure_compatible=True)
+        self.assertTrue(first.rop_gadgets)
+        self.assertEqual([id(gadget) for gadget in first.rop_gadgets], [id(gadget) for gadget in second.rop_gadgets])
+        self.assertIsNot(first.rop_gadgets, second.rop_gadgets)
+
+    def test_call_to_sleep_reuses_controllable_jump_search(self):
+        controllable_jump = gadget_types.ControllableJump()
+        controllable_jump.rop_gadgets
+        original_search_many = objdump_handler.search_many
+        objdump_handler.search_many = None
+        try:
+            gadget_types.CallToSleep().rop_gadgets
+        finally:
+            objdump_handler.search_many = original_search_many
+
+
+class LazyGadgetListTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(30))
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def assertSameGadgets(self, first, second):
+        self.assertEqual([[repr(inst) for inst in gadget] for gadget in first],
+                         [[repr(inst) for inst in gadget] for gadget in second])
+
+    def test_same_order_as_sorted_search(self):
+        for gadget_type_class in [gadget_types.SRegisterLoads, gadget_types.LoadArgForSleep,
+                                  gadget_types.StackLocator, gadget_types.ControllableJump]:
+            lazy_gadgets = gadget_type_class(lazy=True).rop_gadgets
+            self.assertIsInstance(lazy_gadgets, rop.LazyGadgetList)
+            self.assertSameGadgets(lazy_gadgets, gadget_type_class().rop_gadgets)
+
+    def test_gadgets_created_as_used(self):
+        gadgets = gadget_types.StackLocator(lazy=True).rop_gadgets
+        self.assertTrue(gadgets)
+        self.assertEqual(gadgets.materialized_count, 1)
+        gadgets[2]
+        self.assertEqual(gadgets.materialized_count, 3)
+        self.assertEqual(len(gadgets), len(gadget_types.StackLocator().rop_gadgets))
+
+    def test_prioritize_does_not_analyze_results(self):
+        analyzed = []
+        store_register_changes = objdump_handler.InstructionSequence._store_register_changes
+
+        def counting_store_register_changes(sequence):
+            analyzed.append(sequence)
+            store_register_changes(sequence)
+
+        objdump_handler.InstructionSequence._store_register_changes = counting_store_register_changes
+        try:
+            gadgets = rop.LazyGadgetList(objdump_handler.search("move t9"), gadget_types.ControllableJump,
+                                         gadget_types.ControllableJump.prioritize)
+            self.assertEqual(analyzed, [])
+            gadgets[0]
+        finally:
+            objdump_handler.InstructionSequence._store_register_changes = store_register_changes
+        self.assertEqual(len(analyzed), gadgets.materialized_count)
+
+    def test_nested_iteration(self):
+        gadgets = gadget_types.LoadArgForSleep(lazy=True).rop_gadgets
+        pairs = [(first, second) for first in gadgets for second in gadgets]
+        self.assertEqual(len(pairs), len(gadgets) ** 2)
+
+    def test_builder_only_analyzes_used_gadgets(self):
+        loads = StaticGadgetType([["lw s0,16(sp)", "lw s1,20(sp)", "lw s2,24(sp)", "jr ra", "nop"]])
+        pipeline = [loads, gadget_types.ControllableJump(lazy=True)]
+        builder = rop.Builder(pipeline)
+        builder.run()
+        self.assertSameGadgets(builder.rop_sequence, [loads.rop_gadgets[0],
+                                                      gadget_types.ControllableJump().rop_gadgets[0]])
+        self.assertEqual(pipeline[1].rop_gadgets.materialized_count, 1)
+
+
+class DedupeTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(30))
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def assertSameGadgets(self, first, second):
+        self.assertEqual([[repr(inst) for inst in gadget] for gadget in first],
+                         [[repr(inst) for inst in gadget] for gadget in second])
+
+    def test_one_gadget_per_instruction_sequence(self):
+        for gadget_type_class in [gadget_types.SRegisterLoads, gadget_types.LoadArgForSleep,
+                                  gadget_types.StackLocator, gadget_types.ControllableJump]:
+            gadgets = gadget_type_class().rop_gadgets
+            expected = []
+            seen = set()
+            for gadget in gadgets:
+                key = rop.equivalence_key(gadget)
+                if key not in seen:
+                    seen.add(key)
+                    expected.append(gadget)
+            # made from the gadgets above, then from the search results
+            for lazy, reset in [(False, False), (False, True), (True, False)]:
+                if reset:
+                    objdump_handler.SEARCH_REGISTRY = None
+                deduped = gadget_type_class(dedupe=True, lazy=lazy).rop_gadgets
+                self.assertSameGadgets(deduped, expected)
+                self.assertEqual(sorted(occurrence[0].address for gadget in deduped
+                                        for occurrence in gadget.occurrences),
+                                 sorted(gadget[0].address for gadget in gadgets))
+            self.assertFalse(any(gadget.equivalents for gadget in gadgets))
+
+    def test_equivalents(self):
+        # the 10 functions made from the first template all end in the same "lw s0,24(sp); jr ra" gadget
+        gadgets = gadget_types.SRegisterLoads(dedupe=True).rop_gadgets
+        self.assertEqual(len(gadgets), 1)
+        self.assertEqual(len(gadgets[0].occurrences), 10)
+        for equivalent in gadgets[0].equivalents:
+            self.assertEqual(rop.equivalence_key(equivalent),
+                             rop.equivalence_key(gadgets[0]))
+            self.assertEqual(equivalent.register_changes, gadgets[0].register_changes)
+        self.assertEqual(len(gadget_types.SRegisterLoads().rop_gadgets), 10)
+
+    def test_builder_uses_representatives(self):
+        builder = rop.Builder([gadget_types.SRegisterLoads(), gadget_types.StackLocator()])
+        builder.run()
+        pipeline = [gadget_types.SRegisterLoads(dedupe=True), gadget_types.StackLocator(dedupe=True)]
+        deduped_builder = rop.Builder(pipeline)
+        deduped_builder.run()
+        self.assertSameGadgets(deduped_builder.rop_sequence, builder.rop_sequence)
+        for stage, gadget in zip(pipeline, deduped_builder.rop_sequence):
+            self.assertTrue(any(gadget is representative for representative in stage.rop_gadgets))
+
+    def test_choose_occurrences(self):
+        gadget = gadget_types.SRegisterLoads(dedupe=True).rop_gadgets[0]
+        self.assertEqual(rop.choose_occurrences([gadget], lambda occurrence: True), [gadget])
+        chosen = rop.choose_occurrences([gadget], lambda occurrence: occurrence[0].address > 0x1100)
+        self.assertEqual([occurrence[0].address for occurrence in chosen], [0x1120])
+        self.assertIsNone(rop.choose_occurrences([gadget], lambda occurrence: False))
+
+    def test_avoid_bad_bytes(self):
+        self.assertFalse(rop.has_bad_bytes(0x00401048, set([0x0a])))
+        self.assertTrue(rop.has_bad_bytes(0x0040100a, set([0x0a])))
+        self.assertTrue(rop.has_bad_bytes(0x0a401048, set([0x0a, 0x0d])))
+        # the gadget is at 0x1000, 0x1048, 0x1090, ...
+        gadget = gadget_types.SRegisterLoads(dedupe=True).rop_gadgets[0]
+        chosen = rop.avoid_bad_bytes([gadget], set([0x10]))
+        self.assertEqual([occurrence[0].address for occurrence in chosen], [0x1120])
+        self.assertIsNone(rop.avoid_bad_bytes([gadget], set([0x00])))
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import utils
+from src import objdump_handler, server
+from src import utils as src_utils
+
+
+class QueryServerTests(unittest.TestCase):
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.directory = tempfile.mkdtemp()
+        self.file_paths = []
+        for name, function_count in [("first.objdump", 12), ("second.objdump", 6)]:
+            file_path = os.path.join(self.directory, name)
+            f = open(file_path, 'w')
+            f.writelines(utils.create_objdump_lines(function_count))
+            f.close()
+            self.file_paths.append(file_path)
+
+        self.query_server = server.QueryServer(os.path.join(self.directory, "server.sock"))
+        self.thread = threading.Thread(target=self.query_server.serve_forever, kwargs={'poll_interval': 0.05})
+        self.thread.start()
+        self.client = server.Client(self.query_server.server_address)
+
+    def tearDown(self):
+        self.client.close()
+        self.query_server.shutdown()
+        self.thread.join()
+        self.query_server.server_close()
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        shutil.rmtree(self.directory)
+
+    def _expected_gadgets(self, function_count, *search_args):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(function_count))
+        return [src_utils.instruction_sequence_to_dict(result) for result in objdump_handler.search(*search_args)]
+
+    def test_search_matches_local_search(self):
+        for file_path, function_count in zip(self.file_paths, [12, 6]):
+            gadgets = list(self.client.search(file_path, "move **", "t9", "s0"))
+            self.assertTrue(gadgets)
+            self.assertEqual(gadgets, self._expected_gadgets(function_count, "move **", ["s0"], "t9"))
+        self.assertEqual(self.client.binaries(), sorted(os.path.realpath(path) for path in self.file_paths))
+
+    def test_expression(self):
+        gadgets = list(self.client.search(self.file_paths[0], "'move t9' and not 'li a0'", expr=True))
+        self.assertTrue(gadgets)
+        self.assertEqual(gadgets, self._expected_gadgets(12, "move t9,s2"))
+        self.assertRaises(server.RequestError, list, self.client.search(self.file_paths[0], "'move t9' or", expr=True))
+
+    def test_limit(self):
+        self.assertEqual(list(self.client.search(self.file_paths[0], "lw s*", limit=2)),
+                         self._expected_gadgets(12, "lw s*")[:2])
+        self.assertEqual(self.client.last_response['count'], 2)
+        self.assertEqual(len(list(self.client.search(self.file_paths[0], "'lw s*' or 'move t9'", limit=3,
+                                                     expr=True))), 3)
+
+    def test_load(self):
+        response = self.client.load(self.file_paths[1])
+        self.assertEqual(response['functions'], 6)
+        self.assertEqual(self.client.binaries(), [os.path.realpath(self.file_paths[1])])
+
+    def test_build(self):
+        sequences = list(self.client.build(self.file_paths[0], ["StackLocator"], max_sequences=2))
+        self.assertEqual(len(sequences), 2)
+        self.assertEqual(self.client.last_response['stop_reason'], "max_count")
+
+    def test_errors(self):
+        self.assertRaises(server.RequestError, list,
+                          self.client.search(os.path.join(self.directory, "missing"), "lw s*"))
+        self.assertRaises(server.RequestError, list, self.client.build(self.file_paths[0], ["NotAGadgetType"]))
+        self.assertRaises(server.RequestError, list, self.client.request({'command': 'unknown',
+                                                                         'file': self.file_paths[0]}))
+        # a malformed pattern fails inside the search rather than in the request's validation
+        self.assertRaisesRegexp(server.RequestError, "IndexError", list, self.client.search(self.file_paths[0], "li a"))
+        # the connection is still usable
+        self.assertTrue(list(self.client.search(self.file_paths[0], "lw s*")))
+
+    def test_slow_reader_does_not_block_others(self):
+        # enough pipelined requests that the responses fill the socket buffer of a client that never reads them
+        slow_client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        slow_client.connect(self.query_server.server_address)
+        request = json.dumps({'command': 'search', 'file': self.file_paths[0], 'pattern': "move **"}) + "\n"
+        # non-blocking since the server stops reading requests once it's stuck writing responses
+        slow_client.setblocking(0)
+        try:
+            slow_client.sendall(request * 5000)
+        except socket.error:
+            pass
+        # give the server time to fill the buffer
+        time.sleep(0.5)
+        try:
+            self.client.socket.settimeout(10)
+            self.assertTrue(list(self.client.search(self.file_paths[1], "li a0")))
+        finally:
+            slow_client.close()
+
+    def test_concurrent_clients(self):
+        expected = [self._expected_gadgets(12, "li a0"), self._expected_gadgets(6, "li a0")]
+        results = {}
+
+        def search(i):
+            client = server.Client(self.query_server.server_address)
+            try:
+                results[i] = [list(client.search(self.file_paths[i % 2], "li a0")) for repeat in xrange(5)]
+            finally:
+                client.close()
+
+        threads = [threading.Thread(target=search, args=(i,)) for i in xrange(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i in xrange(6):
+            self.assertEqual(results[i], [expected[i % 2]] * 5)
@@ -1,5 +1,81 @@
+import struct
 from src import objdump_handler
 
+SAMPLE_OBJDUMP_LINES = [
+    "\n",
+    "libc.so:     file format elf32-tradbigmips\n",
+    "\n",
+    "\n",
+    "Disassembly of section .init:\n",
+    "\n",
+    "00001000 <_init>:\n",
+    "    1000:\t03e00008 \tjr\tra\n",
+    "    1004:\t00000000 \tnop\n",
+    "\n",
+    "Disassembly of section .text:\n",
+    "\n",
+    "00002000 <first>:\n",
+    "    2000:\t02002021 \tmove\ta0,s0\n",
+    "    2004:\t0320f809 \tjalr\tt9\n",
+    "    2008:\t24050001 \tli\ta1,1\n",
+    "    200c:\t00000000 \tnop\n",
+    "\n",
+    "00002010 <second>:\n",
+    "    2010:\t8fbf001c \tlw\tra,28(sp)\n",
+    "    2014:\t03e00008 \tjr\tra\n",
+    "    2018:\t27bd0020 \taddiu\tsp,sp,32\n",
+    "    201c:\t00000000 \tnop\n",
+    "\n",
+    "Disassembly of section .fini:\n",
+    "\n",
+    "00003000 <_fini>:\n",
+    "    3000:\t03e00008 \tjr\tra\n",
+    "    3004:\t00000000 \tnop\n",
+    "\n",
+]
+
+# lines as GNU objdump -d prints them for MIPS binaries, including ones the tokenizer leaves to the regex
+OBJDUMP_LINE_CORPUS = [
+    "\n",
+    "libc.so.0:     file format elf32-tradbigmips\n",
+    "Disassembly of section .text:\n",
+    "00405a30 <__start>:\n",
+    "  405a30:\t03e00021 \tmove\tzero,ra\n",
+    "  405a34:\t04110001 \tbal\t405a3c <__start+0xc>\n",
+    "  405a38:\t00000000 \tnop\n",
+    "  405a3c:\t3c1c0fc0 \tlui\tgp,0xfc0\n",
+    "  405a40:\t279c4a64 \taddiu\tgp,gp,19044\n",
+    "  405a44:\t8f998018 \tlw\tt9,-32744(gp)\n",
+    "  405a48:\t0320f809 \tjalr\tt9\n",
+    "  405a4c:\t27a40010 \taddiu\ta0,sp,16\n",
+    "  405a50:\t0c101694 \tjal\t405a50 <main>\n",
+    "  405a54:\t1040000b \tbeqz\tv0,405a84 <main+0x34>\n",
+    "  405a58:\t8c820000 \tlw\tv0,0(a0)\t# 0x0\n",
+    "  405a5c:\t46020032 \tc.eq.d\t$f0,$f2\n",
+    "  405a60:\tc7a00018 \tlwc1\t$f0,24(sp)\n",
+    "  405a64:\t0000000d \tbreak\n",
+    "  405a68:\t0000000c \tsyscall\n",
+    "  405a6c:\t00000000 \tnop\n",
+    "  405a70:\t00000000 \tnop",
+    "  405a74:\t00000000 \tnop \n",
+    "  405a78:\t03e00008 \tjr\tra\r\n",
+    "  405a7c:\t24020001 \tli\tv0,1  \n",
+    "  405a80:\t24020001 \tli\t  v0,1\n",
+    "  405a84:\t24020001 \tli\t \n",
+    "  405a88:\t24020001 li v0,1\n",
+    "405a8c:\t8fbf001c\tlw\tra,28(sp)\n",
+    "  405A90:\t8FBF001C \tlw\tra,28(sp)\n",
+    "  405a94:\t8fbf001c00 \tlw\tra,28(sp)\n",
+    "  405a98:\t00000000 \t.word\t0x0\n",
+    "  405a9c:\t0000 \tnop\n",
+    "\t...\n",
+    "\t\t\t405aa0: R_MIPS_26\tmemcpy\n",
+    "  405aa4:\t1000ffff \tb\t405aa4 <loop>\n",
+    "  405aa8:\t\tlw\tra,28(sp)\n",
+    "  405aac:\t8fbf001c \t\tlw\tra,28(sp)\n",
+    "Disassembly of section .fini:\n",
+]
+
 
 def create_instruction_sequence_from_string_list(string_list):
     instruction_list = []
@@ -14,4 +90,63 @@ def create_function_from_string_list(string_list):
     objdump_function = objdump_handler.Function("%04d <function_name>:" % offset)
     objdump_function.instructions = create_instruction_sequence_from_string_list(string_list)
     objdump_function.extract_jump_blocks()
-    return objdump_function
\ No newline at end of file
+    return objdump_function
+
+
+def build_mips_elf(words, symbols, text_address=0x400000, big_endian=True):
+    """Returns the bytes of a minimal 32-bit MIPS ELF file whose .text section contains words
+
+    words -- list of 32-bit instruction words
+    symbols -- list of (name, address) tuples for function symbols in .text
+    """
+    endian = '>' if big_endian else '<'
+    text = struct.pack("%s%dI" % (endian, len(words)), *words)
+
+    section_names = "\0.text\0.symtab\0.strtab\0.shstrtab\0"
+    string_table = "\0"
+    symbol_table = struct.pack(endian + 'IIIBBH', 0, 0, 0, 0, 0, 0)
+    for name, address in symbols:
+        symbol_table += struct.pack(endian + 'IIIBBH', len(string_table), address, 0, 0x12, 0, 1)
+        string_table += name + "\0"
+
+    header_size = 52
+    text_offset = header_size
+    symbol_table_offset = text_offset + len(text)
+    string_table_offset = symbol_table_offset + len(symbol_table)
+    section_names_offset = string_table_offset + len(string_table)
+    section_headers_offset = section_names_offset + len(section_names)
+
+    section_headers = [
+        (0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (section_names.index('.text'), 1, 6, text_address, text_offset, len(text), 0, 0, 4, 0),
+        (section_names.index('.symtab'), 2, 0, 0, symbol_table_offset, len(symbol_table), 3, 1, 4, 16),
+        (section_names.index('.strtab'), 3, 0, 0, string_table_offset, len(string_table), 0, 0, 1, 0),
+        (section_names.index('.shstrtab'), 3, 0, 0, section_names_offset, len(section_names), 0, 0, 1, 0),
+    ]
+
+    ident = '\x7fELF' + chr(1) + chr(2 if big_endian else 1) + chr(1) + '\0' * 9
+    header = struct.pack(endian + '16sHHIIIIIHHHHHH', ident, 2, 8, 1, text_address, 0, section_headers_offset,
+                         0, header_size, 0, 0, 40, len(section_headers), 4)
+    return header + text + symbol_table + string_table + section_names + "".join(
+        struct.pack(endian + 'IIIIIIIIII', *section_header) for section_header in section_headers)
+
+
+def create_objdump_lines(function_count):
+    """Returns lines of objdump output for a .text section with function_count functions of varying jump blocks"""
+    lines = ["\n", "Disassembly of section .text:\n", "\n"]
+    templates = [
+        ["lw ra,28(sp)", "lw s0,24(sp)", "jr ra", "addiu sp,sp,32"],
+        ["move t9,s1", "li a0,%d", "jalr t9", "move a1,s0", "beqz v0,0 <f>", "nop", "lw gp,16(sp)"],
+        ["addiu a0,sp,%d", "move t9,s2", "jalr t9", "nop", "lw s1,20(sp)", "jr ra", "nop"],
+    ]
+    offset = 0x1000
+    for i in range(function_count):
+        lines.append("%08x <function_%d>:\n" % (offset, i))
+        for instruction in templates[i % len(templates)]:
+            if "%d" in instruction:
+                instruction = instruction % i
+            operator, _, operands = instruction.partition(" ")
+            lines.append("    %x:\t%08x \t%s\t%s\n" % (offset, i, operator, operands))
+            offset += 4
+        lines.append("\n")
+    return lines
@@ -0,0 +1,63 @@
+import unittest
+import utils
+from src import objdump_handler, vector_search
+
+
+@unittest.skipIf(vector_search.numpy is None, "numpy is not installed")
+class VectorSearchTests(unittest.TestCase):
+
+    PATTERNS = [
+        ("lw s*,sp", None, None),
+        ("move **", ["a1"], "t9"),
+        ("li a0", None, None),
+        ("move t9,s", None, "t9"),
+        ("addiu a0,sp", None, None),
+        ("lw gp,16(sp)", None, None),
+        ("lw s1,20", ["ra"], "ra"),
+        ("lw zz", None, None),
+    ]
+
+    def setUp(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        objdump_handler.extract_functions_from_objdump_lines(utils.create_objdump_lines(30))
+
+    def tearDown(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+
+    def test_results_match_objdump_handler_search(self):
+        for query in self.PATTERNS:
+            expected = [[repr(inst) for inst in result] for result in objdump_handler.search(*query)]
+            actual = [[repr(inst) for inst in result] for result in vector_search.search(*query)]
+            self.assertEqual(actual, expected, query)
+
+    def test_iter_search_matches_objdump_handler_iter_search(self):
+        for query in self.PATTERNS + [
+            # immediates are matched as substrings, "1" matches li a0,1 and li a0,1x
+            ("li a0,1", None, None),
+            ("addiu a0,sp,2", None, "t9"),
+            # more operands than any instruction has
+            ("move t9,s1,s2,s3", None, None),
+            ("addiu a0,sp,2,9", None, None),
+        ]:
+            expected = [(block_id, repr(result)) for block_id, result in objdump_handler.iter_search(*query)]
+            actual = [(block_id, repr(result)) for block_id, result in vector_search.get_corpus().iter_search(*query)]
+            self.assertEqual(actual, expected, query)
+        self.assertEqual(len(list(vector_search.get_corpus().iter_search("li a0,1"))), 5)
+
+    def test_destination_overwritten_later_not_matched(self):
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        utils.create_function_from_string_list([
+            "lw s2,36(sp)",
+            "lw s2,32(sp)",
+            "jalr t9",
+            "move at,at"
+        ])
+        corpus = vector_search.get_corpus()
+        self.assertEqual(corpus.match_mask("lw s2").tolist(), [False, True, False, False])
+
+    def test_corpus_rebuilt_when_blocks_change(self):
+        corpus = vector_search.get_corpus()
+        self.assertIs(vector_search.get_corpus(), corpus)
+        objdump_handler.ALL_JUMP_BLOCKS = []
+        self.assertIsNot(vector_search.get_corpus(), corpus)
+        self.assertEqual(vector_search.search("lw s*,sp"), [])